@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def normalize_fen(fen):
+    """Keeps the FEN fields that define the position (placement, side, castling, en passant), dropping the move clocks."""
+    return " ".join(fen.split(" ")[:4])
+
+
+class AnalysisCache:
+    """
+    Bounded LRU cache of analysed positions keyed by normalized FEN.
+
+    Each entry stores the best move, score and search depth. A lookup only hits if the stored depth is at
+    least the requested depth. With `db_path` set, entries are also written to SQLite so they survive restarts;
+    memory misses fall back to the database and promote the entry back into memory.
+    """
+
+    def __init__(self, max_entries=100_000, db_path=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis ("
+                "fen TEXT PRIMARY KEY, best_move TEXT, score_type TEXT, score_value INTEGER, depth INTEGER)"
+            )
+            self.db.commit()
+
+    def get(self, fen, min_depth=0):
+        """Returns the cached entry for fen if it was searched to at least min_depth, else None."""
+        key = normalize_fen(fen)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.db is not None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._remember(key, entry)
+
+            if entry is None or entry["depth"] < min_depth:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, fen, best_move, score, depth):
+        """Stores an analysis result, unless a deeper one is already cached for the position."""
+        key = normalize_fen(fen)
+        entry = {"best_move": best_move, "score": score, "depth": depth}
+        with self.lock:
+            existing = self.entries.get(key)
+            if existing is None and self.db is not None:
+                existing = self._load(key)  # Evicted from memory or stored before a restart
+            if existing is not None and existing["depth"] > depth:
+                if key not in self.entries:
+                    self._remember(key, existing)
+                return
+
+            self._remember(key, entry)
+            if self.db is not None:
+                score_type, score_value = next(iter(score.items())) if score else (None, None)
+                # The depth guard is repeated in SQL, a shallow result never replaces a deeper stored row
+                self.db.execute(
+                    "INSERT INTO analysis VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(fen) DO UPDATE SET best_move = excluded.best_move, score_type = excluded.score_type, "
+                    "score_value = excluded.score_value, depth = excluded.depth WHERE excluded.depth >= analysis.depth",
+                    (key, best_move, score_type, score_value, depth)
+                )
+                self.db.commit()
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load(self, key):
+        row = self.db.execute(
+            "SELECT best_move, score_type, score_value, depth FROM analysis WHERE fen = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        best_move, score_type, score_value, depth = row
+        return {"best_move": best_move, "score": {score_type: score_value} if score_type else None, "depth": depth}
+
+    def stats(self):
+        """Returns hit/miss counters and the number of entries held in memory."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,252 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from src.misc import metrics
+
+DEFAULT_DEPTH = 15  # Search depth when a request gives no limit, same as the stockfish package default
+INFO_INTEGERS = ("depth", "seldepth", "multipv", "nodes", "nps", "time", "hashfull", "tbhits")
+
+
+def parse_info(line):
+    """
+    Parses a UCI `info` line into {depth, seldepth, multipv, score, bound, nodes, nps, time, pv}.
+    Returns None for info lines without a principal variation (currmove, string, ...).
+    """
+    tokens = line.split()
+    if "pv" not in tokens:
+        return None
+    info = {"multipv": 1, "score": None, "bound": None}
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token in INFO_INTEGERS and i + 1 < len(tokens):
+            info[token] = int(tokens[i + 1])
+            i += 2
+        elif token == "score" and i + 2 < len(tokens):
+            info["score"] = {tokens[i + 1]: int(tokens[i + 2])}
+            i += 3
+        elif token in ("lowerbound", "upperbound"):
+            info["bound"] = token
+            i += 1
+        elif token == "pv":
+            info["pv"] = tokens[i + 1:]
+            break
+        else:
+            i += 1
+    return info
+
+
+class AsyncUCIEngine:
+    """
+    UCI engine subprocess driven over non-blocking asyncio pipes.
+
+    analyse() is an async generator that yields every completed depth (all multi-PV lines of that depth) while
+    the search runs, then the best move. The search is stopped with the UCI `stop` command when the deadline
+    passes or when the consumer closes the generator, e.g. because the client disconnected.
+    """
+
+    def __init__(self, command, options=None, timeout=10.0):
+        self.command = list(command)  # e.g. [STOCKFISH_PATH] or [sys.executable, "src/misc/fake_uci.py"]
+        self.options = options or {}  # setoption name/value pairs, e.g. {"Threads": 2, "Hash": 64}
+        self.timeout = timeout  # For handshakes and for the engine to answer a stop
+        self.process = None
+        self.multipv = 1
+        self.lock = asyncio.Lock()  # One search at a time, held until an aborted search has been drained
+        self.aborting = None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        self.multipv = 1
+        await self.send("uci")
+        await self.read_until("uciok", self.timeout)
+        for name, value in self.options.items():
+            await self.send(f"setoption name {name} value {value}")
+        await self.ready()
+
+    def is_alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    async def restart(self):
+        with metrics.timed("engine_restart"):
+            await self.close()
+            await self.start()
+
+    async def close(self):
+        if not self.is_alive():
+            return
+        try:
+            await self.send("quit")
+            await asyncio.wait_for(self.process.wait(), 2.0)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.process.kill()
+            await self.process.wait()
+
+    async def send(self, command):
+        self.process.stdin.write((command + "\n").encode())
+        await self.process.stdin.drain()
+
+    async def readline(self, timeout=None):
+        line = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+        if not line:
+            raise ConnectionError("UCI engine exited")
+        return line.decode().strip()
+
+    async def read_until(self, token, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            line = await self.readline(max(0.0, deadline - time.monotonic()))
+            if line.split(" ")[0] == token:
+                return line
+
+    async def ready(self):
+        await self.send("isready")
+        await self.read_until("readyok", self.timeout)
+
+    async def analyse(self, fen, moves=None, depth=None, movetime=None, nodes=None, multipv=1, deadline=None):
+        """
+        Searches `fen` (plus optional UCI `moves`) and yields
+            {"type": "info", "depth", "lines": [{multipv, score, pv, ...}], "nodes", "time"} per completed depth, then
+            {"type": "bestmove", "best_move", "ponder", "depth", "score", "lines", "stopped"}.
+        `deadline` is a monotonic time at which the search is stopped and the best move so far is returned.
+        Without depth, movetime or nodes the search runs to DEFAULT_DEPTH, or until the deadline if one is given.
+        """
+        await self.lock.acquire()
+        finished = False
+        try:
+            if multipv != self.multipv:
+                await self.send(f"setoption name MultiPV value {multipv}")
+                self.multipv = multipv
+
+            await self.send(f"position fen {fen}" + (f" moves {' '.join(moves)}" if moves else ""))
+            command = "go"
+            for name, value in (("depth", depth), ("movetime", movetime), ("nodes", nodes)):
+                if value is not None:
+                    command += f" {name} {value}"
+            if command == "go":
+                command = "go infinite" if deadline is not None else f"go depth {DEFAULT_DEPTH}"
+            await self.send(command)
+
+            start = time.monotonic()
+            stopped = False
+            pending, completed = {}, None  # multipv -> line of the depth being searched, last complete depth
+            while True:
+                if stopped:
+                    timeout = self.timeout  # The engine must answer the stop
+                else:
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    line = await self.readline(timeout)
+                except asyncio.TimeoutError:
+                    if stopped:
+                        # No bestmove after the stop: the engine hangs, kill it like abort_search does
+                        metrics.ENGINE_CRASHES.inc()
+                        self.process.kill()
+                        await self.process.wait()
+                        raise ConnectionError("UCI engine did not answer stop") from None
+                    await self.send("stop")  # Deadline reached, the engine answers with its best move so far
+                    stopped = True
+                    continue
+
+                if line.startswith("bestmove"):
+                    tokens = line.split()
+                    if pending:
+                        completed = self.snapshot(pending)
+                    finished = True
+                    metrics.STAGE_SECONDS.observe(time.monotonic() - start, stage="engine_stream")
+                    best_move = tokens[1] if len(tokens) > 1 and tokens[1] != "(none)" else None
+                    yield {
+                        "type": "bestmove",
+                        "best_move": best_move,
+                        "ponder": tokens[3] if len(tokens) > 3 and tokens[2] == "ponder" else None,
+                        "depth": completed["depth"] if completed else 0,
+                        "score": completed["lines"][0]["score"] if completed else None,
+                        "lines": completed["lines"] if completed else [],
+                        "stopped": stopped,
+                        "elapsed_ms": round((time.monotonic() - start) * 1000, 1),
+                    }
+                    return
+
+                info = parse_info(line) if line.startswith("info") else None
+                if info is None or info["bound"] is not None or "depth" not in info:
+                    continue  # Fail-high/low lines are re-searched, only exact scores are reported
+                if pending and info["depth"] > pending[min(pending)]["depth"]:
+                    # A new depth started with fewer lines than requested (fewer legal moves than multipv)
+                    completed = self.snapshot(pending)
+                    pending = {}
+                    yield {"type": "info", **completed}
+                pending[info["multipv"]] = info
+                if info["multipv"] == multipv:
+                    completed = self.snapshot(pending)
+                    pending = {}
+                    yield {"type": "info", **completed}
+        finally:
+            if finished:
+                self.lock.release()
+            else:
+                # Closed mid-search (client gone or error). Stop and drain in a task of its own, a cancelled
+                # request must not interrupt it, and the next search must not see this one's output.
+                self.aborting = asyncio.ensure_future(self.abort_search())
+
+    @staticmethod
+    def snapshot(lines):
+        ordered = [lines[k] for k in sorted(lines)]
+        return {
+            "depth": ordered[0]["depth"],
+            "lines": [
+                {"multipv": info["multipv"], "score": info["score"], "pv": info["pv"],
+                 "seldepth": info.get("seldepth"), "nodes": info.get("nodes")}
+                for info in ordered
+            ],
+            "nodes": max(info.get("nodes", 0) for info in ordered),
+            "time": max(info.get("time", 0) for info in ordered),
+        }
+
+    async def abort_search(self):
+        """Stops the running search and reads up to its bestmove, killing the engine if it doesn't answer."""
+        try:
+            if not self.is_alive():
+                return  # Already killed, the pool restarts it on the next lease
+            await self.send("stop")
+            await self.read_until("bestmove", self.timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            metrics.ENGINE_CRASHES.inc()
+            if self.is_alive():
+                self.process.kill()
+                await self.process.wait()
+        finally:
+            self.lock.release()
+
+
+class AsyncEnginePool:
+    """Keeps `size` AsyncUCIEngines running and leases one per streamed analysis, restarting dead engines on lease."""
+
+    def __init__(self, command, size=1, options=None, lease_timeout=30.0):
+        self.engines = [AsyncUCIEngine(command, options) for _ in range(size)]
+        self.lease_timeout = lease_timeout
+        self.idle = asyncio.Queue()
+
+    async def start(self):
+        await asyncio.gather(*(engine.start() for engine in self.engines))
+        for engine in self.engines:
+            self.idle.put_nowait(engine)
+
+    @asynccontextmanager
+    async def lease(self):
+        try:
+            engine = await asyncio.wait_for(self.idle.get(), self.lease_timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError("No UCI engine available for streaming analysis") from None
+        try:
+            if not engine.is_alive():
+                metrics.ENGINE_CRASHES.inc()
+                await engine.restart()
+            yield engine
+        finally:
+            self.idle.put_nowait(engine)
+
+    async def close(self):
+        await asyncio.gather(*(engine.close() for engine in self.engines), return_exceptions=True)
@@ -1,29 +1,268 @@
+import asyncio
+import json
 import os
+import shlex
 import sys
 
-from src.API.Engine import Engine
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, asynccontextmanager
+from functools import partial
+
+from src.API.AnalysisCache import AnalysisCache
+from src.API.GameSession import SessionStore
+from src.API.InferenceScheduler import InferenceScheduler
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
-from fastapi import FastAPI
-from src.cnn.BoardRecognizer import BoardRecognizer
+import base64
+
+import numpy as np
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from src.cnn.SquareExtractor import SquareExtractor
+from src.cnn.SquareCache import SquareCache
+from src.misc import metrics, utils
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 import time
 
-# Initialize FastAPI and Stockfish
-app = FastAPI()
-engine = Engine()
-model_path = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\models\CNNModel.h5"
-recognizer = BoardRecognizer(model_path=model_path)  # Load trained model
+ENGINE_POOL_SIZE = int(os.environ.get("ROOKCEPTION_ENGINE_POOL_SIZE", 2))
+# Opening book (.book built by src/API/OpeningBook.py, or Polyglot .bin) and Syzygy tables, answered without a search
+OPENING_BOOK = os.environ.get("ROOKCEPTION_OPENING_BOOK")
+SYZYGY_PATH = os.environ.get("ROOKCEPTION_SYZYGY_PATH")
+analysis_cache = AnalysisCache(
+    max_entries=int(os.environ.get("ROOKCEPTION_CACHE_SIZE", 100_000)),
+    db_path=os.environ.get("ROOKCEPTION_CACHE_DB")  # Optional SQLite file to keep analyses across restarts
+)
+sessions = SessionStore(
+    max_sessions=int(os.environ.get("ROOKCEPTION_MAX_SESSIONS", 256)),
+    ttl=float(os.environ.get("ROOKCEPTION_SESSION_TTL", 1800))
+)
+# .h5 (Keras), .tflite or .onnx; the exported formats run without TensorFlow
+model_path = os.environ.get(
+    "ROOKCEPTION_MODEL_PATH", r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\models\CNNModel.h5"
+)
+# Squares identical to ones already classified reuse their label instead of another CNN pass
+square_cache = SquareCache(
+    max_entries=int(os.environ.get("ROOKCEPTION_SQUARE_CACHE_SIZE", 4096)),
+    perceptual=os.environ.get("ROOKCEPTION_SQUARE_CACHE_PERCEPTUAL", "0") == "1"
+)
+
+# Find the board in uncropped screenshots of any resolution (needs OpenCV), geometry is cached per source_id.
+# Off by default, cropped boards would pay for a grid fit on every request without a source_id
+LOCATE_BOARD = os.environ.get("ROOKCEPTION_LOCATE_BOARD", "0") == "1"
+
+# Correct or reject boards that can't be legal before they reach Stockfish
+VALIDATE_POSITION = os.environ.get("ROOKCEPTION_VALIDATE_POSITION", "1") == "1"
+MIN_CONFIDENCE = float(os.environ.get("ROOKCEPTION_MIN_CONFIDENCE", 0.9))
+
+# Model and Stockfish are loaded in the background once the app starts, see lifespan()
+recognizer = None
+engine = None
+book = None  # Opened with the engine stage, also consulted by /analyze/stream/
+tablebase = None
+
+# /analyze/stream/ runs on its own engines, driven over asyncio pipes so searches can be streamed and stopped.
+# ROOKCEPTION_UCI_COMMAND overrides the Stockfish binary, e.g. "python src/misc/fake_uci.py" for tests
+STREAM_ENGINES = int(os.environ.get("ROOKCEPTION_STREAM_ENGINES", 1))
+MAX_MULTIPV = int(os.environ.get("ROOKCEPTION_MAX_MULTIPV", 5))
+UCI_COMMAND = os.environ.get("ROOKCEPTION_UCI_COMMAND")
+stream_engines = None
+
+# Micro-batching of concurrent /analyze/ requests
+MAX_BATCH_SIZE = int(os.environ.get("ROOKCEPTION_MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.environ.get("ROOKCEPTION_MAX_WAIT_MS", 5))
+scheduler = InferenceScheduler(None, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+# Stockfish calls block, keep them off the event loop with one thread per pooled engine
+engine_executor = ThreadPoolExecutor(max_workers=ENGINE_POOL_SIZE, thread_name_prefix="stockfish")
+
+# Load progress reported by /ready/
+startup = {"model": "pending", "engine": "pending", "warmup": "pending", "stream": "pending", "started_at": time.time(),
+           "load_time": None}
+
+
+def collect_metrics():
+    """Cache, session and pool values read at scrape time for /metrics."""
+    values = []
+    for name, cache in (("analysis", analysis_cache), ("square", square_cache)):
+        if cache is None:
+            continue
+        stats = cache.stats()
+        values += [
+            (f"rookception_{name}_cache_hits_total", "counter", f"{name.capitalize()} cache hits", stats["hits"]),
+            (f"rookception_{name}_cache_misses_total", "counter", f"{name.capitalize()} cache misses", stats["misses"]),
+            (f"rookception_{name}_cache_entries", "gauge", f"Entries held in the {name} cache", stats["entries"]),
+        ]
+    values.append(("rookception_sessions", "gauge", "Active game sessions", len(sessions)))
+    if engine is not None:
+        values.append(("rookception_engines_idle", "gauge", "Idle Stockfish engines in the pool", engine.idle.qsize()))
+        values.append(("rookception_engines_live", "gauge", "Stockfish engines not crashed or restarting", engine.live_engines()))
+    values.append(("rookception_ready", "gauge", "1 once model, engine and warm-up are loaded", int(is_ready())))
+    return values
+
+
+metrics.REGISTRY.add_collector(collect_metrics)
+
+
+def is_ready():
+    loaded = all(startup[stage] == "ready" for stage in ("model", "engine", "warmup"))
+    # All engines crashed and restarting: requests would only wait out the lease timeout
+    return loaded and engine.live_engines() > 0
+
+
+def load_recognizer():
+    """Imports the recognizer (and TensorFlow, for .h5 models) and loads the model. Runs on a worker thread."""
+    global recognizer
+    from src.cnn.BoardRecognizer import BoardRecognizer
+
+    locator = None
+    if LOCATE_BOARD:
+        from src.cnn.BoardLocator import BoardLocator
+        locator = BoardLocator()
+    validator = None
+    if VALIDATE_POSITION:
+        from src.cnn.PositionValidator import PositionValidator
+        validator = PositionValidator(utils.CLASS_LABELS)
+    recognizer = BoardRecognizer(
+        model_path=model_path, square_cache=square_cache, locator=locator, validator=validator,
+        min_confidence=MIN_CONFIDENCE
+    )
+    scheduler.recognizer = recognizer
+
+
+def load_engine():
+    """Starts the Stockfish pool. Runs on a worker thread."""
+    global engine, book, tablebase
+    from src.API import Engine
+    from src.API.Engine import EnginePool
+
+    book, tablebase = load_book(), load_tablebase()
+    pool = EnginePool(size=ENGINE_POOL_SIZE, cache=analysis_cache, book=book, tablebase=tablebase)
+    if pool.live_engines() == 0:
+        pool.close()
+        raise RuntimeError(f"no Stockfish engine could be started from '{Engine.STOCKFISH_PATH}'")
+    engine = pool
+
+
+def load_book():
+    """Opens ROOKCEPTION_OPENING_BOOK, None (searching every position) if unset or unreadable."""
+    if not OPENING_BOOK:
+        return None
+    from src.API.OpeningBook import open_book
+
+    try:
+        book = open_book(OPENING_BOOK)
+        print(f"Opening book {OPENING_BOOK} loaded with {len(book)} entries")
+        return book
+    except Exception as e:
+        print(f"[ERROR] Failed to load opening book {OPENING_BOOK}: {e}")
+        return None
+
+
+def load_tablebase():
+    """Opens the Syzygy tables in ROOKCEPTION_SYZYGY_PATH, None if unset or unreadable."""
+    if not SYZYGY_PATH:
+        return None
+    from src.API.Tablebase import Tablebase
+
+    try:
+        tablebase = Tablebase(SYZYGY_PATH)
+        print(f"Syzygy tables loaded from {SYZYGY_PATH} (up to {tablebase.max_pieces} pieces)")
+        return tablebase
+    except Exception as e:
+        print(f"[ERROR] Failed to load Syzygy tables from {SYZYGY_PATH}: {e}")
+        return None
+
+
+async def load_stream_engines():
+    """Starts the async engines behind /analyze/stream/. Runs on the event loop, the pipes belong to it."""
+    global stream_engines
+    from src.API import Engine
+    from src.API.AsyncEngine import AsyncEnginePool
+
+    command = shlex.split(UCI_COMMAND) if UCI_COMMAND else [Engine.STOCKFISH_PATH]
+    pool = AsyncEnginePool(command, size=STREAM_ENGINES)
+    await pool.start()
+    stream_engines = pool
+
+
+async def load_stage(stage, fn):
+    startup[stage] = "loading"
+    try:
+        if asyncio.iscoroutinefunction(fn):
+            await fn()
+        else:
+            await asyncio.to_thread(fn)
+        startup[stage] = "ready"
+    except Exception as e:
+        startup[stage] = f"failed: {e}"
+        print(f"[ERROR] Failed to load {stage}: {e}")
+
+
+async def load_services():
+    """Loads model and engine concurrently, then runs one warm-up inference so the first request isn't slow."""
+    await asyncio.gather(
+        load_stage("model", load_recognizer), load_stage("engine", load_engine),
+        load_stage("stream", load_stream_engines)
+    )
+
+    if startup["model"] == "ready":
+        startup["warmup"] = "loading"
+        try:
+            width, height = recognizer.img_size
+            blank = np.zeros((64, height, width, 3), dtype=np.uint8)  # One board's worth of squares
+            await scheduler.run_in_worker(recognizer.run_model, blank)
+            startup["warmup"] = "ready"
+        except Exception as e:
+            startup["warmup"] = f"failed: {e}"
+
+    startup["load_time"] = round(time.time() - startup["started_at"], 3)
+    print(f"ChessAPI services loaded in {startup['load_time']} seconds: {startup}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Start loading in the background so the server answers /test/ and /ready/ right away
+    loader = asyncio.create_task(load_services())
+    yield
+    loader.cancel()
+    await scheduler.close()
+    if stream_engines is not None:
+        await stream_engines.close()
+    if engine is not None:
+        engine.close()
+    engine_executor.shutdown(wait=False)
+    analysis_cache.close()
+
+
+def not_ready_response():
+    """503 response for requests that arrive before the model and engine are loaded."""
+    return JSONResponse(status_code=503, content={"error": "API is still starting", "startup": startup})
+
+
+# Initialize FastAPI, heavy services are loaded by the lifespan handler
+app = FastAPI(lifespan=lifespan)
+
+
+async def run_engine(fn, *args, **kwargs):
+    """Runs a blocking engine call on an engine thread."""
+    return await asyncio.get_running_loop().run_in_executor(engine_executor, partial(fn, *args, **kwargs))
 
 
 class ImageRequest(BaseModel):
     image_path: Optional[str] = Field(None, description="Path to the local chessboard image")
+    image_base64: Optional[str] = Field(None, description="Base64 PNG/JPEG bytes, or a raw RGB buffer when image_shape is set")
+    image_shape: Optional[List[int]] = Field(None, description="[height, width, 3] of a raw RGB buffer in image_base64")
+    game_id: Optional[str] = Field(None, description="Client game id. Moves within a game share castling/en passant/move history")
+    source_id: Optional[str] = Field(None, description="Screen/window id whose detected board position is reused. Defaults to game_id")
     turn: Optional[str] = Field(None, description="Turn ('w' for white, 'b' for black')")
-    castling_rights: Optional[str] = Field("-", description="Castling rights (e.g., 'KQkq' or '-')")
+    castling_rights: Optional[str] = Field(None, description="Castling rights (e.g., 'KQkq' or '-'), inferred from the board if omitted")
     en_passant: Optional[str] = Field("-", description="En passant target square (e.g., 'e3' or '-')")
     halfmove: Optional[int] = Field(0, description="Halfmove clock for the fifty-move rule")
     fullmove: Optional[int] = Field(1, description="Full move number")
+    depth: Optional[int] = Field(None, description="Search depth limit")
+    movetime: Optional[int] = Field(None, description="Search time limit in milliseconds")
+    nodes: Optional[int] = Field(None, description="Search node limit")
+    budget_ms: Optional[int] = Field(None, description="Total latency budget in ms, the engine gets what recognition leaves over")
 
     @classmethod
     def validate_request(cls, data):
@@ -34,33 +273,281 @@ class ImageRequest(BaseModel):
             raise ValueError("'turn' must be either 'w' or 'b'.")
         return cls(**data)
 
+    def image_source(self):
+        """Returns what the recognizer should read: decoded bytes or a raw RGB array if sent inline, else the path."""
+        if self.image_base64:
+            data = base64.b64decode(self.image_base64)
+            return SquareExtractor.from_raw_rgb(data, self.image_shape) if self.image_shape else data
+        return self.image_path
 
-@app.post("/analyze/")
-async def analyze_chessboard(request: ImageRequest):
+
+class StreamRequest(ImageRequest):
+    fen: Optional[str] = Field(None, description="Full FEN to analyze directly, instead of recognizing an image")
+    multipv: Optional[int] = Field(1, description="Number of best lines streamed per depth")
+    deadline_ms: Optional[int] = Field(None, description="Stop the search this many ms after the request arrived and return the best move so far")
+
+
+class BatchImageRequest(BaseModel):
+    image_paths: List[str] = Field(..., description="Paths to the local chessboard images")
+    turn: Optional[str] = Field(None, description="Turn ('w' or 'b'). When set, a best move is returned per board")
+    chunk_size: Optional[int] = Field(16, description="Number of boards per CNN inference call")
+
+
+async def analyze(request: ImageRequest, image):
     """
-    Analyzes a chess position based on an image and game state.
-    Returns the best move as a string and logs execution time.
+    Recognizes the board in `image` (path, bytes or RGB array) and returns the best move for the request.
+    With a budget_ms, the time left after recognition becomes the engine's movetime, falling back to a shallow
+    search or a cached analysis when little is left (see Engine.budget_limits).
     """
+    if not is_ready():
+        return not_ready_response()
     start_time = time.time()
+    start = time.monotonic()
+    deadline = start + request.budget_ms / 1000 if request.budget_ms else None
 
     try:
-        best_move = None
-        if request.image_path and request.turn:
-            # Predict board state using CNN model
-            board_state = recognizer.predict_board(request.image_path)
+        analysis = {"best_move": None, "depth": None, "score": None, "mode": None}
+        recognition_ms = None
+        if image is not None and request.turn:
+            # Predict board state using CNN model, batched with other concurrent requests
+            board_state = await scheduler.predict_board(
+                image, source=request.source_id or request.game_id, turn=request.turn
+            )
+            recognition_ms = (time.monotonic() - start) * 1000
             # Get best move
-            best_move = engine.get_next_move(board_state, request.turn)
+            limits = {"depth": request.depth, "movetime": request.movetime, "nodes": request.nodes}
+            if request.game_id:
+                session = sessions.get(request.game_id)
+                analysis = await run_engine(
+                    engine.get_session_analysis, session, board_state, request.turn, deadline=deadline, **limits
+                )
+            else:
+                analysis = await run_engine(
+                    engine.get_next_analysis, board_state, request.turn, deadline=deadline,
+                    castling_rights=request.castling_rights, en_passant=request.en_passant,
+                    halfmove=request.halfmove, fullmove=request.fullmove, **limits
+                )
 
         end_time = time.time()
         execution_time = end_time - start_time
-        print(f"Request processed in {execution_time:.4f} seconds")
+        metrics.REQUEST_SECONDS.observe(execution_time, endpoint="analyze")
+        utils.logger.debug(f"Request processed in {execution_time:.4f} seconds")
+
+        response = {
+            "best_move": analysis["best_move"],
+            "depth": analysis["depth"],
+            "score": analysis["score"],
+            "search": analysis["mode"],
+            "execution_time": f"{execution_time:.4f} seconds",
+        }
+        if deadline is not None:
+            elapsed_ms = (time.monotonic() - start) * 1000
+            over_budget = elapsed_ms > request.budget_ms
+            if analysis["mode"]:
+                metrics.BUDGETED_SEARCHES.inc(mode=analysis["mode"])
+            if over_budget:
+                metrics.BUDGET_OVERRUNS.inc()
+            response.update({
+                "budget_ms": request.budget_ms,
+                "recognition_ms": round(recognition_ms, 1) if recognition_ms is not None else None,
+                "elapsed_ms": round(elapsed_ms, 1),
+                "over_budget": over_budget,
+            })
+        return response
+
+    except Exception as e:
+        metrics.REQUEST_ERRORS.inc(endpoint="analyze")
+        return {"error": f"API Exception: {str(e)}"}
+
+
+@app.post("/analyze/")
+async def analyze_chessboard(request: ImageRequest):
+    """
+    Analyzes a chess position based on an image and game state.
+    The image is either a server-side path or sent inline as base64 (encoded PNG/JPEG or raw RGB).
+    Returns the best move as a string, the depth it was searched to and the execution time.
+    """
+    try:
+        image = request.image_source()
+    except Exception as e:
+        return {"error": f"API Exception: {str(e)}"}
+    return await analyze(request, image)
+
+
+@app.post("/analyze/upload/")
+async def analyze_chessboard_upload(
+    image: UploadFile = File(..., description="PNG/JPEG file, or raw RGB bytes when image_shape is set"),
+    turn: Optional[str] = Form(None),
+    image_shape: Optional[str] = Form(None, description="'height,width,3' of a raw RGB upload"),
+    game_id: Optional[str] = Form(None),
+    source_id: Optional[str] = Form(None),
+    castling_rights: Optional[str] = Form(None),
+    en_passant: Optional[str] = Form("-"),
+    halfmove: Optional[int] = Form(0),
+    fullmove: Optional[int] = Form(1),
+    depth: Optional[int] = Form(None),
+    movetime: Optional[int] = Form(None),
+    nodes: Optional[int] = Form(None),
+    budget_ms: Optional[int] = Form(None),
+):
+    """Same as /analyze/, with the board sent as a multipart file upload. The bytes never touch disk."""
+    request = ImageRequest(
+        turn=turn, game_id=game_id, source_id=source_id, castling_rights=castling_rights, en_passant=en_passant,
+        halfmove=halfmove, fullmove=fullmove, depth=depth, movetime=movetime, nodes=nodes,
+        budget_ms=budget_ms
+    )
+    try:
+        data = await image.read()
+        if image_shape:
+            data = SquareExtractor.from_raw_rgb(data, [int(dim) for dim in image_shape.split(",")])
+    except Exception as e:
+        return {"error": f"API Exception: {str(e)}"}
+    return await analyze(request, data)
+
+
+def sse(event, data):
+    """One server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/analyze/stream/")
+async def analyze_stream(request: StreamRequest):
+    """
+    Streams the analysis of a position as server-sent events: `position` with the FEN, one `info` per completed
+    depth with the best `multipv` lines, then `bestmove`. The search stops at `deadline_ms` (counted from the
+    request's arrival, so recognition time is included) or when the client disconnects, and the best move so far
+    is returned. The position comes from `fen`, or from the image and `turn` like /analyze/ (without a game session).
+    """
+    # A FEN only needs the stream engines, an image also needs the model
+    if stream_engines is None or (not request.fen and not is_ready()):
+        return not_ready_response()
+    start_time = time.time()
+    deadline = time.monotonic() + request.deadline_ms / 1000 if request.deadline_ms is not None else None
+
+    try:
+        if request.fen:
+            fields = request.fen.split(" ")
+            if len(fields) < 2:
+                raise ValueError("'fen' must include at least the side to move")
+            utils.check_position(fields[0], fields[1])
+            fen = request.fen
+        else:
+            image = request.image_source()
+            if image is None or not request.turn:
+                raise ValueError("Either 'fen', or an image and 'turn' must be provided.")
+            board_state = await scheduler.predict_board(
+                image, source=request.source_id or request.game_id, turn=request.turn
+            )
+            utils.check_position(board_state.placement, request.turn)
+            castling_rights = request.castling_rights or utils.infer_castling_rights(board_state.placement)
+            fen = board_state.fen(request.turn, castling_rights, request.en_passant, request.halfmove, request.fullmove)
+    except Exception as e:
+        metrics.REQUEST_ERRORS.inc(endpoint="analyze_stream")
+        return {"error": f"API Exception: {str(e)}"}
+
+    multipv = min(max(request.multipv or 1, 1), MAX_MULTIPV)
+
+    lookup = None
+    if book is not None or tablebase is not None:
+        from src.API.Engine import probe_tables
 
-        return {"best_move": best_move, "execution_time": f"{execution_time:.4f} seconds"}
+        lookup = await asyncio.to_thread(probe_tables, fen, book, tablebase)
+
+    async def events():
+        yield sse("position", {"fen": fen})
+        if lookup is not None:
+            # Book or tablebase move, no search to stream
+            metrics.REQUEST_SECONDS.observe(time.time() - start_time, endpoint="analyze_stream")
+            yield sse("bestmove", {
+                "best_move": lookup["best_move"], "ponder": None, "depth": lookup["depth"], "score": lookup["score"],
+                "lines": [], "stopped": False, "source": lookup["lookup"]
+            })
+            return
+        try:
+            # A client disconnect cancels this generator; closing analyse() then stops the search
+            async with stream_engines.lease() as uci, aclosing(uci.analyse(
+                fen, depth=request.depth, movetime=request.movetime, nodes=request.nodes, multipv=multipv,
+                deadline=deadline
+            )) as updates:
+                async for update in updates:
+                    if update["type"] == "bestmove" and analysis_cache is not None and update["best_move"] \
+                            and update["depth"]:
+                        analysis_cache.put(fen, update["best_move"], update["score"], update["depth"])
+                    yield sse(update.pop("type"), update)
+            metrics.REQUEST_SECONDS.observe(time.time() - start_time, endpoint="analyze_stream")
+        except Exception as e:
+            metrics.REQUEST_ERRORS.inc(endpoint="analyze_stream")
+            yield sse("error", {"error": f"API Exception: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/analyze/batch/")
+async def analyze_chessboards(request: BatchImageRequest):
+    """
+    Recognizes many chessboard images with batched CNN inference.
+    Returns the FEN (and best move if a turn is given) for each image, in request order.
+    """
+    if not is_ready():
+        return not_ready_response()
+    start_time = time.time()
+
+    try:
+        board_states = await scheduler.run_in_worker(
+            recognizer.predict_boards, request.image_paths, request.chunk_size, None,
+            [request.turn] * len(request.image_paths)
+        )
+
+        results = []
+        for image_path, board_state in zip(request.image_paths, board_states):
+            if isinstance(board_state, utils.IllegalPositionError):
+                results.append({"image_path": image_path, "error": str(board_state)})
+                continue
+            with metrics.timed("fen"):
+                fen = board_state.fen(turn=request.turn or "w")
+            result = {"image_path": image_path, "fen": fen}
+            if request.turn:
+                try:
+                    result["best_move"] = await run_engine(engine.get_next_move, board_state, request.turn)
+                except utils.IllegalPositionError as e:
+                    result["error"] = str(e)
+            results.append(result)
+
+        execution_time = time.time() - start_time
+        metrics.REQUEST_SECONDS.observe(execution_time, endpoint="analyze_batch")
+        utils.logger.debug(f"Batch of {len(results)} boards processed in {execution_time:.4f} seconds")
+
+        return {"results": results, "execution_time": f"{execution_time:.4f} seconds"}
 
     except Exception as e:
+        metrics.REQUEST_ERRORS.inc(endpoint="analyze_batch")
         return {"error": f"API Exception: {str(e)}"}
 
 
+@app.delete("/game/{game_id}")
+async def end_game(game_id: str):
+    """Drops a finished game's session."""
+    return {"game_id": game_id, "dropped": sessions.drop(game_id)}
+
+
+@app.get("/ready/")
+async def readiness():
+    """
+    Reports startup progress and the number of live Stockfish engines. Returns 503 until the model, engine and
+    warm-up inference are done, and while every engine is crashed or restarting.
+    """
+    live = engine.live_engines() if engine is not None else 0
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"ready": False, "startup": startup, "live_engines": live})
+    return {"ready": True, "startup": startup, "live_engines": live}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text format: per-stage timing histograms, request latency, batch sizes, cache and engine counters."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/test/")
 async def test_connection(message: str):
     return {"response": message}
@@ -1,16 +1,67 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
 from stockfish import Stockfish
 
-from src.misc import utils
+from src.misc import metrics, utils
 
 STOCKFISH_PATH = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\resources\stockfish\stockfish-windows-x86-64-avx2.exe"
 
+# Time-budgeted searches (see budget_limits)
+SEARCH_OVERHEAD_MS = 15  # Pipe round trip and bestmove parsing on top of the movetime
+MIN_MOVETIME_MS = 20  # Below this a timed search barely gets past the first depths, a fixed shallow search is used
+FALLBACK_DEPTH = 6  # Shallow search depth when the budget is nearly spent, a few ms for Stockfish
+
+
+def budget_limits(deadline, depth=None, movetime=None, nodes=None):
+    """
+    Search limits that fit the time left until `deadline` (a time.monotonic() value). With enough time left the
+    remainder becomes the movetime (capped by the request's own limits); otherwise the search falls back to
+    FALLBACK_DEPTH, where a cached analysis of at least that depth is used instead of searching.
+    Returns (limits, mode) with mode "movetime" or "shallow".
+    """
+    remaining_ms = (deadline - time.monotonic()) * 1000 - SEARCH_OVERHEAD_MS
+    if remaining_ms >= MIN_MOVETIME_MS:
+        movetime = int(min(remaining_ms, movetime or remaining_ms))
+        return {"depth": depth, "movetime": movetime, "nodes": nodes}, "movetime"
+    return {"depth": min(depth or FALLBACK_DEPTH, FALLBACK_DEPTH), "movetime": None, "nodes": nodes}, "shallow"
+
+
+def position_fen(placement, turn, castling_rights=None, en_passant="-", halfmove=0, fullmove=1):
+    """Full FEN of a placement, castling rights are inferred from the placement when not given."""
+    castling_rights = castling_rights or utils.infer_castling_rights(placement)
+    return f"{placement} {turn} {castling_rights} {en_passant} {halfmove} {fullmove}"
+
+
+def probe_tables(fen, book=None, tablebase=None):
+    """
+    Returns the opening book or tablebase analysis of `fen` (best_move, score, depth, lookup) without searching,
+    None if neither has the position. A failing probe only costs the fast path, the position is then searched.
+    """
+    for source, table in (("book", book), ("tablebase", tablebase)):
+        if table is None:
+            continue
+        try:
+            entry = table.probe(fen)
+        except Exception as e:
+            print(f"[ERROR] {source} lookup failed for {fen}: {e}")
+            entry = None
+        metrics.LOOKUPS.inc(source=source, result="hit" if entry else "miss")
+        if entry:
+            return {"best_move": entry["best_move"], "score": entry["score"], "depth": entry["depth"], "lookup": source}
+    return None
+
+
 class Engine:
     """Handles interaction with the Stockfish engine."""
 
-    def __init__(self):
-        """Initialize Stockfish engine."""
+    def __init__(self, cache=None):
+        """Initialize Stockfish engine. `cache` is an optional AnalysisCache shared between engines."""
         self.stockfish = self.start_stockfish()
-        self.game_fen = None
+        self.cache = cache
+        self.last_analysis = None  # best_move, score, depth and cache hit flag of the last search
 
     @staticmethod
     def start_stockfish():
@@ -21,76 +72,267 @@ class Engine:
             print(f"[ERROR] Failed to start Stockfish: {e}")
             return None
 
-    def get_next_move(self, board_state, turn):
-        """Returns the best move from Stockfish given a board state and updates game state."""
+    def get_next_move(self, board_state, turn, castling_rights=None, en_passant="-", halfmove=0, fullmove=1,
+                      depth=None, movetime=None, nodes=None):
+        """
+        Returns the best move from Stockfish for a single Board, without any game history.
+        Castling rights are inferred from the piece placement when not given.
+        depth, movetime (ms) and nodes limit the search; without limits the engine default depth is used.
+        """
         if not self.is_alive():
             self.restart_stockfish()
 
-        # Update game state before getting the best move
-        self.update_game_state(board_state, turn)
-        best_move = self.stockfish.get_best_move()
+        with metrics.timed("fen"):
+            placement = board_state.placement
+        fen = position_fen(placement, turn, castling_rights, en_passant, halfmove, fullmove)
+        self.stockfish.set_fen_position(fen)
 
-        # Apply the move and update the FEN
-        self.stockfish.make_moves_from_current_position([best_move])
-        self.game_fen = self.stockfish.get_fen_position()
+        return self.analyse(fen, depth=depth, movetime=movetime, nodes=nodes)
+
+    def get_session_move(self, session, board_state, turn, depth=None, movetime=None, nodes=None):
+        """
+        Returns the best move for a board within a game session. The position is sent to Stockfish as
+        `position fen <start> moves ...` without ucinewgame, so its hash carries over between moves.
+        The suggested move is recorded in the session as the move we expect to be played.
+        """
+        if not self.is_alive():
+            self.restart_stockfish()
+
+        with metrics.timed("fen"):
+            placement = board_state.placement
+        session.sync(placement, turn)
+        self.set_position(session.start_fen, session.moves)
+        best_move = self.analyse(session.current_fen, depth=depth, movetime=movetime, nodes=nodes)
+
+        if best_move:
+            session.play(best_move)
 
         return best_move
 
+    def set_position(self, fen, moves=None):
+        """Sets a position plus moves in Stockfish, keeping its hash table (no ucinewgame)."""
+        self.stockfish._prepare_for_new_position(False)
+        command = f"position fen {fen}"
+        if moves:
+            command += f" moves {' '.join(moves)}"
+        self.stockfish._put(command)
+
     def is_alive(self):
         """Checks if Stockfish is still responsive."""
         if self.stockfish is None:
             return False
 
         try:
-            # Try getting a move to see if Stockfish is still alive
-            self.stockfish.get_best_move()
+            # isready/readyok round trip, no search involved
+            self.stockfish._is_ready()
             return True  # Stockfish is alive
         except Exception:
             return False  # Stockfish has crashed
 
+    def analyse(self, fen, depth=None, movetime=None, nodes=None):
+        """
+        Returns the best move for `fen`, which must already be set in Stockfish. A cached analysis is
+        used if it reached the requested depth (the engine default depth when no depth is given),
+        otherwise a search runs and its result is cached.
+        """
+        min_depth = depth if depth is not None else int(self.stockfish.depth)
+        if self.cache is not None:
+            entry = self.cache.get(fen, min_depth)
+            if entry is not None:
+                self.last_analysis = {**entry, "cached": True}
+                return entry["best_move"]
+
+        best_move = self.search(depth=depth, movetime=movetime, nodes=nodes)
+        info = self.parse_info(self.stockfish.info)
+        self.last_analysis = {"best_move": best_move, "score": info["score"], "depth": info["depth"], "cached": False}
+
+        if self.cache is not None and best_move and info["depth"]:
+            self.cache.put(fen, best_move, info["score"], info["depth"])
+
+        return best_move
+
+    @staticmethod
+    def parse_info(line):
+        """Extracts depth and score ({'cp': n} or {'mate': n}) from a UCI `info` line."""
+        tokens = line.split(" ")
+        info = {"depth": 0, "score": None}
+        for i, token in enumerate(tokens[:-1]):
+            if token == "depth":
+                info["depth"] = int(tokens[i + 1])
+            elif token == "score" and i + 2 < len(tokens):
+                info["score"] = {tokens[i + 1]: int(tokens[i + 2])}
+        return info
+
+    @metrics.timed("engine_search")
+    def search(self, depth=None, movetime=None, nodes=None):
+        """Runs a search on the current position with optional depth, movetime (ms) and node limits."""
+        if depth is None and movetime is None and nodes is None:
+            return self.stockfish.get_best_move()
+
+        command = "go"
+        if depth is not None:
+            command += f" depth {depth}"
+        if movetime is not None:
+            command += f" movetime {movetime}"
+        if nodes is not None:
+            command += f" nodes {nodes}"
+        self.stockfish._put(command)
+        return self.stockfish._get_best_move_from_sf_popen_process()
+
+    @metrics.timed("engine_restart")
     def restart_stockfish(self):
         """Restarts Stockfish if it crashes."""
         print("[ERROR] -- Stockfish crashed. Restarting...")
         self.stockfish = self.start_stockfish()
 
-    def get_game_state(self):
-        """Returns the current game state including castling rights and en passant target."""
-        if self.game_fen is None:
-            return None
 
-        fen_parts = self.game_fen.split(" ")
-        return {
-            "fen": self.game_fen,
-            "castling_rights": fen_parts[2],  # Castling rights (KQkq or -)
-            "en_passant": fen_parts[3]  # En passant target square (e.g., "e3" or "-")
-        }
-
-    def update_game_state(self, board_state, turn):
-        """Updates game state by setting the FEN based on the board state, including castling rights and en passant."""
-
-        # If it's the first move, assume all castling rights are available
-        if self.game_fen is None:
-            castling_rights = "KQkq"
-            en_passant = "-"
-            halfmove = "0"
-            fullmove = "1"
+class EnginePool:
+    """
+    Keeps `size` warm Stockfish processes and leases one engine per request.
+
+    Engines are health-checked with an isready ping when leased. Crashed engines are handed to a
+    background thread that restarts them and returns them to the pool, so requests never wait on a restart
+    while another engine is available. Positions in the opening `book` or the Syzygy `tablebase` are answered
+    before an engine is leased.
+    """
+
+    def __init__(self, size=2, lease_timeout=30.0, cache=None, book=None, tablebase=None):
+        self.size = size
+        self.lease_timeout = lease_timeout
+        self.cache = cache
+        self.book = book
+        self.tablebase = tablebase
+        self.idle = queue.Queue()
+        self.crashed = queue.Queue()
+        self.dead = 0  # Engines in `crashed` or being restarted
+        self.dead_lock = threading.Lock()
+        self.closed = threading.Event()
+
+        for _ in range(size):
+            engine = Engine(cache=cache)
+            if engine.stockfish is None:
+                metrics.ENGINE_CRASHES.inc()
+                self._mark_crashed(engine)
+            else:
+                self.idle.put(engine)
+
+        self._restarter = threading.Thread(target=self._restart_crashed, name="stockfish-restarter", daemon=True)
+        self._restarter.start()
+
+    def live_engines(self):
+        """Number of engines that are idle or leased, i.e. not crashed or restarting."""
+        with self.dead_lock:
+            return self.size - self.dead
+
+    def _mark_crashed(self, engine):
+        with self.dead_lock:
+            self.dead += 1
+        self.crashed.put(engine)
+
+    def _restart_crashed(self):
+        """Background loop restarting crashed engines and putting them back into the pool, until close()."""
+        while not self.closed.is_set():
+            try:
+                engine = self.crashed.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            engine.restart_stockfish()
+            if engine.is_alive():
+                with self.dead_lock:
+                    self.dead -= 1
+                self.idle.put(engine)
+            else:
+                self.closed.wait(1.0)  # Back off before trying this engine again
+                self.crashed.put(engine)
+
+    def close(self):
+        """Stops the restarter thread."""
+        self.closed.set()
+
+    @contextmanager
+    def lease(self):
+        """Leases a healthy engine for the duration of the block."""
+        deadline = time.monotonic() + self.lease_timeout
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("No Stockfish engine available in the pool")
+            try:
+                engine = self.idle.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if engine.is_alive():
+                break
+            metrics.ENGINE_CRASHES.inc()
+            self._mark_crashed(engine)
+
+        try:
+            yield engine
+        except Exception:
+            # The engine may be left mid-search or dead, let the restarter deal with it
+            metrics.ENGINE_CRASHES.inc()
+            self._mark_crashed(engine)
+            raise
         else:
-            # Extract previous castling rights & en passant info from FEN
-            fen_parts = self.game_fen.split(" ")
-            castling_rights = fen_parts[2] if len(fen_parts) > 2 else "-"
-            en_passant = fen_parts[3] if len(fen_parts) > 3 else "-"
-            halfmove = fen_parts[4] if len(fen_parts) > 4 else "0"
-            fullmove = fen_parts[5] if len(fen_parts) > 5 else "1"
-
-        # Generate updated FEN
-        self.game_fen = utils.board_to_fen(
-            board_state=board_state,
-            turn=turn,
-            castling_rights=castling_rights,
-            en_passant=en_passant,
-            halfmove=halfmove,
-            fullmove=fullmove
-        )
-
-        # Set the updated FEN position in Stockfish
-        self.stockfish.set_fen_position(self.game_fen)
\ No newline at end of file
+            self.idle.put(engine)
+
+    def get_next_move(self, board_state, turn, **kwargs):
+        """Leases an engine and returns the best move for the given board state."""
+        return self.get_next_analysis(board_state, turn, **kwargs)["best_move"]
+
+    def get_session_move(self, session, board_state, turn, **kwargs):
+        """Leases an engine and returns the best move within a game session."""
+        return self.get_session_analysis(session, board_state, turn, **kwargs)["best_move"]
+
+    def lookup(self, fen):
+        """Book or tablebase analysis of `fen` in the shape of report(), None if the position has to be searched."""
+        analysis = probe_tables(fen, self.book, self.tablebase)
+        if analysis is None:
+            return None
+        return {**analysis, "cached": False, "mode": analysis["lookup"]}
+
+    def get_next_analysis(self, board_state, turn, castling_rights=None, en_passant="-", halfmove=0, fullmove=1,
+                          deadline=None, **kwargs):
+        """
+        Like get_next_move, but returns the engine's analysis (best_move, score, depth, cached) plus the search
+        `mode` ("book" or "tablebase" for lookups, which never lease an engine). With a `deadline`
+        (time.monotonic()), the search limits are fitted to the time left once an engine is leased, see budget_limits.
+        """
+        # Reject impossible boards here, an illegal position can crash Stockfish and cost a restart
+        utils.check_position(board_state.placement, turn)
+        analysis = self.lookup(position_fen(board_state.placement, turn, castling_rights, en_passant, halfmove, fullmove))
+        if analysis is not None:
+            return analysis
+        with self.lease() as engine:
+            kwargs, mode = self.fit_limits(deadline, kwargs)
+            engine.get_next_move(board_state, turn, castling_rights, en_passant, halfmove, fullmove, **kwargs)
+            return self.report(engine.last_analysis, mode)
+
+    def get_session_analysis(self, session, board_state, turn, deadline=None, **kwargs):
+        """get_session_move returning the analysis, see get_next_analysis."""
+        utils.check_position(board_state.placement, turn)
+        with session.lock:
+            session.sync(board_state.placement, turn)
+            analysis = self.lookup(session.current_fen)
+            if analysis is not None:
+                session.play(analysis["best_move"])
+                return analysis
+            with self.lease() as engine:
+                kwargs, mode = self.fit_limits(deadline, kwargs)
+                engine.get_session_move(session, board_state, turn, **kwargs)
+                return self.report(engine.last_analysis, mode)
+
+    @staticmethod
+    def fit_limits(deadline, kwargs):
+        if deadline is None:
+            return kwargs, "limits"
+        limits, mode = budget_limits(deadline, kwargs.pop("depth", None), kwargs.pop("movetime", None),
+                                     kwargs.pop("nodes", None))
+        return {**kwargs, **limits}, mode
+
+    @staticmethod
+    def report(analysis, mode):
+        if analysis["cached"]:
+            mode = "cache"
+        return {**analysis, "mode": mode}
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+from src.misc import utils
+
+
+class GameSession:
+    """Game state for one client game: the starting FEN plus the UCI moves played since."""
+
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self.start_fen = None
+        self.moves = []  # UCI moves played from start_fen
+        self.fen_history = []  # FEN after each position update, oldest first
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()  # Serializes concurrent requests for the same game
+
+    @property
+    def current_fen(self):
+        return self.fen_history[-1] if self.fen_history else None
+
+    def reset(self, fen):
+        """Starts the session over from a FEN, dropping the move list."""
+        self.start_fen = fen
+        self.moves = []
+        self.fen_history = [fen]
+
+    def push(self, move, fen):
+        """Records a move and the FEN it leads to."""
+        self.moves.append(move)
+        self.fen_history.append(fen)
+
+    def pop(self):
+        """Takes back the last recorded move."""
+        self.moves.pop()
+        self.fen_history.pop()
+
+    def sync(self, placement, turn):
+        """
+        Brings the session up to the observed board. Repeated frames keep the session as is, a single
+        opponent move is appended, and anything that can't be explained by one move restarts the session
+        from the observed board. No engine is involved, so the position can be probed before leasing one.
+        """
+        def matches(fen):
+            return fen is not None and fen.split(" ")[:2] == [placement, turn]
+
+        if matches(self.current_fen):
+            return
+
+        # Same frame as before our last suggestion, i.e. the suggested move hasn't been played yet
+        if len(self.fen_history) > 1 and matches(self.fen_history[-2]):
+            self.pop()
+            return
+
+        if self.current_fen is not None:
+            current_placement, side = self.current_fen.split(" ")[:2]
+            move = utils.infer_move(current_placement, placement, side) if side != turn else None
+            if move:
+                fen = utils.play_move(self.current_fen, move)
+                if matches(fen):
+                    self.push(move, fen)
+                    return
+
+        self.reset(f"{placement} {turn} {utils.infer_castling_rights(placement)} - 0 1")
+
+    def play(self, move):
+        """Records our suggested move as the one we expect to be played next."""
+        self.push(move, utils.play_move(self.current_fen, move))
+
+
+class SessionStore:
+    """Thread-safe LRU of game sessions keyed by game id, with idle sessions expiring after `ttl` seconds."""
+
+    def __init__(self, max_sessions=256, ttl=1800.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, game_id):
+        """Returns the session for game_id, creating it if needed, and evicts idle or overflowing sessions."""
+        now = time.monotonic()
+        with self.lock:
+            self._evict_expired(now)
+
+            session = self.sessions.pop(game_id, None) or GameSession(game_id)
+            session.last_used = now
+            self.sessions[game_id] = session  # Most recently used goes last
+
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+            return session
+
+    def drop(self, game_id):
+        """Forgets a game, e.g. once it has finished."""
+        with self.lock:
+            return self.sessions.pop(game_id, None) is not None
+
+    def _evict_expired(self, now):
+        # Sessions are kept in last-used order, so expired ones are at the front
+        while self.sessions:
+            game_id, session = next(iter(self.sessions.items()))
+            if now - session.last_used < self.ttl:
+                break
+            del self.sessions[game_id]
+
+    def __len__(self):
+        return len(self.sessions)
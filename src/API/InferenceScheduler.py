@@ -0,0 +1,109 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from src.misc import metrics
+
+
+class InferenceScheduler:
+    """
+    Collects concurrent board recognition requests into micro-batches.
+
+    Requests are queued on the event loop; a background task waits up to `max_wait_ms` (or until
+    `max_batch_size` boards are queued), runs the whole batch through `recognizer.predict_boards`
+    on a dedicated worker thread and resolves each request's future with its board state.
+    """
+
+    def __init__(self, recognizer, max_batch_size=32, max_wait_ms=5.0):
+        self.recognizer = recognizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # One worker thread: the Keras model is shared and is not called concurrently
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cnn-inference")
+        self.queue = None
+        self._worker = None
+
+    def _ensure_started(self):
+        """Starts the batching task on the running event loop the first time it is needed."""
+        if self._worker is None or self._worker.done():
+            self.queue = self.queue or asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict_board(self, image, source=None, turn=None):
+        """
+        Queues one board for recognition and waits for its 8x8 board state. `source` keys the board geometry
+        cache, `turn` is the side to move the position validator checks the board against.
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image, source, turn, future))
+        return await future
+
+    async def run_in_worker(self, fn, *args):
+        """Runs a blocking call on the inference thread, serialized with the batches."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _collect_batch(self):
+        """Blocks for the first request, then gathers more until the batch is full or max_wait elapses."""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                # Wakes as soon as a request arrives, no polling while the window is open
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            batch = [request for request in batch if not request[-1].cancelled()]
+            if not batch:
+                continue
+
+            images, sources, turns, _ = (list(column) for column in zip(*batch))
+            metrics.BATCH_SIZE.observe(len(images))
+            try:
+                board_states = await self.run_in_worker(
+                    self.recognizer.predict_boards, images, len(images), sources, turns
+                )
+            except Exception:
+                # One bad image should not fail the whole batch, retry each board on its own
+                for image, source, turn, future in batch:
+                    try:
+                        board_state = (await self.run_in_worker(
+                            self.recognizer.predict_boards, [image], 1, [source], [turn]
+                        ))[0]
+                    except Exception as e:
+                        board_state = e
+                    self._resolve(future, board_state)
+                continue
+
+            for (_, _, _, future), board_state in zip(batch, board_states):
+                self._resolve(future, board_state)
+
+    @staticmethod
+    def _resolve(future, board_state):
+        """Completes a request's future; boards rejected by the position validator come back as exceptions."""
+        if future.done():
+            return
+        if isinstance(board_state, Exception):
+            future.set_exception(board_state)
+        else:
+            future.set_result(board_state)
+
+    async def close(self):
+        """Stops the batching task and the inference thread."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,245 @@
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.misc.Board import CODE_TO_SYMBOL, EMPTY, Board
+
+# Polyglot's 16-byte entry layout: big-endian position key, move, weight and a learn field we leave at 0
+ENTRY_DTYPE = np.dtype([("key", ">u8"), ("move", ">u2"), ("weight", ">u2"), ("learn", ">u4")])
+PROMOTIONS = " nbrq"
+
+# Our own Zobrist keys, fixed by the seed so every book built with this module hashes the same way. They are not
+# Polyglot's keys, which is why Polyglot .bin books go through PolyglotBook instead.
+BOOK_SEED = 0x526F6F6B
+_rng = np.random.default_rng(BOOK_SEED)
+PIECE_KEYS = _rng.integers(0, 2 ** 64, (len(CODE_TO_SYMBOL), 64), dtype=np.uint64)
+PIECE_KEYS[EMPTY] = 0
+CASTLING_KEYS = dict(zip("KQkq", _rng.integers(0, 2 ** 64, 4, dtype=np.uint64)))
+EN_PASSANT_KEYS = _rng.integers(0, 2 ** 64, 8, dtype=np.uint64)
+TURN_KEY = _rng.integers(0, 2 ** 64, dtype=np.uint64)
+SQUARES = np.arange(64)
+
+
+def position_key(fen):
+    """
+    64-bit Zobrist key of a FEN's placement, side to move, castling rights and en passant file. As in Polyglot,
+    the en passant file only counts if a pawn of the side to move stands next to the double-pushed pawn,
+    so FENs that always write the square and FENs that only write capturable ones hash the same.
+    """
+    fields = fen.split(" ")
+    codes = Board.from_fen(fields[0]).codes
+    key = np.bitwise_xor.reduce(PIECE_KEYS[codes, SQUARES])
+    turn = fields[1] if len(fields) > 1 else "w"
+    if turn == "w":
+        key ^= TURN_KEY
+    for right in (fields[2] if len(fields) > 2 else "-"):
+        key ^= CASTLING_KEYS.get(right, np.uint64(0))
+
+    en_passant = fields[3] if len(fields) > 3 else "-"
+    if en_passant != "-":
+        col = "abcdefgh".index(en_passant[0])
+        row, pawn = (3, "P") if turn == "w" else (4, "p")  # Rank of the capturing pawns
+        neighbours = [row * 8 + c for c in (col - 1, col + 1) if 0 <= c < 8]
+        if any(CODE_TO_SYMBOL[codes[square]] == pawn for square in neighbours):
+            key ^= EN_PASSANT_KEYS[col]
+    return int(key)
+
+
+def encode_move(move):
+    """UCI move -> Polyglot 16-bit move (to file, to rank, from file, from rank, promotion piece)."""
+    from_file, from_rank, to_file, to_rank = "abcdefgh".index(move[0]), int(move[1]) - 1, "abcdefgh".index(move[2]), int(move[3]) - 1
+    promotion = PROMOTIONS.index(move[4]) if len(move) > 4 else 0
+    return to_file | to_rank << 3 | from_file << 6 | from_rank << 9 | promotion << 12
+
+
+def decode_move(value):
+    """Polyglot 16-bit move -> UCI move. Castling is stored as the king's two-square move (e1g1), not as king takes rook."""
+    value = int(value)
+    move = f"{'abcdefgh'[value >> 6 & 7]}{(value >> 9 & 7) + 1}{'abcdefgh'[value & 7]}{(value >> 3 & 7) + 1}"
+    promotion = value >> 12 & 7
+    return move + PROMOTIONS[promotion] if promotion else move
+
+
+class OpeningBook:
+    """
+    Opening book in our own binary format: Polyglot-style 16-byte entries sorted by position_key.
+
+    The file is memory-mapped and its keys are binary-searched, so a lookup costs a hash of the board and one
+    searchsorted, with no engine involved. probe() returns the highest-weighted move of a position.
+    """
+
+    def __init__(self, path, min_weight=1):
+        self.path = path
+        self.min_weight = min_weight
+        size = os.path.getsize(path)
+        if size % ENTRY_DTYPE.itemsize:
+            raise ValueError(f"{path} is not an opening book: size isn't a multiple of {ENTRY_DTYPE.itemsize} bytes")
+        self.entries = np.memmap(path, dtype=ENTRY_DTYPE, mode="r") if size else np.zeros(0, dtype=ENTRY_DTYPE)
+        self.keys = self.entries["key"].astype(np.uint64)  # Native byte order for searchsorted
+
+    def __len__(self):
+        return len(self.entries)
+
+    def moves(self, fen):
+        """All book moves for `fen` as [(uci_move, weight)], highest weight first."""
+        key = np.uint64(position_key(fen))
+        start, end = np.searchsorted(self.keys, key, "left"), np.searchsorted(self.keys, key, "right")
+        entries = self.entries[start:end]
+        order = np.argsort(-entries["weight"].astype(np.int64), kind="stable")
+        return [(decode_move(entries["move"][i]), int(entries["weight"][i])) for i in order]
+
+    def probe(self, fen):
+        """Best book move for `fen` as {best_move, score, depth, weight}, None when the position isn't in the book."""
+        moves = self.moves(fen)
+        if not moves or moves[0][1] < self.min_weight:
+            return None
+        move, weight = moves[0]
+        # Guard against a key collision: the move has to start on a piece of the side to move
+        piece = CODE_TO_SYMBOL[Board.from_fen(fen).codes[(8 - int(move[1])) * 8 + "abcdefgh".index(move[0])]]
+        if not piece or piece.isupper() != (fen.split(" ")[1] == "w"):
+            return None
+        return {"best_move": move, "score": None, "depth": None, "weight": weight}
+
+
+class PolyglotBook:
+    """Standard Polyglot .bin book, read with python-chess (pip install chess) since it needs Polyglot's own keys."""
+
+    def __init__(self, path, min_weight=1):
+        import chess.polyglot
+
+        self.path = path
+        self.min_weight = min_weight
+        self.reader = chess.polyglot.open_reader(path)
+
+    def __len__(self):
+        return len(self.reader)
+
+    def moves(self, fen):
+        import chess
+
+        entries = sorted(self.reader.find_all(chess.Board(fen)), key=lambda entry: -entry.weight)
+        return [(entry.move.uci(), entry.weight) for entry in entries]
+
+    def probe(self, fen):
+        moves = self.moves(fen)
+        if not moves or moves[0][1] < self.min_weight:
+            return None
+        return {"best_move": moves[0][0], "score": None, "depth": None, "weight": moves[0][1]}
+
+
+def open_book(path, min_weight=1):
+    """Opens a Polyglot .bin book or one of our .book files."""
+    if path.endswith(".bin"):
+        return PolyglotBook(path, min_weight)
+    return OpeningBook(path, min_weight)
+
+
+class BookBuilder:
+    """
+    Builds an OpeningBook from PGN games. Parsing PGN needs python-chess (pip install chess); serving the book doesn't.
+
+    Every position up to `max_ply` half-moves into a game is counted with the move played, weighted like Polyglot
+    books: 2 for a win of the side that moved, 1 for a draw. Moves seen in fewer than `min_games` games, or that
+    never scored, are left out.
+    """
+
+    def __init__(self, max_ply=20, min_games=2, min_elo=None):
+        self.max_ply = max_ply
+        self.min_games = min_games
+        self.min_elo = min_elo
+        self.games = 0
+        self.stats = defaultdict(lambda: [0, 0])  # (key, move) -> [games, weight]
+
+    def add_pgn(self, pgn_path):
+        import chess.pgn
+
+        with open(pgn_path, "r", encoding="utf-8", errors="replace") as file:
+            while True:
+                game = chess.pgn.read_game(file)
+                if game is None:
+                    break
+                self.add_game(game)
+
+    def add_game(self, game):
+        headers = game.headers
+        if self.min_elo:
+            try:
+                if min(int(headers.get("WhiteElo", 0)), int(headers.get("BlackElo", 0))) < self.min_elo:
+                    return
+            except ValueError:
+                return
+        if headers.get("Variant", "Standard").lower() not in ("standard", "chess") or "FEN" in headers:
+            return  # Only games from the standard starting position
+
+        scores = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}.get(headers.get("Result"))
+        if scores is None:
+            return
+        self.games += 1
+
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= self.max_ply:
+                break
+            stats = self.stats[(position_key(board.fen()), move.uci())]
+            stats[0] += 1
+            stats[1] += scores[0] if board.turn else scores[1]
+            board.push(move)
+
+    def entries(self):
+        """Sorted book entries, weights of each position scaled to fit 16 bits."""
+        kept = [(key, move, weight) for (key, move), (games, weight) in self.stats.items()
+                if games >= self.min_games and weight > 0]
+        entries = np.zeros(len(kept), dtype=ENTRY_DTYPE)
+        if not kept:
+            return entries
+        entries["key"] = [key for key, _, _ in kept]
+        entries["move"] = [encode_move(move) for _, move, _ in kept]
+        weights = np.array([weight for _, _, weight in kept], dtype=np.int64)
+
+        order = np.lexsort((-weights, entries["key"].astype(np.uint64)))
+        entries, weights = entries[order], weights[order]
+        keys = entries["key"].astype(np.uint64)
+        new_position = np.r_[True, keys[1:] != keys[:-1]]
+        # Best move first within each position, so the first weight of a run is the position's maximum
+        position_max = weights[new_position][np.cumsum(new_position) - 1]
+        scale = np.where(position_max > 0xFFFF, 0xFFFF / position_max, 1.0)
+        entries["weight"] = np.maximum(1, (weights * scale).astype(np.int64))
+        return entries
+
+    def write(self, path):
+        entries = self.entries()
+        # Write then rename, so the API never memory-maps a half-written book
+        with open(path + ".tmp", "wb") as file:
+            entries.tofile(file)
+        os.replace(path + ".tmp", path)
+        return len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN files, or look up a position in one")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build a .book file from PGN games")
+    build.add_argument("pgns", nargs="+", help="PGN files")
+    build.add_argument("--output", required=True, help="Book file to write, e.g. resources/book/openings.book")
+    build.add_argument("--max-ply", type=int, default=20, help="Half-moves per game that go into the book")
+    build.add_argument("--min-games", type=int, default=2, help="Games a move must appear in to be kept")
+    build.add_argument("--min-elo", type=int, default=None, help="Skip games with a player rated below this")
+    probe = subparsers.add_parser("probe", help="Print the book moves of a position")
+    probe.add_argument("book", help=".book or Polyglot .bin file")
+    probe.add_argument("fen")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        builder = BookBuilder(args.max_ply, args.min_games, args.min_elo)
+        for pgn_path in args.pgns:
+            builder.add_pgn(pgn_path)
+            print(f"{pgn_path}: {builder.games} games so far")
+        count = builder.write(args.output)
+        print(f"Wrote {count} entries for {len(builder.stats)} position/move pairs to {args.output}")
+    else:
+        for move, weight in open_book(args.book).moves(args.fen):
+            print(f"{move}  {weight}")
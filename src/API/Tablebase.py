@@ -0,0 +1,66 @@
+import os
+import threading
+
+
+class Tablebase:
+    """
+    Local Syzygy endgame tablebases, probed with python-chess (pip install chess).
+
+    Positions with at most `max_pieces` pieces (taken from the table files found, e.g. 5 for the 3-4-5 piece set)
+    and no castling rights are answered without a search: every legal move is scored by the WDL of the resulting
+    position, and among the best the shortest distance to zeroing (DTZ) is played when winning, the longest when
+    losing. `path` is a directory, or several joined with os.pathsep.
+    """
+
+    def __init__(self, path):
+        import chess.syzygy
+
+        self.path = path
+        self.tablebase = chess.syzygy.open_tablebase(path)
+        self.lock = threading.Lock()  # The python-chess prober keeps open file handles and isn't meant to be shared
+        self.max_pieces = 0
+        for directory in path.split(os.pathsep):
+            for name in os.listdir(directory):
+                table, extension = os.path.splitext(name)
+                if extension == ".rtbw":
+                    self.max_pieces = max(self.max_pieces, len(table.replace("v", "")))
+        if not self.max_pieces:
+            raise ValueError(f"No Syzygy WDL tables (.rtbw) in {path}")
+
+    def probe(self, fen):
+        """Tablebase move for `fen` as {best_move, score: {"wdl": n}, depth, dtz}, None when it can't be probed."""
+        placement = fen.split(" ")[0]
+        if sum(char.isalpha() for char in placement) > self.max_pieces:
+            return None  # Cheap reject for the positions that never reach the tables
+
+        import chess
+        import chess.syzygy
+
+        board = chess.Board(fen)
+        if board.castling_rights:
+            return None
+
+        best, best_rank = None, None
+        with self.lock:
+            try:
+                for move in board.legal_moves:
+                    board.push(move)
+                    if board.is_checkmate():
+                        board.pop()
+                        return {"best_move": move.uci(), "score": {"mate": 1}, "depth": None, "dtz": 1}
+                    # Scores of the position after the move are from the opponent's point of view
+                    wdl = -self.tablebase.probe_wdl(board)
+                    dtz = -self.tablebase.probe_dtz(board)
+                    board.pop()
+                    rank = (wdl, -abs(dtz) if wdl > 0 else abs(dtz))
+                    if best_rank is None or rank > best_rank:
+                        best, best_rank = (move, wdl, dtz), rank
+            except (KeyError, chess.syzygy.MissingTableError):
+                return None
+        if best is None:
+            return None  # Checkmate or stalemate, nothing to play
+        move, wdl, dtz = best
+        return {"best_move": move.uci(), "score": {"wdl": wdl}, "depth": None, "dtz": dtz}
+
+    def close(self):
+        self.tablebase.close()
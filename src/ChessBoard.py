@@ -1,10 +1,12 @@
 import os
+import sys
 
 from PIL import ImageGrab, Image
 import numpy as np
 import string
 
-from misc import utils
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.misc.Board import Board
 
 
 class ChessBoard:
@@ -18,12 +20,17 @@ class ChessBoard:
         return screenshot
 
     @staticmethod
-    def extract_squares(image_path, output_dir):
-        """Extracts 64 squares from a 720x720 chessboard image and saves them."""
+    def extract_squares(image_path, output_dir, board_rect=None):
+        """
+        Extracts the 64 squares of a chessboard image and saves them. `board_rect` (left, top, right, bottom),
+        e.g. from BoardLocator, crops the board out of a larger screenshot first.
+        """
         os.makedirs(output_dir, exist_ok=True)
 
         image = Image.open(image_path)
-        square_size = 720 // 8  # 90 pixels per square
+        if board_rect:
+            image = image.crop(board_rect)
+        square_size = image.width // 8  # 90 pixels per square on a 720x720 board
 
         for row in range(8):
             for col in range(8):
@@ -41,40 +48,14 @@ class ChessBoard:
     @staticmethod
     def fen_to_board(fen):
         """Converts a FEN string into a dictionary of piece positions."""
-        rows = fen.split()[0].split("/")  # Get only the board part of FEN
-        board = {}
-
-        ranks = list(range(8, 0, -1))  # Chess ranks (8 to 1)
-        files = list(string.ascii_uppercase[:8])  # Chess files (A to H)
-
-        for row_idx, row in enumerate(rows):
-            file_idx = 0
-            for char in row:
-                if char.isdigit():
-                    file_idx += int(char)  # Empty squares
-                else:
-                    square = f"{files[file_idx]}{ranks[row_idx]}"  # Example: "E4"
-                    board[square] = char
-                    file_idx += 1
-
-        return board
+        files = string.ascii_uppercase[:8]  # Chess files (A to H)
+        grid = Board.from_fen(fen).grid()  # Decoding is cached per placement
+        return {f"{files[col]}{8 - row}": piece for row in range(8) for col in range(8) if (piece := grid[row][col])}
 
     @staticmethod
     def fen_to_square_mapping(fen):
         """Converts a FEN string to an 8x8 array representing piece positions."""
-        rows = fen.split()[0].split("/")  # Extract only piece placement
-        board = []
-
-        for row in rows:
-            expanded_row = []
-            for char in row:
-                if char.isdigit():
-                    expanded_row.extend(["empty"] * int(char))  # Empty squares
-                else:
-                    expanded_row.append(char)  # Chess piece
-            board.append(expanded_row)
-
-        return board
+        return [[piece or "empty" for piece in row] for row in Board.from_fen(fen).grid()]
 
 if __name__ == "__main__":
     fen_str = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
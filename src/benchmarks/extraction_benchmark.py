@@ -0,0 +1,70 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.cnn.SquareExtractor import SquareExtractor
+
+BOARD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../resources/images/chessboard"))
+
+
+def time_call(fn, repeats):
+    """Runs fn `repeats` times and returns the per-call timings in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def run(board_dir=BOARD_DIR, repeats=20, model_path=None):
+    """Compares the per-square extraction loop against the single-resize strided extraction."""
+    extractor = SquareExtractor()
+    boards = sorted(glob.glob(os.path.join(board_dir, "*.png")))
+    if not boards:
+        print(f"No board images found in {board_dir}")
+        return
+
+    loop_times = time_call(lambda: [extractor.extract_squares_loop(path) for path in boards], repeats) / len(boards)
+    fast_times = time_call(lambda: [extractor.extract_squares(path) for path in boards], repeats) / len(boards)
+    uint8_times = time_call(lambda: [extractor.extract_squares(path, dtype=np.uint8) for path in boards], repeats) / len(boards)
+
+    print(f"Boards: {len(boards)} | repeats: {repeats}")
+    print(f"{'method':<16}{'mean (ms)':>12}{'p50 (ms)':>12}{'speedup':>10}")
+    for name, times in (("loop", loop_times), ("batched f32", fast_times), ("batched u8", uint8_times)):
+        speedup = loop_times.mean() / times.mean()
+        print(f"{name:<16}{times.mean():>12.3f}{np.median(times):>12.3f}{speedup:>9.1f}x")
+
+    # Pixel-level difference between both paths (resampling at square borders differs slightly)
+    max_diff = max(
+        np.abs(extractor.extract_squares_loop(path)[0] - extractor.extract_squares(path)).max() for path in boards
+    )
+    print(f"\nMax abs pixel difference (normalized): {max_diff:.4f}")
+
+    if model_path:
+        from tensorflow.keras.models import load_model
+
+        model = load_model(model_path)
+        mismatches = 0
+        for path in boards:
+            loop_squares = extractor.extract_squares_loop(path)[0].reshape(-1, 64, 64, 3)
+            fast_squares = extractor.extract_squares(path).reshape(-1, 64, 64, 3)
+            loop_pred = np.argmax(model.predict(loop_squares, verbose=0), axis=1)
+            fast_pred = np.argmax(model.predict(fast_squares, verbose=0), axis=1)
+            mismatches += int(np.sum(loop_pred != fast_pred))
+        print(f"Prediction mismatches: {mismatches}/{len(boards) * 64} squares")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Square extraction microbenchmark")
+    parser.add_argument("--boards", default=BOARD_DIR, help="Directory of 720x720 board images")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--model", default=None, help="Optional .h5 model to compare predictions")
+    args = parser.parse_args()
+
+    run(args.boards, args.repeats, args.model)
@@ -0,0 +1,130 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.benchmarks.pipeline_benchmark import percentiles
+from src.misc import utils
+
+DATASET_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../resources/dataset/chesspieces"))
+
+
+def count_parameters(backend, model_path):
+    """Trainable plus frozen weights of a Keras or ONNX model, None when the format doesn't expose them."""
+    if hasattr(backend, "model"):
+        return int(backend.model.count_params())
+    if hasattr(backend, "session"):
+        try:
+            import onnx
+        except ImportError:
+            return None
+        model = onnx.load(model_path)
+        return int(sum(np.prod(initializer.dims) for initializer in model.graph.initializer))
+    return None
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, None if the platform doesn't report it."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / 1024 ** 2, 1)
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024, 1)  # Bytes on macOS, KB elsewhere
+
+
+def profile_model(model_path, dataset=None, memmap=None, runs=200, batch_size=256):
+    """
+    Profiles one model in the current process: load time, parameter count, latency of a 64-square board on CPU
+    (uint8 squares in, argmax out, as BoardRecognizer.run_model does) and square accuracy on a labelled dataset.
+    Meant to run in a fresh process per model. The peak memory is read right after the latency runs, so it is
+    the model's alone; the peak after the accuracy pass, which decodes the dataset, is reported separately.
+    """
+    from src.cnn.ModelTester import ModelTester
+
+    start_time = time.perf_counter()
+    tester = ModelTester(model_path, dataset or DATASET_DIR, utils.CLASS_LABELS)
+    load_seconds = time.perf_counter() - start_time
+    width, height = tester.img_size
+
+    squares = np.random.default_rng(42).integers(0, 256, (64, height, width, 3), dtype=np.uint8)
+    timings = []
+    for i in range(runs + 10):
+        start_time = time.perf_counter()
+        inputs = squares.astype(np.float32)
+        inputs *= 1.0 / 255.0
+        np.argmax(tester.model.predict_on_batch(inputs), axis=1)
+        if i >= 10:  # The first calls build kernels and allocate buffers
+            timings.append((time.perf_counter() - start_time) * 1000)
+
+    result = {
+        "model": os.path.basename(model_path),
+        "input_size": [width, height],
+        "parameters": count_parameters(tester.model, model_path),
+        "file_mb": round(os.path.getsize(model_path) / 1024 ** 2, 2),
+        "load_seconds": round(load_seconds, 3),
+        "board_latency": percentiles(timings),
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+    if memmap:
+        result["accuracy"] = tester.test_memmap(memmap, batch_size) / 100
+    elif dataset:
+        report = tester.evaluate(batch_size=batch_size)
+        result["accuracy"] = report["accuracy"]
+        result["images"] = report["images"]
+    if memmap or dataset:
+        result["accuracy_peak_memory_mb"] = peak_memory_mb()
+    return result
+
+
+def compare_models(model_paths, dataset=None, memmap=None, runs=200, batch_size=256):
+    """Profiles each model in its own spawned process, one after the other so they don't compete for cores."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for model_path in model_paths:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(profile_model, model_path, dataset, memmap, runs, batch_size).result())
+    return results
+
+
+def print_table(results, target_ms):
+    print(f"\n{'model':<28}{'input':>8}{'params':>12}{'MB':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'peak MB':>9}{'accuracy':>10}")
+    for result in results:
+        latency = result["board_latency"]
+        params = f"{result['parameters']:,}" if result["parameters"] is not None else "-"
+        accuracy = f"{result['accuracy'] * 100:.2f}%" if "accuracy" in result else "-"
+        peak = result["peak_memory_mb"] if result["peak_memory_mb"] is not None else "-"
+        marker = "" if latency["p50_ms"] < target_ms else "  (over target)"
+        print(f"{result['model']:<28}{'x'.join(map(str, result['input_size'])):>8}{params:>12}{result['file_mb']:>8}"
+              f"{latency['p50_ms']:>10.2f}{latency['p95_ms']:>10.2f}{peak:>9}{accuracy:>10}{marker}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare square classifiers on accuracy, size, CPU latency and memory")
+    parser.add_argument("models", nargs="+", help="Model files (.h5, .tflite or .onnx), e.g. the MobileNetV2 and compact models")
+    parser.add_argument("--dataset", default=None, help="Labelled square folders to measure accuracy on (ideally held out)")
+    parser.add_argument("--memmap", default=None, help="Memmap dataset to measure accuracy on instead of --dataset")
+    parser.add_argument("--runs", type=int, default=200, help="Timed 64-square batches per model")
+    parser.add_argument("--batch-size", type=int, default=256, help="Batch size of the accuracy pass")
+    parser.add_argument("--target-ms", type=float, default=10.0, help="Per-board latency goal, slower models are flagged")
+    parser.add_argument("--json", default=None, help="Write the comparison to this file")
+    args = parser.parse_args()
+
+    comparison = compare_models(args.models, args.dataset, args.memmap, args.runs, args.batch_size)
+    print_table(comparison, args.target_ms)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "cpu_count": os.cpu_count(),
+                       "target_ms": args.target_ms, "models": comparison}, file, indent=2)
+        print(f"\nReport written to {args.json}")
@@ -0,0 +1,259 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.cnn.SquareExtractor import SquareExtractor
+from src.misc.Board import Board
+
+BOARD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../resources/images/chessboard"))
+STAGES = ("decode", "extract", "inference", "fen", "engine")
+
+
+class StubEngine:
+    """Stands in for the Stockfish pool when the binary isn't available. Sleeps `delay_ms` and returns a fixed move."""
+
+    def __init__(self, delay_ms=0.0):
+        self.delay_ms = delay_ms
+
+    def live_engines(self):
+        return 1
+
+    def close(self):
+        pass
+
+    def get_next_move(self, board_state, turn, **kwargs):
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1000)
+        return "e2e4" if turn == "w" else "e7e5"
+
+    def get_session_move(self, session, board_state, turn, **kwargs):
+        return self.get_next_move(board_state, turn)
+
+    def get_next_analysis(self, board_state, turn, deadline=None, **kwargs):
+        return {"best_move": self.get_next_move(board_state, turn), "score": None, "depth": None, "cached": False,
+                "mode": "stub"}
+
+    def get_session_analysis(self, session, board_state, turn, deadline=None, **kwargs):
+        return self.get_next_analysis(board_state, turn)
+
+
+def percentiles(timings_ms, elapsed=None):
+    """p50/p95/p99/mean in milliseconds, plus throughput when the wall-clock time of the run is given."""
+    timings_ms = np.asarray(timings_ms)
+    elapsed = elapsed if elapsed is not None else timings_ms.sum() / 1000
+    return {
+        "count": int(len(timings_ms)),
+        "mean_ms": round(float(timings_ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(timings_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(timings_ms, 99)), 3),
+        "throughput_per_s": round(len(timings_ms) / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def make_engine(stub, stub_delay_ms):
+    """Returns a single Stockfish engine, or the stub when requested or when the binary is missing."""
+    from src.API import Engine
+
+    if not stub and os.path.exists(Engine.STOCKFISH_PATH):
+        engine = Engine.Engine(cache=None)
+        if engine.stockfish is not None:
+            return engine, "stockfish"
+    if not stub:
+        print(f"Stockfish not found at {Engine.STOCKFISH_PATH}, using the stub engine")
+    return StubEngine(stub_delay_ms), "stub"
+
+
+def bench_stages(recognizer, engine, boards, repeats=5, turn="w", depth=None):
+    """
+    Times each pipeline stage separately on every board: decoding the encoded image, slicing the 64 squares,
+    the CNN pass, FEN construction and the engine search. Caches are bypassed so every repeat does the full work.
+    """
+    encoded = []
+    for path in boards:
+        with open(path, "rb") as file:
+            encoded.append(file.read())  # Read once, disk I/O isn't part of any stage
+
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(repeats):
+        for data in encoded:
+            start = time.perf_counter()
+            image = SquareExtractor.load_board(data)
+            image.load()  # PIL decodes lazily
+            decoded = time.perf_counter()
+            squares = recognizer.extractor.extract_squares(image, dtype=np.uint8)
+            squares = squares.reshape(64, *squares.shape[2:])
+            extracted = time.perf_counter()
+            predicted_classes, _ = recognizer.run_model(squares)
+            inferred = time.perf_counter()
+            board_state = Board.from_classes(predicted_classes)
+            fen = board_state.fen(turn=turn)
+            built = time.perf_counter()
+            engine.get_next_move(board_state, turn, depth=depth)
+            searched = time.perf_counter()
+
+            timings["decode"].append((decoded - start) * 1000)
+            timings["extract"].append((extracted - decoded) * 1000)
+            timings["inference"].append((inferred - extracted) * 1000)
+            timings["fen"].append((built - inferred) * 1000)
+            timings["engine"].append((searched - built) * 1000)
+
+    return {stage: percentiles(values) for stage, values in timings.items()}, fen
+
+
+def bench_api(model_path, boards, concurrency_levels, requests_per_level, turn="w", depth=None, engine_factory=None,
+              cached=False):
+    """
+    Runs the FastAPI app in-process through Starlette's TestClient and sends /analyze/ requests from
+    `concurrency` client threads, reporting end-to-end latency and throughput per concurrency level.
+    """
+    from fastapi.testclient import TestClient
+    from src.API import ChessAPI
+
+    ChessAPI.model_path = model_path
+    if not cached:
+        # Every request pays for the CNN pass and the search
+        ChessAPI.square_cache = None
+        if engine_factory is None:
+            from src.API.Engine import EnginePool
+            engine_factory = lambda: EnginePool(size=ChessAPI.ENGINE_POOL_SIZE, cache=None)
+    if engine_factory is not None:
+        def load_engine():
+            ChessAPI.engine = engine_factory()
+
+        ChessAPI.load_engine = load_engine
+
+    results = {}
+    with TestClient(ChessAPI.app) as client:
+        deadline = time.monotonic() + 300
+        while client.get("/ready/").status_code != 200:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"API did not become ready: {ChessAPI.startup}")
+            time.sleep(0.1)
+
+        def send(i):
+            payload = {"image_path": boards[i % len(boards)], "turn": turn, "depth": depth}
+            start = time.perf_counter()
+            response = client.post("/analyze/", json=payload)
+            latency = (time.perf_counter() - start) * 1000
+            body = response.json()
+            if response.status_code != 200 or "error" in body:
+                raise RuntimeError(f"/analyze/ failed: {response.status_code} {body}")
+            return latency
+
+        for concurrency in concurrency_levels:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(send, range(concurrency)))  # Warm the connection pool and batch path
+                start = time.perf_counter()
+                latencies = list(pool.map(send, range(requests_per_level)))
+                elapsed = time.perf_counter() - start
+            results[f"concurrency_{concurrency}"] = percentiles(latencies, elapsed)
+
+    return results
+
+
+def compare(report, baseline, tolerance=0.2, min_delta_ms=0.5):
+    """
+    Flags every stage or API level whose p50 or p95 got more than `tolerance` slower than the baseline.
+    Differences under `min_delta_ms` are ignored, sub-millisecond stages are too noisy for a ratio alone.
+    """
+    regressions = []
+    for section in ("stages", "api"):
+        for name, current in report.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if previous is None:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                before, after = previous[metric], current[metric]
+                if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                    regressions.append(f"{section}/{name} {metric}: {before:.3f} -> {after:.3f} ms")
+    return regressions
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'':<16}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'mean (ms)':>11}{'per s':>10}")
+    for name, stats in rows.items():
+        print(f"{name:<16}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+              f"{stats['mean_ms']:>11.3f}{stats['throughput_per_s'] or 0:>10.1f}")
+
+
+def run(args):
+    from src.cnn.BoardRecognizer import BoardRecognizer
+
+    boards = sorted(glob.glob(os.path.join(args.boards, "*.png")))[:args.limit or None]
+    if not boards:
+        print(f"No board images found in {args.boards}")
+        return 1
+
+    if args.stockfish:
+        from src.API import Engine
+        Engine.STOCKFISH_PATH = args.stockfish
+    engine, engine_name = make_engine(args.stub_engine, args.stub_delay_ms)
+    report = {
+        "boards": len(boards),
+        "model": os.path.basename(args.model),
+        "engine": engine_name,
+        "depth": args.depth,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    recognizer = BoardRecognizer(args.model)
+    recognizer.run_model(np.zeros((64, *recognizer.img_size[::-1], 3), dtype=np.uint8))  # Warm-up
+    report["stages"], last_fen = bench_stages(recognizer, engine, boards, args.repeats, depth=args.depth)
+    print(f"Boards: {len(boards)} | repeats: {args.repeats} | engine: {engine_name} | last FEN: {last_fen}")
+    print_table("Per-stage latency (single board, sequential)", report["stages"])
+
+    if not args.skip_api:
+        engine_factory = (lambda: engine) if engine_name == "stub" else None
+        report["api"] = bench_api(
+            args.model, boards, args.concurrency, args.requests, depth=args.depth,
+            engine_factory=engine_factory, cached=args.cached
+        )
+        print_table("POST /analyze/ end-to-end (in-process TestClient)", report["api"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("engine") != engine_name:
+            print(f"\n[WARN] Baseline was recorded with the {baseline.get('engine')} engine, this run used {engine_name}")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n[REGRESSION] {len(regressions)} metrics more than {args.tolerance:.0%} slower than {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark of the analyze pipeline")
+    parser.add_argument("--model", required=True, help="Model file (.h5, .tflite or .onnx)")
+    parser.add_argument("--boards", default=BOARD_DIR, help="Directory of board images")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N boards")
+    parser.add_argument("--repeats", type=int, default=5, help="Passes over the boards for the per-stage timings")
+    parser.add_argument("--depth", type=int, default=10, help="Stockfish search depth")
+    parser.add_argument("--stockfish", default=None, help="Stockfish binary, overrides Engine.STOCKFISH_PATH")
+    parser.add_argument("--stub-engine", action="store_true", help="Use the stub engine even if Stockfish is present")
+    parser.add_argument("--stub-delay-ms", type=float, default=0.0, help="Simulated search time of the stub engine")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Client threads per API run")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--cached", action="store_true", help="Keep the API square and analysis caches enabled")
+    parser.add_argument("--skip-api", action="store_true", help="Only run the per-stage benchmark")
+    parser.add_argument("--output", default=None, help="Write the report JSON here (e.g. to save a new baseline)")
+    parser.add_argument("--baseline", default=None, help="Baseline report JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a metric is flagged")
+    sys.exit(run(parser.parse_args()))
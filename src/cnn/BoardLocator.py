@@ -0,0 +1,287 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from src.misc import metrics
+
+# Checkerboard parity of the 64 cells, True on the squares with the same color as a8
+PARITY = (np.add.outer(np.arange(8), np.arange(8)) % 2 == 0)
+
+
+class BoardLocator:
+    """
+    Finds the chessboard in an arbitrary screenshot.
+
+    The alternating squares give strong edges on the 9 grid lines of each axis. The gradient magnitude is
+    projected onto the x and y axes and the evenly spaced 9-line grid with the highest edge response is fitted
+    to each projection, first over the whole image, then restricted to the board found on the other axis.
+    The fitted grid is then checked in 2D: the corners of its 64 cells must show two alternating flat colors,
+    and a grid shifted by one square in any direction must match clearly worse, so a lattice locked onto the
+    board plus a row of background is moved back or rejected. If the grid lines don't stand out from the
+    background or the check fails, the largest square contour is used instead, and failing that the whole image. Geometry is cached per source (e.g. a game or screen region) and image size,
+    so later frames from the same source skip detection.
+    """
+
+    def __init__(self, min_board_fraction=0.25, cache_size=256, min_contrast=2.0, min_border_contrast=1.5,
+                 min_cells=52, min_margin=2):
+        self.min_board_fraction = min_board_fraction  # Smallest board side as a fraction of the image's short side
+        self.min_contrast = min_contrast  # Required ratio of grid-line edge response to the in-between response
+        # Same for the two border lines, one edge against the background instead of two contrasting squares
+        self.min_border_contrast = min_border_contrast
+        self.min_cells = min_cells  # Cells out of 64 that must match the checkerboard colors
+        self.min_margin = min_margin  # Cells by which the grid must beat each of its one-square shifts
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def locate(self, image, source=None):
+        """
+        Returns the board rectangle (left, top, right, bottom) in an RGB uint8 array or PIL image.
+        With a `source` key, the rectangle is reused for later images of the same source and size.
+        """
+        image = np.asarray(image)
+        key = (source, image.shape[:2]) if source is not None else None
+        if key is not None:
+            with self.lock:
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    return self.cache[key]
+
+        with metrics.timed("locate"):
+            rect = self.detect(image)
+
+        if key is not None:
+            with self.lock:
+                self.cache[key] = rect
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return rect
+
+    def forget(self, source):
+        """Drops the cached geometry of a source, e.g. after the window moved."""
+        with self.lock:
+            for key in [key for key in self.cache if key[0] == source]:
+                del self.cache[key]
+
+    @staticmethod
+    def grid(rect):
+        """The 9 x and 9 y pixel coordinates of the square grid lines within a board rectangle."""
+        left, top, right, bottom = rect
+        return np.linspace(left, right, 9).round().astype(int), np.linspace(top, bottom, 9).round().astype(int)
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+        gray = cv2.copyMakeBorder(gray, 1, 1, 1, 1, cv2.BORDER_REPLICATE)  # Board edges at the image border still count
+        grad_x = np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3))[1:-1, 1:-1]
+        grad_y = np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3))[1:-1, 1:-1]
+        min_side = self.min_board_fraction * min(width, height)
+
+        # Already tightly cropped boards (the common case) skip the grid search
+        if abs(width - height) <= 0.02 * width and self.is_full_grid(grad_x.sum(axis=0)) \
+                and self.is_full_grid(grad_y.sum(axis=1)):
+            return 0, 0, width, height
+
+        # Rough fit over the whole image, then refit each axis within the board found on the other one
+        x_fit = self.fit_lines(grad_x.sum(axis=0), min_side)
+        y_fit = self.fit_lines(grad_y.sum(axis=1), min_side)
+        if x_fit is not None and y_fit is not None:
+            (left, right, _, _), (top, bottom, _, _) = x_fit, y_fit
+            y_fit = self.fit_lines(grad_y[:, left:right + 1].sum(axis=1), min_side)
+            if y_fit is not None:
+                top, bottom, _, _ = y_fit
+                x_fit = self.fit_lines(grad_x[top:bottom + 1].sum(axis=0), min_side)
+
+        gray = gray[1:-1, 1:-1]
+        if x_fit is not None and y_fit is not None and min(x_fit[2], y_fit[2]) >= self.min_contrast \
+                and min(x_fit[3], y_fit[3]) >= self.min_border_contrast:
+            (left, right, _, _), (top, bottom, _, _) = x_fit, y_fit
+            if abs((right - left) - (bottom - top)) <= 0.05 * max(right - left, bottom - top):
+                rect = self.verify_grid(gray, (left, top, right, bottom))
+                if rect is not None:
+                    return self.snap_to_image(rect, width, height)
+
+        rect = self.largest_square_contour(gray, min_side)
+        if rect is not None:
+            rect = self.verify_grid(gray, rect)
+        return rect if rect is not None else (0, 0, width, height)
+
+    def verify_grid(self, gray, rect):
+        """
+        Checks a fitted board rectangle against the checkerboard pattern. Boards are square, so the rectangle
+        squared to either side's length (anchored at either end) is tried as well; the best of them that passes
+        shift_to_board is returned, or None if none does.
+        """
+        integrals = cv2.integral2(gray, sdepth=cv2.CV_64F)
+        left, top, right, bottom = rect
+        side_x, side_y = right - left, bottom - top
+        candidates = {
+            rect,
+            (left, top, right, top + side_x), (left, bottom - side_x, right, bottom),
+            (left, top, left + side_y, bottom), (right - side_y, top, right, bottom),
+        }
+        results = [self.shift_to_board(integrals, candidate) for candidate in candidates]
+        results = [result for result in results if result is not None]
+        return max(results)[1] if results else None
+
+    def shift_to_board(self, integrals, rect):
+        """
+        Moves `rect` by whole squares while a shifted grid matches the checkerboard better. Returns (cells, rect)
+        if it then matches at least `min_cells` cells and beats every one-square shift by `min_margin` cells,
+        else None.
+        """
+        height, width = integrals[0].shape[0] - 1, integrals[0].shape[1] - 1
+        scores = {}
+
+        def score(dx, dy):
+            if (dx, dy) not in scores:
+                left, top, right, bottom = rect
+                step_x, step_y = (right - left) / 8, (bottom - top) / 8
+                shifted = (left + dx * step_x, top + dy * step_y, right + dx * step_x, bottom + dy * step_y)
+                inside = shifted[0] >= -1 and shifted[1] >= -1 and shifted[2] <= width + 1 and shifted[3] <= height + 1
+                scores[(dx, dy)] = self.checkerboard_cells(integrals, shifted) if inside else -1
+            return scores[(dx, dy)]
+
+        neighbours = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+        x, y = 0, 0
+        for _ in range(8):
+            best = max(neighbours, key=lambda d: score(x + d[0], y + d[1]))
+            if score(x + best[0], y + best[1]) <= score(x, y):
+                break
+            x, y = x + best[0], y + best[1]
+
+        runner_up = max(score(x + dx, y + dy) for dx, dy in neighbours)
+        if score(x, y) < self.min_cells or score(x, y) - runner_up < self.min_margin:
+            return None
+        left, top, right, bottom = rect
+        step_x, step_y = (right - left) / 8, (bottom - top) / 8
+        return score(x, y), (int(round(left + x * step_x)), int(round(top + y * step_y)),
+                             int(round(right + x * step_x)), int(round(bottom + y * step_y)))
+
+    @staticmethod
+    def checkerboard_cells(integrals, rect, inset=0.1, size=0.15):
+        """
+        Number of the 64 cells of `rect` whose color matches a two-color checkerboard. Each cell is judged by the
+        flattest of four patches near its corners, where pieces rarely reach: it has to be flat and close to the
+        median color of the cells of its parity. `integrals` is cv2.integral2 of the grayscale image.
+        """
+        sums, squares = integrals
+        left, top, right, bottom = rect
+        step_x, step_y = (right - left) / 8, (bottom - top) / 8
+        patch_w, patch_h = max(2, int(size * step_x)), max(2, int(size * step_y))
+
+        cells = np.arange(8)
+        offsets = np.array([inset, 1 - inset - size])
+        # Patch origins, shape (8 rows, 8 cols, 2 corner rows, 2 corner cols)
+        y0 = np.floor(top + (cells[:, None, None, None] + offsets[None, None, :, None]) * step_y).astype(int)
+        x0 = np.floor(left + (cells[None, :, None, None] + offsets[None, None, None, :]) * step_x).astype(int)
+        y0, x0 = np.broadcast_arrays(y0, x0)
+        y0 = np.clip(y0, 0, sums.shape[0] - 1 - patch_h)
+        x0 = np.clip(x0, 0, sums.shape[1] - 1 - patch_w)
+        y1, x1 = y0 + patch_h, x0 + patch_w
+
+        area = patch_w * patch_h
+        mean = (sums[y1, x1] - sums[y0, x1] - sums[y1, x0] + sums[y0, x0]) / area
+        mean_sq = (squares[y1, x1] - squares[y0, x1] - squares[y1, x0] + squares[y0, x0]) / area
+        std = np.sqrt(np.maximum(mean_sq - mean ** 2, 0)).reshape(8, 8, 4)
+        mean = mean.reshape(8, 8, 4)
+
+        flattest = np.argmin(std, axis=2)[..., None]
+        value = np.take_along_axis(mean, flattest, axis=2)[..., 0]
+        texture = np.take_along_axis(std, flattest, axis=2)[..., 0]
+
+        light, dark = np.median(value[PARITY]), np.median(value[~PARITY])
+        separation = abs(light - dark)
+        if separation < 10:
+            return 0  # No two distinct square colors
+        expected = np.where(PARITY, light, dark)
+        matches = (np.abs(value - expected) < 0.25 * separation) & (texture < 0.15 * separation)
+        return int(matches.sum())
+
+    def is_full_grid(self, profile):
+        """True if the 7 inner grid lines of a board spanning the whole axis stand out in the edge projection."""
+        step = len(profile) / 8
+        lines = np.round(np.arange(1, 8) * step).astype(int)
+        # Max over +-2 pixels, the line may fall between two pixels
+        on_lines = np.array([profile[max(0, line - 2):line + 3].max() for line in lines])
+        off_lines = profile[np.round((np.arange(8) + 0.5) * step).astype(int)]
+        return on_lines.min() >= self.min_contrast * max(off_lines.mean(), 1e-6)
+
+    @staticmethod
+    def fit_lines(profile, min_side):
+        """
+        Fits 9 evenly spaced lines to an edge projection. Returns (first, last, contrast, border_contrast) for
+        the spacing and offset whose lines collect the most edge response, or None if no board-sized grid fits.
+        contrast is the third weakest line's response over the mean response half a square away from the lines,
+        border_contrast the same for the weaker of the two outer lines; a line on the image border has no edge
+        to measure and doesn't count.
+        """
+        profile = np.convolve(profile, np.ones(3, dtype=np.float32) / 3, mode="same")  # Tolerate 1px rounding
+        # Pad so a board edge on the image border (line position 0 or len) is a valid line position
+        profile = np.pad(profile, 1)
+        length = len(profile)
+        min_step, max_step = max(4, int(min_side / 8)), (length - 1) // 8
+
+        def best_fit(steps, first_offsets):
+            best = None
+            for step in steps:
+                offsets = first_offsets[first_offsets + 8 * step < length - 0.5]
+                if not len(offsets):
+                    continue
+                lines = np.round(offsets[:, None] + np.arange(9) * step).astype(int)
+                between = np.round(offsets[:, None] + (np.arange(8) + 0.5) * step).astype(int)
+                on_lines = np.sort(profile[lines], axis=1)
+                # The third weakest line must still be strong: up to two lines (the board border) may be faint,
+                # but a grid at half the spacing lands on square centers and one shifted by a square runs off
+                # the board. The mean over all lines favours the grid whose border lines are visible too.
+                scores = on_lines[:, 2] + 0.25 * on_lines.mean(axis=1)
+                i = int(np.argmax(scores))
+                if best is None or scores[i] > best[0]:
+                    background = max(profile[between[i]].mean(), 1e-6)
+                    # Positions 1 and length - 2 are the image's first and last pixel
+                    borders = [profile[line] for line in lines[i, [0, 8]] if 1 < line < length - 2]
+                    border_contrast = min(borders) / background if borders else np.inf
+                    best = (scores[i], int(offsets[i]), step, on_lines[i, 2] / background, border_contrast)
+            return best
+
+        best = best_fit(range(min_step, max_step + 1), np.arange(length))
+        if best is None:
+            return None
+        # Board sizes aren't always a multiple of 8, refine the spacing to 1/8 pixel around the integer fit
+        _, first, step, _, _ = best
+        best = best_fit(np.arange(step - 1, step + 1.01, 0.125), np.arange(max(0, first - 2), first + 3))
+        _, first, step, contrast, border_contrast = best
+        return first - 1, int(round(first - 1 + 8 * step)), float(contrast), float(border_contrast)
+
+    @staticmethod
+    def snap_to_image(rect, width, height, tolerance=2):
+        """Rounds the rectangle out to the image border when it is within `tolerance` pixels of it."""
+        left, top, right, bottom = rect
+        left = 0 if left <= tolerance else left
+        top = 0 if top <= tolerance else top
+        right = width if width - right <= tolerance + 1 else right
+        bottom = height if height - bottom <= tolerance + 1 else bottom
+        return int(left), int(top), int(right), int(bottom)
+
+    @staticmethod
+    def largest_square_contour(gray, min_side):
+        """Bounding box of the largest roughly square four-cornered contour, or None."""
+        edges = cv2.Canny(gray, 50, 150)
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        best = None
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if min(w, h) < min_side or abs(w - h) > 0.05 * max(w, h):
+                continue
+            approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(approx) == 4 and (best is None or w * h > best[2] * best[3]):
+                best = (x, y, w, h)
+
+        if best is None:
+            return None
+        x, y, w, h = best
+        return x, y, x + w, y + h
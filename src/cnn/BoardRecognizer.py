@@ -1,95 +1,192 @@
-import os
+import logging
 
-import cv2
 import numpy as np
-from PIL import Image
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
 import time
-from src.misc import utils
+from src.cnn.InferenceBackend import load_backend
+from src.cnn.SquareExtractor import SquareExtractor
+from src.misc import metrics, utils
+from src.misc.Board import Board
 
 
 class BoardRecognizer:
-    def __init__(self, model_path, img_size=(64, 64)):
-        self.model = load_model(model_path)
+    def __init__(self, model_path, img_size=None, square_cache=None, backend=None, locator=None, validator=None,
+                 min_confidence=0.9):
+        # Keras (.h5), TFLite or ONNX, picked from the file extension unless a backend name is given
+        self.model = load_backend(model_path, backend)
         dataset_path = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\resources\dataset\chesspieces"
         #class_labels = os.listdir(dataset_path)
         #self.class_labels = os.listdir(dataset_path)
         self.class_labels = ['bB', 'bK', 'bN', 'bP', 'bQ', 'bR', 'empty', 'wB', 'wK', 'wN', 'wP', 'wQ', 'wR']
-        self.img_size = img_size
+        self.img_size = img_size or getattr(self.model, "input_size", None) or (64, 64)  # Follow the model's input
+        self.extractor = SquareExtractor(self.img_size, locator=locator)  # Optional BoardLocator for uncropped screenshots
+        self.square_cache = square_cache  # Optional SquareCache, skips the model for squares seen before
+        self.validator = validator  # Optional PositionValidator, corrects or rejects illegal boards
+        self.min_confidence = min_confidence  # Squares below this are re-run with test-time augmentation
 
     def extract_squares(self, image_path, save_squares=False):
-        """Extracts 64 squares from a chessboard image and saves them."""
-        output_dir = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\output"
+        """Extracts 64 squares from a chessboard image, optionally saving each square to disk."""
         if save_squares:
-            os.makedirs(output_dir, exist_ok=True)  # Ensure output directory exists
-        image = Image.open(image_path)
-        square_size = 720 // 8  # 90 pixels per square
-        squares = []
-        image_mapping = []  # Store image file paths and their positions
-
-        for row in range(8):
-            row_squares = []
-            for col in range(8):
-                left = col * square_size
-                top = row * square_size
-                right = (col + 1) * square_size
-                bottom = (row + 1) * square_size
-
-                square_img = image.crop((left, top, right, bottom)).convert("RGB")
-                square_img = square_img.resize(self.img_size)  # Resize for CNN
-                square_array = np.array(square_img) / 255.0  # Normalize
-
-                # Save square as an image file
-                square_filename = f"{row}{col}.png"
-                if save_squares:
-                    square_path = os.path.join(output_dir, square_filename)
-                    square_img.save(square_path)
-
-                # Store mapping
-                image_mapping.append((square_filename, (row, col)))
-                row_squares.append(square_array)
-
-            squares.append(row_squares)
-
-        return np.array(squares), image_mapping  # Shape (8, 8, 64, 64, 3)
-
-    def predict_board(self, image_path, save_squares=False):
-        """Recognizes all pieces on the chessboard using batch prediction for speed."""
-        squares, image_mapping = self.extract_squares(image_path, save_squares)  # (8, 8, 64, 64, 3)
-        board_state = np.empty((8, 8), dtype=object)
-        board_with_accuracy = np.empty((8, 8), dtype=object)
-        prediction_mapping = []  # Store image-path-to-prediction mapping
-
-        print("\nRecognizing Pieces...")
+            output_dir = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\output"
+            return self.extractor.extract_squares_loop(image_path, output_dir)
 
-        # **Flatten the board for batch prediction**
-        all_squares = squares.reshape(-1, 64, 64, 3)  # Shape: (64, 64, 64, 3)
-
-        # **Perform batch prediction**
-        predictions = self.model.predict(all_squares)  # Predict all 64 squares at once
+        # Single decode + resize, squares are a strided view over the resized board
+        return self.extractor.extract_squares(image_path), self.extractor.square_mapping()
 
-        # **Process results**
-        for i, (filename, (row, col)) in enumerate(image_mapping):
-            predicted_class = np.argmax(predictions[i])  # Get index of highest probability
-            confidence = predictions[i][predicted_class] * 100
-            board_state[row, col] = self.class_labels[predicted_class]
-            board_with_accuracy[row, col] = f"{self.class_labels[predicted_class]} ({confidence:.2f}%)"
+    def predict_board(self, image_path, save_squares=False, source=None, turn=None):
+        """
+        Recognizes all pieces on the chessboard using batch prediction for speed. `turn` ("w"/"b") lets the
+        validator also rule out boards where the side not to move is in check.
+        """
+        if save_squares:
+            self.extract_squares(image_path, save_squares)  # Writes the square images to disk
+        squares = self.extractor.extract_squares(image_path, dtype=np.uint8, source=source)  # (8, 8, 64, 64, 3)
 
-            # Store mapping of image file -> prediction
-            prediction_mapping.append((filename, board_state[row, col]))
+        # **Flatten the board for batch prediction**
+        all_squares = squares.reshape(-1, *squares.shape[2:])  # Shape: (64, 64, 64, 3)
 
-        # Print image-to-prediction mapping
+        # **Perform batch prediction**
+        probabilities = self.predict_probabilities(all_squares)
+        if self.validator is None:
+            predicted_classes = probabilities.argmax(axis=1)
+        else:
+            predicted_classes = self.validated_classes(all_squares, probabilities, turn)  # Raises IllegalPositionError
+        board_state = Board.from_classes(predicted_classes)
+
+        # The per-square reports cost 128 string formats, only build them when they are shown
         if save_squares:
             print("\nImage to Prediction Mapping:")
-            for img_file, predicted_piece in prediction_mapping:
-                print(f"{img_file} -> {predicted_piece}")
-
-        utils.print_board(board=board_with_accuracy, title="Predicted board with accuracy")
-        utils.print_board(board=board_state, title="Predicted board")
+            for filename, (row, col) in self.extractor.square_mapping():
+                print(f"{filename} -> {board_state[row, col]}")
+
+        if utils.logger.isEnabledFor(logging.DEBUG):
+            confidences = probabilities[np.arange(64), predicted_classes] * 100
+            board_with_accuracy = [
+                [f"{self.class_labels[predicted_classes[row * 8 + col]]} ({confidences[row * 8 + col]:.2f}%)"
+                 for col in range(8)]
+                for row in range(8)
+            ]
+            utils.logger.debug(utils.format_board(board_with_accuracy, title="Predicted board with accuracy"))
+            utils.logger.debug(utils.format_board(board_state.labels(), title="Predicted board"))
 
         return board_state
 
+    def predict_boards(self, images, chunk_size=16, sources=None, turns=None):
+        """
+        Recognizes many boards at once. Squares from up to `chunk_size` boards are stacked into one
+        tensor per model call, so N boards cost ceil(N / chunk_size) inference calls instead of N.
+        `sources` optionally gives each image's board geometry cache key (see BoardLocator), `turns` each
+        board's side to move for the validator (see predict_board).
+        Returns one Board per input image, in input order. With a validator, a board that can't be
+        made legal is returned as its IllegalPositionError instead, so one bad board doesn't fail the others.
+        """
+        sources = sources or [None] * len(images)
+        turns = turns or [None] * len(images)
+        height, width = self.img_size[1], self.img_size[0]
+        board_states = []
+
+        for start in range(0, len(images), chunk_size):
+            chunk = images[start:start + chunk_size]
+            chunk_sources = sources[start:start + chunk_size]
+            batch = np.empty((len(chunk) * 64, height, width, 3), dtype=np.uint8)
+
+            # Write each board's squares straight into its slice of the batch tensor
+            for i, (img, source) in enumerate(zip(chunk, chunk_sources)):
+                squares = self.extractor.extract_squares(img, dtype=np.uint8, source=source)
+                batch[i * 64:(i + 1) * 64].reshape(8, 8, height, width, 3)[...] = squares
+
+            probabilities = self.predict_probabilities(batch)
+            if self.validator is None:
+                board_states.extend(Board.from_classes(classes) for classes in probabilities.argmax(axis=1).reshape(-1, 64))
+                continue
+
+            for i in range(len(chunk)):
+                board = slice(i * 64, (i + 1) * 64)
+                try:
+                    classes = self.validated_classes(batch[board], probabilities[board], turns[start + i])
+                    board_states.append(Board.from_classes(classes))
+                except utils.IllegalPositionError as e:
+                    board_states.append(e)
+
+        return board_states
+
+    def validated_classes(self, squares, probabilities, turn=None):
+        """
+        Picks the class of each of a board's 64 squares: low-confidence squares are re-run with test-time
+        augmentation first (updating `probabilities` in place), then the validator picks the most probable
+        legal board. Raises IllegalPositionError if the board can't be made legal.
+        """
+        uncertain = np.flatnonzero(probabilities.max(axis=1) < self.min_confidence)
+        if len(uncertain):
+            metrics.TTA_SQUARES.inc(len(uncertain))
+            probabilities[uncertain] = self.tta_probabilities(squares[uncertain], probabilities[uncertain])
+
+        predicted_classes, corrected = self.validator.resolve(probabilities, turn)
+        if corrected:
+            utils.logger.debug(f"Corrected squares to reach a legal position: {', '.join(corrected)}")
+        return predicted_classes
+
+    def tta_probabilities(self, squares, probabilities, shift=3):
+        """
+        Averages the model output over the original squares and augmented copies: a horizontal mirror and
+        small shifts in each direction (edge pixels repeated), which covers slight misalignment of the grid.
+        """
+        n, height, width, _ = squares.shape
+        padded = np.pad(squares, ((0, 0), (shift, shift), (shift, shift), (0, 0)), mode="edge")
+        variants = [squares[:, :, ::-1]]
+        for dy, dx in ((shift, 0), (shift, 2 * shift), (0, shift), (2 * shift, shift)):
+            variants.append(padded[:, dy:dy + height, dx:dx + width])
+
+        augmented = self.model_probabilities(np.concatenate(variants))
+        return (probabilities + augmented.reshape(len(variants), n, -1).sum(axis=0)) / (len(variants) + 1)
+
+    def predict_squares(self, squares):
+        """Classifies uint8 squares of shape (n, h, w, 3) and returns (class_indices, confidences)."""
+        probabilities = self.predict_probabilities(squares)
+        predicted_classes = np.argmax(probabilities, axis=1)
+        return predicted_classes, probabilities[np.arange(len(probabilities)), predicted_classes]
+
+    def predict_probabilities(self, squares):
+        """
+        Returns the softmax output (n, n_classes) for uint8 squares of shape (n, h, w, 3).
+        With a square cache configured, only squares not seen before are sent to the model.
+        """
+        if self.square_cache is None:
+            return self.model_probabilities(squares)
+
+        keys, results, missing = self.square_cache.lookup(squares)
+        probabilities = np.empty((len(squares), len(self.class_labels)), dtype=np.float32)
+
+        if missing:
+            # Identical squares within the batch (e.g. empty squares) go through the model once
+            duplicates = {}
+            for i in missing:
+                duplicates.setdefault(keys[i][0], []).append(i)
+            unique = [indices[0] for indices in duplicates.values()]
+
+            unique_probabilities = self.model_probabilities(squares[unique])
+            self.square_cache.store([keys[i] for i in unique], list(unique_probabilities))
+            for indices, square_probabilities in zip(duplicates.values(), unique_probabilities):
+                probabilities[indices] = square_probabilities
+
+        for i, result in enumerate(results):
+            if result is not None:
+                probabilities[i] = result
+
+        return probabilities
+
+    def run_model(self, squares):
+        """Runs the CNN on uint8 squares and returns the argmax class and its probability per square."""
+        predictions = self.model_probabilities(squares)
+        predicted_classes = np.argmax(predictions, axis=1)
+        return predicted_classes, predictions[np.arange(len(predictions)), predicted_classes]
+
+    def model_probabilities(self, squares):
+        """Runs the CNN on uint8 squares and returns its softmax output, bypassing the square cache."""
+        inputs = squares.astype(np.float32)
+        inputs *= 1.0 / 255.0  # Same normalization as training
+        with metrics.timed("inference"):
+            return np.asarray(self.model.predict_on_batch(inputs), dtype=np.float32)
+
 if __name__ == "__main__":
     model_path = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\models\CNNModel.h5"
     test_img_path = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\resources\images\chessboard\board.png"
@@ -100,6 +197,7 @@ if __name__ == "__main__":
     # img_array = np.array(img) / 255.0  # Normalize pixel values
 
     # Initialize recognizer and predict board
+    utils.logger.setLevel(logging.DEBUG)  # Show the recognized boards
     recognizer = BoardRecognizer(model_path)
     start_time = time.time()
     board = recognizer.predict_board(test_img_path2, False)
@@ -0,0 +1,170 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.cnn.SquareExtractor import SquareExtractor
+from src.misc import utils
+
+INDEX_FILE = "index.json"
+
+
+def slice_board(board_path, fen, img_size):
+    """Worker: extracts the 64 uint8 squares of a board and labels them from its FEN."""
+    squares = SquareExtractor(img_size).extract_squares(board_path, dtype=np.uint8)
+    labels = [utils.CLASS_LABELS.index(label) for row in utils.fen_to_labels(fen) for label in row]
+    return squares.reshape(64, *squares.shape[2:]), np.array(labels, dtype=np.int8)
+
+
+class DatasetBuilder:
+    """
+    Builds a square dataset from labelled board images.
+
+    Every board listed in the FEN json is sliced into 64 squares, which are labelled from the FEN and written
+    into compressed NPZ shards of `shard_size` boards each (`images` uint8 (n * 64, h, w, 3), `labels` int8 class indices).
+    `index.json` maps each board to its content hash, shard and offset, so reruns only process new or changed
+    boards. Boards removed from the json or from disk are dropped from the index, and shards left without any
+    current board, or left over from an index that was rebuilt, are deleted.
+    """
+
+    def __init__(self, board_dir, fen_json, output_dir, img_size=(64, 64), shard_size=256, workers=None):
+        self.board_dir = board_dir
+        self.fen_json = fen_json
+        self.output_dir = output_dir
+        self.img_size = img_size
+        self.shard_size = shard_size
+        self.workers = workers or os.cpu_count()
+
+    def load_index(self):
+        path = os.path.join(self.output_dir, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                index = json.load(file)
+            if index["img_size"] == list(self.img_size) and index["class_labels"] == utils.CLASS_LABELS:
+                return index
+            print("Index was built with a different image size or label set, rebuilding")
+        return {"img_size": list(self.img_size), "class_labels": utils.CLASS_LABELS, "boards": {}, "shards": {}}
+
+    def save_index(self, index):
+        path = os.path.join(self.output_dir, INDEX_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(index, file, indent=2)
+        os.replace(path + ".tmp", path)  # Never leave a half-written index behind
+
+    @staticmethod
+    def board_hash(board_path, fen):
+        with open(board_path, "rb") as file:
+            return hashlib.sha1(file.read() + fen.encode()).hexdigest()
+
+    def read_fens(self):
+        with open(self.fen_json, "r", encoding="utf-8") as file:
+            return {name: entry["fen"] for name, entry in json.load(file).items() if "fen" in entry}
+
+    def prune_index(self, index, fens):
+        """Drops boards that left the FEN json or whose image is gone. Returns the removed board names."""
+        removed = [
+            name for name in index["boards"]
+            if name not in fens or not os.path.exists(os.path.join(self.board_dir, name))
+        ]
+        for name in removed:
+            del index["boards"][name]
+        return removed
+
+    def pending_boards(self, index, fens):
+        """Returns [(name, path, fen, hash)] for boards that are new or whose image or FEN changed."""
+        pending = []
+        for name, fen in sorted(fens.items()):
+            board_path = os.path.join(self.board_dir, name)
+            if not os.path.exists(board_path):
+                print(f"Skipping {name}: image not found")
+                continue
+            digest = self.board_hash(board_path, fen)
+            if index["boards"].get(name, {}).get("hash") != digest:
+                pending.append((name, board_path, fen, digest))
+        return pending
+
+    def next_shard_name(self, index):
+        numbers = [int(name[len("shard_"):-len(".npz")]) for name in index["shards"]]
+        return f"shard_{max(numbers, default=-1) + 1:05d}.npz"
+
+    def build(self):
+        """Processes new or changed boards in a process pool and writes them into new shards."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        index = self.load_index()
+        fens = self.read_fens()
+        removed = self.prune_index(index, fens)
+        if removed:
+            print(f"Removed {len(removed)} boards that are no longer listed or whose image is gone")
+            self.save_index(index)
+        pending = self.pending_boards(index, fens)
+        print(f"{len(pending)} new or changed boards, {len(index['boards'])} already indexed")
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for start in range(0, len(pending), self.shard_size):
+                chunk = pending[start:start + self.shard_size]
+                results = list(pool.map(
+                    slice_board, [path for _, path, _, _ in chunk], [fen for _, _, fen, _ in chunk],
+                    [self.img_size] * len(chunk)
+                ))
+
+                shard_name = self.next_shard_name(index)
+                np.savez_compressed(
+                    os.path.join(self.output_dir, shard_name),
+                    images=np.concatenate([squares for squares, _ in results]),
+                    labels=np.concatenate([labels for _, labels in results])
+                )
+                index["shards"][shard_name] = len(chunk)
+                for offset, (name, _, fen, digest) in enumerate(chunk):
+                    index["boards"][name] = {"hash": digest, "fen": fen, "shard": shard_name, "offset": offset * 64}
+                self.save_index(index)  # Progress survives an interrupted run
+                print(f"Wrote {shard_name} with {len(chunk)} boards")
+
+        self.remove_stale_shards(index)
+        return index
+
+    def remove_stale_shards(self, index):
+        """
+        Deletes shards whose boards have all been re-processed into newer shards, and shard files the index
+        doesn't list at all, e.g. those of an index that was rebuilt for another image size.
+        """
+        live = {entry["shard"] for entry in index["boards"].values()}
+        for shard_name in [name for name in index["shards"] if name not in live]:
+            del index["shards"][shard_name]
+        for shard_name in sorted(os.listdir(self.output_dir)):
+            if shard_name.startswith("shard_") and shard_name.endswith(".npz") and shard_name not in index["shards"]:
+                os.remove(os.path.join(self.output_dir, shard_name))
+                print(f"Removed stale {shard_name}")
+        self.save_index(index)
+
+    @staticmethod
+    def iter_shards(output_dir):
+        """Yields (images, labels) per shard, keeping only the rows of boards the index still points at."""
+        with open(os.path.join(output_dir, INDEX_FILE), "r", encoding="utf-8") as file:
+            index = json.load(file)
+
+        rows = {}
+        for entry in index["boards"].values():
+            rows.setdefault(entry["shard"], []).extend(range(entry["offset"], entry["offset"] + 64))
+
+        for shard_name in sorted(rows):
+            with np.load(os.path.join(output_dir, shard_name)) as shard:
+                selected = np.array(sorted(rows[shard_name]))
+                yield shard["images"][selected], shard["labels"][selected]
+
+
+if __name__ == "__main__":
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+    parser = argparse.ArgumentParser(description="Build a sharded square dataset from FEN-labelled boards")
+    parser.add_argument("--boards", default=os.path.join(root, "resources/images/chessboard"))
+    parser.add_argument("--fens", default=os.path.join(root, "resources/chessboardFEN.json"))
+    parser.add_argument("--output", default=os.path.join(root, "resources/dataset/shards"))
+    parser.add_argument("--shard-size", type=int, default=256, help="Boards per shard")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    DatasetBuilder(args.boards, args.fens, args.output, shard_size=args.shard_size, workers=args.workers).build()
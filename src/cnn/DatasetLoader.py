@@ -1,16 +1,24 @@
 import os
 import numpy as np
+import tensorflow as tf
 from PIL import Image
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedKFold, train_test_split
 from tensorflow.keras.utils import to_categorical
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 
+from src.cnn.MemmapDataset import MemmapDataset
+
 class DatasetLoader:
-    def __init__(self, dataset_path, img_size=(64, 64), test_size=0.1):
+    def __init__(self, dataset_path, img_size=(64, 64), test_size=0.1, memmap_path=None):
         self.dataset_path = dataset_path
         self.img_size = img_size
         self.test_size = test_size
-        self.class_labels = os.listdir(dataset_path)
+        # Optional preprocessed MemmapDataset, read zero-copy instead of decoding the image files
+        self.memmap = MemmapDataset(memmap_path) if memmap_path else None
+        # Sorted like utils.CLASS_LABELS, so one-hot indices match the model's classes at serve time
+        self.class_labels = self.memmap.class_labels if self.memmap else sorted(
+            label for label in os.listdir(dataset_path) if os.path.isdir(os.path.join(dataset_path, label))
+        )
         self.datagen = ImageDataGenerator(
             rotation_range=15,        # Small rotations
             width_shift_range=0.2,    # Small horizontal shifts
@@ -50,3 +58,105 @@ class DatasetLoader:
         y = to_categorical(y, num_classes=len(self.class_labels))
 
         return train_test_split(X, y, test_size=self.test_size, random_state=42)
+
+    def list_files(self):
+        """
+        Indexes the dataset as (keys, label indices) without decoding any image. Keys are image paths,
+        or row numbers when reading a memmap dataset.
+        """
+        if self.memmap is not None:
+            return np.arange(len(self.memmap)), np.asarray(self.memmap.labels, dtype=np.int64)
+
+        paths, labels = [], []
+
+        for label in self.class_labels:
+            class_dir = os.path.join(self.dataset_path, label)
+
+            if not os.path.isdir(class_dir):
+                continue
+
+            for img in os.listdir(class_dir):
+                if img.endswith(('.png', '.jpg', '.jpeg')):
+                    paths.append(os.path.join(class_dir, img))
+                    labels.append(self.class_labels.index(label))
+
+        return np.array(paths), np.array(labels)
+
+    def split_files(self):
+        """Stratified train/test split on the index, returns (train_keys, test_keys, train_labels, test_labels)."""
+        paths, labels = self.list_files()
+        return train_test_split(paths, labels, test_size=self.test_size, random_state=42, stratify=labels)
+
+    @staticmethod
+    def stratified_folds(labels, n_splits=5):
+        """Yields (train_idx, val_idx) stratified folds over a label array."""
+        skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+        return skf.split(np.zeros(len(labels)), labels)
+
+    def build_augmenter(self):
+        """Random augmentations matching the ImageDataGenerator settings, applied per batch inside tf.data."""
+        return tf.keras.Sequential([
+            tf.keras.layers.RandomRotation(15 / 360, fill_mode='nearest'),  # Small rotations
+            tf.keras.layers.RandomTranslation(0.2, 0.2, fill_mode='nearest'),  # Small shifts
+            tf.keras.layers.RandomZoom(0.1, fill_mode='nearest'),  # Small zoom variations
+            tf.keras.layers.RandomFlip('horizontal'),  # Flip horizontally
+        ])
+
+    def make_dataset(self, paths, labels, batch_size=32, augment=False, shuffle=False, cache_path=""):
+        """
+        Streams (images, one-hot labels) batches from image files, or from memmap rows when the loader
+        reads a MemmapDataset (`paths` are then row numbers from list_files).
+
+        Images are decoded lazily and in parallel with PIL, resized and cached as uint8 tensors (in memory, or in
+        `cache_path` on disk), so later epochs skip PNG decoding. With augment=True each image appears once
+        as is plus 5 augmented variations per epoch, like load_data, with augmentation done on the fly.
+        """
+        num_classes = len(self.class_labels)
+        height, width = self.img_size[1], self.img_size[0]
+
+        def load_image(path):
+            # Same PIL decode and bicubic resize as SquareExtractor and ModelTester, so training sees served pixels
+            return np.asarray(Image.open(path.decode()).convert("RGB").resize(self.img_size), dtype=np.uint8)
+
+        def decode(path, label):
+            img = tf.numpy_function(load_image, [path], tf.uint8)
+            img.set_shape((height, width, 3))
+            return img, label
+
+        def read_rows(rows, batch_labels):
+            # Sorted fancy indexing on the memmap touches each page once; one copy per read batch
+            order = tf.argsort(rows)
+            images = tf.numpy_function(lambda r: self.memmap.images[r], [tf.gather(rows, order)], tf.uint8)
+            images.set_shape((None, self.memmap.img_size[1], self.memmap.img_size[0], 3))
+            if self.memmap.img_size != tuple(self.img_size):
+                # e.g. a compact model trained at 32x32 from a 64x64 memmap, resized like ModelTester and inference
+                images = tf.numpy_function(
+                    lambda batch: MemmapDataset.resize_rows(batch, tuple(self.img_size)), [images], tf.uint8
+                )
+                images.set_shape((None, height, width, 3))
+            return images, tf.gather(batch_labels, order)
+
+        dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+        if self.memmap is not None:
+            # Already decoded on disk, the page cache does the caching
+            dataset = dataset.batch(256).map(read_rows, num_parallel_calls=tf.data.AUTOTUNE).unbatch()
+        else:
+            dataset = dataset.map(decode, num_parallel_calls=tf.data.AUTOTUNE).cache(cache_path)
+
+        if augment:
+            # Original + 5 augmented copies; the flag marks which copies get augmented
+            dataset = dataset.flat_map(lambda img, label: tf.data.Dataset.from_tensors((img, label)).repeat(6).enumerate())
+            dataset = dataset.map(lambda i, sample: (sample[0], sample[1], i > 0))
+        if shuffle:
+            dataset = dataset.shuffle(buffer_size=min(len(paths) * (6 if augment else 1), 10_000), seed=42)
+
+        augmenter = self.build_augmenter() if augment else None
+
+        def prepare(img, label, augmented=None):
+            img = tf.cast(img, tf.float32) / 255.0
+            if augmenter is not None:
+                img = tf.cond(augmented, lambda: augmenter(img[tf.newaxis], training=True)[0], lambda: img)
+            return img, tf.one_hot(label, num_classes)
+
+        dataset = dataset.map(prepare, num_parallel_calls=tf.data.AUTOTUNE)
+        return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+
+def input_size(shape):
+    """(width, height) of an NHWC model input shape, or None when the spatial dimensions are dynamic."""
+    height, width = shape[1], shape[2]
+    if isinstance(height, (int, np.integer)) and isinstance(width, (int, np.integer)) and height > 0 and width > 0:
+        return int(width), int(height)
+    return None
+
+
+class KerasBackend:
+    """Runs the original Keras .h5 model. TensorFlow is only imported when this backend is created."""
+
+    def __init__(self, model_path):
+        from tensorflow.keras.models import load_model
+
+        self.model = load_model(model_path)
+        self.input_size = input_size(self.model.input_shape)
+
+    def predict_on_batch(self, inputs):
+        return np.asarray(self.model.predict_on_batch(inputs))
+
+
+class TFLiteBackend:
+    """
+    Runs an exported .tflite model with tflite_runtime, falling back to tf.lite when only TensorFlow is
+    installed. Quantized (int8/uint8) inputs and outputs are converted with the model's scale and zero point.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input["shape"][0])
+        self.input_size = input_size(self.input["shape"])
+
+    def predict_on_batch(self, inputs):
+        if len(inputs) != self.batch_size:
+            # Exported with a dynamic batch dimension, resize once per new batch size
+            self.interpreter.resize_tensor_input(self.input["index"], [len(inputs), *self.input["shape"][1:]])
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self.batch_size = len(inputs)
+
+        if self.input["dtype"] in (np.int8, np.uint8):
+            scale, zero_point = self.input["quantization"]
+            inputs = np.clip(np.round(inputs / scale + zero_point), *self._dtype_range(self.input["dtype"]))
+        self.interpreter.set_tensor(self.input["index"], inputs.astype(self.input["dtype"]))
+        self.interpreter.invoke()
+
+        outputs = self.interpreter.get_tensor(self.output["index"])
+        if self.output["dtype"] in (np.int8, np.uint8):
+            scale, zero_point = self.output["quantization"]
+            outputs = (outputs.astype(np.float32) - zero_point) * scale
+        return outputs
+
+    @staticmethod
+    def _dtype_range(dtype):
+        info = np.iinfo(dtype)
+        return info.min, info.max
+
+
+class OnnxBackend:
+    """Runs an exported .onnx model with onnxruntime on CPU."""
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = input_size(self.session.get_inputs()[0].shape)
+
+    def predict_on_batch(self, inputs):
+        return self.session.run(None, {self.input_name: inputs.astype(np.float32)})[0]
+
+
+BACKENDS = {"keras": KerasBackend, "tflite": TFLiteBackend, "onnx": OnnxBackend}
+EXTENSIONS = {".h5": "keras", ".keras": "keras", ".tflite": "tflite", ".onnx": "onnx"}
+
+
+def load_backend(model_path, backend=None):
+    """Loads a model with the given backend name, or the one matching the model file extension."""
+    if backend is None:
+        extension = os.path.splitext(model_path)[1].lower()
+        if extension not in EXTENSIONS:
+            raise ValueError(f"Can't infer an inference backend for '{model_path}'")
+        backend = EXTENSIONS[extension]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](model_path)
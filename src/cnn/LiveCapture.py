@@ -0,0 +1,254 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.cnn.SquareExtractor import SquareExtractor
+from src.misc import utils
+from src.misc.Board import Board
+
+
+class ScreenSource:
+    """Grabs the board region of the screen (left, top, right, bottom) at up to `fps` frames per second."""
+
+    def __init__(self, board_region, fps=30):
+        from PIL import ImageGrab
+
+        self.grab = ImageGrab.grab
+        self.board_region = board_region
+        self.interval = 1.0 / fps
+
+    def frames(self):
+        while True:
+            start = time.perf_counter()
+            yield self.grab(self.board_region).convert("RGB")
+            time.sleep(max(0.0, self.interval - (time.perf_counter() - start)))
+
+
+class DirectorySource:
+    """
+    Replays board images from a directory (sorted by name) or a single file in place of the screen,
+    so the live pipeline can run headless. `fps=None` replays as fast as frames are consumed.
+    """
+
+    def __init__(self, path, fps=None, repeat=1):
+        if os.path.isdir(path):
+            self.paths = [
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(('.png', '.jpg', '.jpeg'))
+            ]
+        else:
+            self.paths = [path]
+        self.interval = 1.0 / fps if fps else 0.0
+        self.repeat = repeat  # Times each image is emitted, to simulate a static screen
+
+    def frames(self):
+        for path in self.paths:
+            frame = SquareExtractor.load_board(path)
+            frame.load()
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                yield frame
+                time.sleep(max(0.0, self.interval - (time.perf_counter() - start)))
+
+
+class LiveRecognizer:
+    """
+    Recognizes a stream of frames of the same board, classifying only the squares that changed.
+
+    Each frame is sliced at model resolution and compared with the squares last classified using a mean
+    absolute pixel difference on a subsampled grid. Squares that differ from their reference and are stable
+    since the previous frame (i.e. not mid-animation) go through the CNN; all others keep their label.
+    A position is reported only when a label actually changes, with the move inferred from the previous one.
+    """
+
+    def __init__(self, recognizer, diff_threshold=6.0, stride=4, source="live"):
+        self.recognizer = recognizer
+        self.source = source  # Board geometry cache key when the recognizer has a BoardLocator
+        self.diff_threshold = diff_threshold  # Mean absolute difference (0-255) for a square to count as changed
+        self.stride = stride  # Pixel subsampling for the diff, 4 compares 1/16 of the pixels
+        self.reference = None  # (8, 8, h, w, 3) uint8 squares the current labels were computed from
+        self.previous = None  # Squares of the previous frame, to skip squares that are still moving
+        self.classes = None  # (8, 8) uint8 class indices of the current position
+        self.board = None
+        self.turn = None
+        self.squares_classified = 0
+
+    def square_diff(self, squares, other):
+        """Mean absolute difference per square on a strided subsample, shape (8, 8)."""
+        a = squares[:, :, ::self.stride, ::self.stride].astype(np.int16)
+        b = other[:, :, ::self.stride, ::self.stride].astype(np.int16)
+        return np.abs(a - b).mean(axis=(2, 3, 4))
+
+    def process(self, frame):
+        """
+        Processes one frame and returns a position dict (fen, Board, placement, move, turn, changed squares)
+        when the recognized position changed, otherwise None.
+        """
+        squares = self.recognizer.extractor.extract_squares(frame, dtype=np.uint8, source=self.source)
+        squares = np.ascontiguousarray(squares)
+
+        if self.reference is None:
+            changed = np.ones((8, 8), dtype=bool)
+            self.reference = squares.copy()
+            self.classes = np.zeros((8, 8), dtype=np.uint8)
+        else:
+            changed = self.square_diff(squares, self.reference) > self.diff_threshold
+            if changed.any():
+                changed &= self.square_diff(squares, self.previous) <= self.diff_threshold
+        self.previous = squares
+        return self.classify(squares, changed)
+
+    def flush(self):
+        """
+        Classifies the squares of the last frame that changed but never got a second, matching frame to
+        settle, e.g. the final move of a replay that shows every position once. Returns a position dict or None.
+        """
+        if self.previous is None:
+            return None
+        changed = self.square_diff(self.previous, self.reference) > self.diff_threshold
+        return self.classify(self.previous, changed)
+
+    def classify(self, squares, changed):
+        """Runs the CNN on the `changed` squares and returns the position dict if a label changed."""
+        if not changed.any():
+            return None
+
+        rows, cols = np.nonzero(changed)
+        predicted_classes, _ = self.recognizer.predict_squares(squares[rows, cols])
+        self.reference[rows, cols] = squares[rows, cols]
+        self.squares_classified += len(rows)
+
+        if self.board is not None and np.array_equal(self.classes[rows, cols], predicted_classes):
+            return None  # Pixels changed (highlight, cursor) but no piece did
+        self.classes[rows, cols] = predicted_classes
+
+        board = Board.from_classes(self.classes)
+        if board == self.board:
+            return None
+        placement = board.placement
+
+        move, turn = None, None
+        if self.board is not None:
+            # The side that moved is unknown from pixels alone, try both
+            for side in ("w", "b") if self.turn != "b" else ("b", "w"):
+                move = utils.infer_move(self.board.placement, placement, side)
+                if move:
+                    turn = "b" if side == "w" else "w"
+                    break
+
+        self.board, self.turn = board, turn
+        return {
+            "fen": board.fen(turn=turn or "w", castling_rights=utils.infer_castling_rights(placement)),
+            "board": board,
+            "placement": placement,
+            "move": move,
+            "turn": turn,
+            "changed_squares": [utils.square_name(row, col) for row, col in zip(rows, cols)],
+        }
+
+
+class LivePipeline:
+    """
+    Producer/consumer loop around a LiveRecognizer. A capture thread pushes frames into a small queue and
+    drops the oldest frame when recognition falls behind, so capture never waits on inference.
+    `on_position(position)` is called from the recognition thread for every position change.
+    """
+
+    def __init__(self, source, live_recognizer, on_position=None, queue_size=2):
+        self.source = source
+        self.live = live_recognizer
+        self.on_position = on_position or self.print_position
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.stats = {"captured": 0, "processed": 0, "dropped": 0, "positions": 0}
+        self.started_at = None
+
+    @staticmethod
+    def print_position(position):
+        move = f" after {position['move']}" if position["move"] else ""
+        print(f"{position['fen']}{move} (changed: {', '.join(position['changed_squares'])})")
+
+    def capture(self):
+        for frame in self.source.frames():
+            if self.stop_event.is_set():
+                break
+            self.stats["captured"] += 1
+            while True:
+                try:
+                    self.frames.put_nowait(frame)
+                    break
+                except queue.Full:
+                    try:
+                        self.frames.get_nowait()  # Drop the stale frame, the newest one wins
+                        self.stats["dropped"] += 1
+                    except queue.Empty:
+                        pass
+        self.frames.put(None)  # End of stream
+
+    def recognize(self):
+        while not self.stop_event.is_set():
+            frame = self.frames.get()
+            if frame is None:
+                # Source exhausted, the last frame won't be followed by one that confirms it has settled
+                self.report(self.live.flush())
+                break
+            self.report(self.live.process(frame))
+            self.stats["processed"] += 1
+
+    def report(self, position):
+        if position is not None:
+            self.stats["positions"] += 1
+            self.on_position(position)
+
+    def run(self):
+        """Runs until the source is exhausted or stop() is called, and returns the frame statistics."""
+        self.started_at = time.perf_counter()
+        producer = threading.Thread(target=self.capture, name="board-capture", daemon=True)
+        producer.start()
+        try:
+            self.recognize()
+        finally:
+            self.stop_event.set()
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            **self.stats,
+            "squares_classified": self.live.squares_classified,
+            "elapsed_seconds": round(elapsed, 3),
+            "processed_fps": round(self.stats["processed"] / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def stop(self):
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live board recognition from the screen or a directory of frames")
+    parser.add_argument("--model", required=True, help="Model file (.h5, .tflite or .onnx)")
+    parser.add_argument("--source", default="screen", help="'screen' or a directory/file of board frames")
+    parser.add_argument("--region", default="0,0,720,720", help="Screen region left,top,right,bottom")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--threshold", type=float, default=6.0, help="Mean pixel difference for a changed square")
+    parser.add_argument("--locate", action="store_true", help="Find the board inside the frames instead of using them as is")
+    args = parser.parse_args()
+
+    from src.cnn.BoardLocator import BoardLocator
+    from src.cnn.BoardRecognizer import BoardRecognizer
+
+    if args.source == "screen":
+        frame_source = ScreenSource(tuple(int(v) for v in args.region.split(",")), fps=args.fps)
+    else:
+        frame_source = DirectorySource(args.source, fps=args.fps)
+
+    board_recognizer = BoardRecognizer(args.model, locator=BoardLocator() if args.locate else None)
+    pipeline = LivePipeline(frame_source, LiveRecognizer(board_recognizer, diff_threshold=args.threshold))
+    try:
+        print(pipeline.run())
+    except KeyboardInterrupt:
+        pipeline.stop()
+        print(pipeline.stats)
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+META_FILE = "meta.json"
+
+
+class MemmapDataset:
+    """
+    Preprocessed square dataset read zero-copy through np.memmap.
+
+    On disk: `images.npy` uint8 (N, h, w, 3), `labels.npy` int8 class indices (N,) and `meta.json` with the
+    image size, class labels and the source of every row. Opening maps the arrays instead of reading them,
+    so training and evaluation start without decoding a single PNG.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.images = np.load(os.path.join(path, IMAGES_FILE), mmap_mode="r")
+        self.labels = np.load(os.path.join(path, LABELS_FILE), mmap_mode="r")
+        self.class_labels = self.meta["class_labels"]
+        self.img_size = tuple(self.meta["img_size"])
+        self.sources = self.meta["sources"]
+
+    def __len__(self):
+        return len(self.labels)
+
+    @staticmethod
+    def resize_rows(images, img_size):
+        """
+        Resizes uint8 rows to `img_size` (width, height) with PIL's bicubic filter, the one the dataset and
+        SquareExtractor resize with, so a model trained or tested at another size sees the pixels it serves on.
+        """
+        if tuple(images.shape[2:0:-1]) == tuple(img_size):
+            return np.asarray(images)
+        return np.stack([np.asarray(Image.fromarray(image).resize(img_size, Image.BICUBIC)) for image in images])
+
+    @staticmethod
+    def _write(output_dir, count, img_size, class_labels, rows):
+        """Streams (source, image, label) rows into freshly created .npy files without holding them in memory."""
+        os.makedirs(output_dir, exist_ok=True)
+        width, height = img_size
+        images = np.lib.format.open_memmap(
+            os.path.join(output_dir, IMAGES_FILE), mode="w+", dtype=np.uint8, shape=(count, height, width, 3)
+        )
+        labels = np.lib.format.open_memmap(os.path.join(output_dir, LABELS_FILE), mode="w+", dtype=np.int8, shape=(count,))
+
+        sources = []
+        for i, (source, image, label) in enumerate(rows):
+            images[i] = image
+            labels[i] = label
+            sources.append(source)
+        images.flush()
+        labels.flush()
+
+        meta = {"count": count, "img_size": list(img_size), "class_labels": class_labels, "sources": sources}
+        with open(os.path.join(output_dir, META_FILE), "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        print(f"Wrote {count} squares to {output_dir}")
+        return MemmapDataset(output_dir)
+
+    @staticmethod
+    def from_folders(dataset_path, output_dir, img_size=(64, 64)):
+        """Converts a <label>/<image> folder dataset such as resources/dataset/chesspieces."""
+        class_labels = sorted(
+            label for label in os.listdir(dataset_path) if os.path.isdir(os.path.join(dataset_path, label))
+        )
+        files = [
+            (os.path.join(dataset_path, label, img), label_index)
+            for label_index, label in enumerate(class_labels)
+            for img in sorted(os.listdir(os.path.join(dataset_path, label)))
+            if img.endswith(('.png', '.jpg', '.jpeg'))
+        ]
+
+        rows = (
+            (os.path.relpath(path, dataset_path), np.asarray(Image.open(path).convert("RGB").resize(img_size)), label)
+            for path, label in files
+        )
+        return MemmapDataset._write(output_dir, len(files), img_size, class_labels, rows)
+
+    @staticmethod
+    def from_shards(shard_dir, output_dir):
+        """Converts the NPZ shards written by DatasetBuilder."""
+        from src.cnn.DatasetBuilder import INDEX_FILE, DatasetBuilder
+
+        with open(os.path.join(shard_dir, INDEX_FILE), "r", encoding="utf-8") as file:
+            index = json.load(file)
+
+        def rows():
+            # iter_shards yields the rows of each shard's boards in offset order
+            boards = sorted(index["boards"].items(), key=lambda item: (item[1]["shard"], item[1]["offset"]))
+            names = iter([f"{name}:{square}" for name, _ in boards for square in range(64)])
+            for images, labels in DatasetBuilder.iter_shards(shard_dir):
+                for image, label in zip(images, labels):
+                    yield next(names), image, label
+
+        return MemmapDataset._write(
+            output_dir, len(index["boards"]) * 64, tuple(index["img_size"]), index["class_labels"], rows()
+        )
+
+
+if __name__ == "__main__":
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+    parser = argparse.ArgumentParser(description="Convert a square dataset to the memory-mapped .npy format")
+    parser.add_argument("--folders", help="Folder dataset (<label>/<image>), e.g. resources/dataset/chesspieces")
+    parser.add_argument("--shards", help="Shard directory written by DatasetBuilder")
+    parser.add_argument("--output", default=os.path.join(root, "resources/dataset/memmap"))
+    args = parser.parse_args()
+
+    if args.shards:
+        MemmapDataset.from_shards(args.shards, args.output)
+    else:
+        MemmapDataset.from_folders(args.folders or os.path.join(root, "resources/dataset/chesspieces"), args.output)
@@ -0,0 +1,130 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.cnn.InferenceBackend import KerasBackend, load_backend
+
+
+class ModelExporter:
+    """Exports the Keras model trained by CNNTrainer to TFLite/ONNX and checks the exported model against it."""
+
+    def __init__(self, model_path, dataset_path, img_size=None):
+        self.model_path = model_path
+        self.dataset_path = dataset_path
+        self.img_size = img_size or KerasBackend(model_path).input_size  # (width, height) the model was trained on
+        self.class_labels = sorted(
+            label for label in os.listdir(dataset_path) if os.path.isdir(os.path.join(dataset_path, label))
+        )
+
+    def load_dataset(self, limit=None, seed=42):
+        """Loads (images, labels) from the class folders, normalized to [0, 1] float32, optionally a random subset."""
+        paths, labels = [], []
+        for label_index, label in enumerate(self.class_labels):
+            class_dir = os.path.join(self.dataset_path, label)
+            for img in os.listdir(class_dir):
+                if img.endswith(('.png', '.jpg', '.jpeg')):
+                    paths.append(os.path.join(class_dir, img))
+                    labels.append(label_index)
+
+        order = np.random.default_rng(seed).permutation(len(paths))
+        if limit:
+            order = order[:limit]
+
+        images = np.empty((len(order), self.img_size[1], self.img_size[0], 3), dtype=np.float32)
+        for i, index in enumerate(order):
+            images[i] = np.asarray(Image.open(paths[index]).convert("RGB").resize(self.img_size), dtype=np.float32)
+        images *= 1.0 / 255.0
+        return images, np.array(labels)[order]
+
+    def export_tflite(self, output_path, quantize=False, calibration_samples=200):
+        """
+        Converts the model to TFLite. With quantize=True, applies full int8 post-training quantization
+        calibrated on squares from the dataset; inputs and outputs stay float32.
+        """
+        import tensorflow as tf
+
+        model = tf.keras.models.load_model(self.model_path)
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+        if quantize:
+            calibration, _ = self.load_dataset(limit=calibration_samples)
+
+            def representative_dataset():
+                for sample in calibration:
+                    yield [sample[np.newaxis]]
+
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+        with open(output_path, "wb") as f:
+            f.write(converter.convert())
+        print(f"Saved TFLite model{' (int8)' if quantize else ''} to {output_path}")
+
+    def export_onnx(self, output_path, opset=13):
+        """Converts the model to ONNX with a dynamic batch dimension."""
+        import tensorflow as tf
+        import tf2onnx
+
+        model = tf.keras.models.load_model(self.model_path)
+        spec = [tf.TensorSpec((None, self.img_size[1], self.img_size[0], 3), tf.float32, name="input")]
+        tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+        print(f"Saved ONNX model to {output_path}")
+
+    def check_parity(self, exported_path, limit=None, batch_size=64):
+        """
+        Runs the Keras model and the exported model on the dataset and reports prediction agreement,
+        the largest probability difference and each model's accuracy against the folder labels.
+        """
+        images, labels = self.load_dataset(limit=limit)
+        reference, exported = KerasBackend(self.model_path), load_backend(exported_path)
+
+        reference_probs, exported_probs = [], []
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            reference_probs.append(reference.predict_on_batch(batch))
+            exported_probs.append(exported.predict_on_batch(batch))
+        reference_probs, exported_probs = np.concatenate(reference_probs), np.concatenate(exported_probs)
+
+        reference_pred, exported_pred = reference_probs.argmax(axis=1), exported_probs.argmax(axis=1)
+        report = {
+            "samples": len(images),
+            "agreement": float(np.mean(reference_pred == exported_pred)),
+            "max_prob_diff": float(np.abs(reference_probs - exported_probs).max()),
+            "keras_accuracy": float(np.mean(reference_pred == labels)),
+            "exported_accuracy": float(np.mean(exported_pred == labels)),
+        }
+
+        print(f"\nParity check on {report['samples']} squares ({os.path.basename(exported_path)}):")
+        print(f"Agreement with Keras: {report['agreement'] * 100:.2f}%")
+        print(f"Max probability diff: {report['max_prob_diff']:.4f}")
+        print(f"Accuracy Keras / exported: {report['keras_accuracy'] * 100:.2f}% / {report['exported_accuracy'] * 100:.2f}%")
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the piece classifier to TFLite/ONNX")
+    parser.add_argument("model", help="Keras .h5 model trained by CNNTrainer")
+    parser.add_argument("--dataset", default=os.path.join(os.path.dirname(__file__), "../../resources/dataset/chesspieces"))
+    parser.add_argument("--tflite", help="Output .tflite path")
+    parser.add_argument("--int8", action="store_true", help="Apply int8 post-training quantization to the TFLite model")
+    parser.add_argument("--onnx", help="Output .onnx path")
+    parser.add_argument("--no-parity", action="store_true", help="Skip the accuracy parity check")
+    args = parser.parse_args()
+
+    exporter = ModelExporter(args.model, args.dataset)
+    exported_paths = []
+    if args.tflite:
+        exporter.export_tflite(args.tflite, quantize=args.int8)
+        exported_paths.append(args.tflite)
+    if args.onnx:
+        exporter.export_onnx(args.onnx)
+        exported_paths.append(args.onnx)
+
+    if not args.no_parity:
+        for path in exported_paths:
+            exporter.check_parity(path)
@@ -1,21 +1,34 @@
+import argparse
+import json
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from PIL import Image
-from tensorflow.keras.models import load_model
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.cnn.InferenceBackend import load_backend
+from src.cnn.MemmapDataset import MemmapDataset
+from src.misc import utils
+from src.misc.Board import Board
 
 class ModelTester:
     def __init__(self, model_path, test_images_path, class_labels):
-        self.model = load_model(model_path)
+        self.model_path = model_path
+        self.model = load_backend(model_path)
+        self.img_size = getattr(self.model, "input_size", None) or (64, 64)  # (width, height) the model was trained on
         self.test_images_path = test_images_path
         self.class_labels = class_labels  # ["empty", "wP", "wR", ..., "bK"]
 
     def predict_image(self, image_path):
         """Predicts the chess piece in a given image."""
-        img = Image.open(image_path).convert("RGB").resize((64, 64))  # Resize for CNN
-        img_array = np.array(img) / 255.0  # Normalize pixel values
+        img = Image.open(image_path).convert("RGB").resize(self.img_size)  # Resize for CNN
+        img_array = np.array(img, dtype=np.float32) / 255.0  # Normalize pixel values
         img_array = np.expand_dims(img_array, axis=0)  # Add batch dimension
 
-        predictions = self.model.predict(img_array)
+        predictions = self.model.predict_on_batch(img_array)
         class_index = np.argmax(predictions)
         return self.class_labels[class_index]
 
@@ -45,12 +58,160 @@ class ModelTester:
         accuracy = (correct_predictions / total_images) * 100 if total_images > 0 else 0
         print(f"\nModel Accuracy: {accuracy:.2f}% ({correct_predictions}/{total_images})")
 
+    def test_memmap(self, memmap_path, batch_size=256):
+        """Evaluates on a MemmapDataset in batches read straight from the mapped arrays, no PNG decoding."""
+        dataset = MemmapDataset(memmap_path)
+        correct_predictions = 0
+
+        for start in range(0, len(dataset), batch_size):
+            batch = dataset.images[start:start + batch_size]
+            batch = MemmapDataset.resize_rows(batch, self.img_size).astype(np.float32) / 255.0
+            predicted = np.argmax(self.model.predict_on_batch(batch), axis=1)
+            predicted_labels = [self.class_labels[i] for i in predicted]
+            actual_labels = [dataset.class_labels[i] for i in dataset.labels[start:start + batch_size]]
+            correct_predictions += sum(p == a for p, a in zip(predicted_labels, actual_labels))
+
+        total_images = len(dataset)
+        accuracy = (correct_predictions / total_images) * 100 if total_images > 0 else 0
+        print(f"\nModel Accuracy: {accuracy:.2f}% ({correct_predictions}/{total_images})")
+        return accuracy
+
+    def load_image(self, image_path):
+        """Decodes one square for batched evaluation (uint8, model input size)."""
+        return np.asarray(Image.open(image_path).convert("RGB").resize(self.img_size))
+
+    def evaluate(self, batch_size=256, workers=8):
+        """
+        Evaluates every image in the class subfolders: images are decoded by a thread pool while the model
+        runs on large batches. Returns overall and per-class accuracy, the confusion matrix, per-image
+        confidence and throughput as a JSON-serializable dict.
+        """
+        files = [
+            (os.path.join(self.test_images_path, piece_type, img_name), piece_type)
+            for piece_type in sorted(os.listdir(self.test_images_path))
+            if os.path.isdir(os.path.join(self.test_images_path, piece_type))
+            for img_name in sorted(os.listdir(os.path.join(self.test_images_path, piece_type)))
+        ]
+        predicted, confidences = [], []
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(files), batch_size):
+                chunk = [path for path, _ in files[start:start + batch_size]]
+                batch = np.stack(list(pool.map(self.load_image, chunk))).astype(np.float32) / 255.0
+                probabilities = np.asarray(self.model.predict_on_batch(batch))
+                predicted.extend(np.argmax(probabilities, axis=1).tolist())
+                confidences.extend(np.max(probabilities, axis=1).tolist())
+
+        elapsed = time.perf_counter() - start_time
+        labels = list(self.class_labels)
+        actual = [labels.index(piece_type) if piece_type in labels else -1 for _, piece_type in files]
+        report = self.summarize(actual, predicted, confidences, elapsed)
+        report["predictions"] = [
+            {"image": os.path.relpath(path, self.test_images_path), "actual": piece_type,
+             "predicted": labels[p], "confidence": round(c, 6)}
+            for (path, piece_type), p, c in zip(files, predicted, confidences)
+        ]
+        return report
+
+    def summarize(self, actual, predicted, confidences, elapsed):
+        """Accuracy, per-class accuracy, confusion matrix (rows = actual) and throughput for a set of predictions."""
+        labels = list(self.class_labels)
+        actual, predicted = np.array(actual), np.array(predicted)
+        known = actual >= 0
+        matrix = np.zeros((len(labels), len(labels)), dtype=int)
+        np.add.at(matrix, (actual[known], predicted[known]), 1)
+
+        per_class = {}
+        for i, label in enumerate(labels):
+            count = int(matrix[i].sum())
+            per_class[label] = {"count": count, "accuracy": float(matrix[i, i] / count) if count else None}
+
+        total = len(actual)
+        return {
+            "images": total,
+            "accuracy": float(np.mean(actual == predicted)) if total else 0.0,
+            "mean_confidence": float(np.mean(confidences)) if total else 0.0,
+            "per_class": per_class,
+            "confusion_matrix": {"labels": labels, "matrix": matrix.tolist()},
+            "elapsed_seconds": round(elapsed, 4),
+            "images_per_second": round(total / elapsed, 2) if elapsed > 0 else None,
+        }
+
+    def evaluate_boards(self, board_dir, fen_json, chunk_size=16):
+        """
+        Board-level evaluation: recognizes every board listed in the FEN json with BoardRecognizer and compares
+        each square against the FEN. Reports board exact-match and square accuracy plus the wrong squares per board.
+        """
+        from src.cnn.BoardRecognizer import BoardRecognizer
+
+        with open(fen_json, "r", encoding="utf-8") as file:
+            fens = {name: entry["fen"] for name, entry in json.load(file).items() if "fen" in entry}
+        names = [name for name in sorted(fens) if os.path.exists(os.path.join(board_dir, name))]
+
+        recognizer = BoardRecognizer(self.model_path)
+        start_time = time.perf_counter()
+        board_states = recognizer.predict_boards([os.path.join(board_dir, name) for name in names], chunk_size)
+        elapsed = time.perf_counter() - start_time
+
+        boards, correct_squares = [], 0
+        for name, board_state in zip(names, board_states):
+            expected = Board.from_fen(fens[name])
+            wrong = [
+                {"square": utils.square_name(row, col), "expected": expected[row, col], "predicted": board_state[row, col]}
+                for row, col in zip(*np.nonzero((board_state.codes != expected.codes).reshape(8, 8)))
+            ]
+            correct_squares += 64 - len(wrong)
+            boards.append({"image": name, "fen": fens[name], "predicted_fen": board_state.fen(),
+                           "correct": not wrong, "wrong_squares": wrong})
+
+        total = len(boards)
+        return {
+            "boards": total,
+            "board_accuracy": sum(board["correct"] for board in boards) / total if total else 0.0,
+            "square_accuracy": correct_squares / (total * 64) if total else 0.0,
+            "elapsed_seconds": round(elapsed, 4),
+            "boards_per_second": round(total / elapsed, 2) if elapsed > 0 else None,
+            "results": boards,
+        }
+
 
 if __name__ == "__main__":
-    model_path = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\models\CNNModel.h5"
-    test_images_path = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\resources\dataset\chesspieces"
-    class_labels = ["empty", "wP", "wR", "wN", "wB", "wQ", "wK", "bP", "bR", "bN", "bB", "bQ", "bK"]
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+    parser = argparse.ArgumentParser(description="Evaluate the piece classifier")
+    parser.add_argument("--model", default=r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\models\CNNModel.h5")
+    parser.add_argument("--dataset", default=os.path.join(root, "resources/dataset/chesspieces"))
+    parser.add_argument("--mode", choices=["squares", "boards", "legacy"], default="squares")
+    parser.add_argument("--boards", default=os.path.join(root, "resources/images/chessboard"))
+    parser.add_argument("--fens", default=os.path.join(root, "resources/chessboardFEN.json"))
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    # Model outputs follow the sorted dataset folder names
+    tester = ModelTester(args.model, args.dataset, utils.CLASS_LABELS)
+
+    if args.mode == "legacy":
+        tester.test_all_images()
+        sys.exit(0)
 
-    tester = ModelTester(model_path, test_images_path, class_labels)
-    tester.test_all_images()
+    if args.mode == "squares":
+        report = tester.evaluate(batch_size=args.batch_size, workers=args.workers)
+        print(f"\nModel Accuracy: {report['accuracy'] * 100:.2f}% on {report['images']} images "
+              f"({report['images_per_second']} images/s)")
+        for label, stats in report["per_class"].items():
+            if stats["count"]:
+                print(f"{label:>6}: {stats['accuracy'] * 100:6.2f}% ({stats['count']})")
+    else:
+        report = tester.evaluate_boards(args.boards, args.fens)
+        print(f"\nBoards fully correct: {report['board_accuracy'] * 100:.2f}% of {report['boards']} | "
+              f"Square accuracy: {report['square_accuracy'] * 100:.2f}% ({report['boards_per_second']} boards/s)")
+        for board in report["results"]:
+            if not board["correct"]:
+                print(f"{board['image']}: {len(board['wrong_squares'])} wrong squares")
 
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {args.json}")
@@ -1,24 +1,114 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
 import tensorflow as tf
 from keras.src.optimizers import Adam
-from sklearn.model_selection import StratifiedKFold
 from tensorflow.keras import layers, models
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.callbacks import Callback, EarlyStopping
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.cnn.DatasetLoader import DatasetLoader
+
+SEED = 42
+ARCHITECTURES = ("mobilenet", "compact")
+
+
+def limit_threads(threads):
+    """Pool initializer: caps TensorFlow's threads so parallel folds don't oversubscribe the CPU."""
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(min(2, threads))
+
+
+def run_job(config, job):
+    """Entry point of a pool worker: trains one fold (or the final model) with its own trainer and dataset pipeline."""
+    return CNNTrainer(**config).train_job(**job)
+
+
+class EpochCheckpoint(Callback):
+    """
+    Saves the full model (weights and optimizer state) plus a state file after every epoch, and the best model
+    by val_loss, so an interrupted job continues from its last finished epoch.
+    """
+
+    def __init__(self, job_dir, early_stopping=None):
+        super().__init__()
+        self.job_dir = job_dir
+        self.early_stopping = early_stopping
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        state = load_json(os.path.join(self.job_dir, "state.json")) or {"history": {}}
+        for name, value in logs.items():
+            state["history"].setdefault(name, []).append(float(value))
+
+        val_loss = logs.get("val_loss")
+        if val_loss is not None and val_loss < state.get("best_val_loss", np.inf):
+            state["best_val_loss"], state["best_epoch"] = float(val_loss), epoch + 1
+            self.model.save(os.path.join(self.job_dir, "best.h5"))
+
+        # Write the model before the state, a crash in between only repeats one epoch
+        self.model.save(os.path.join(self.job_dir, "last.h5"))
+        state["epoch"] = epoch + 1
+        if self.early_stopping is not None:
+            state["wait"] = int(self.early_stopping.wait)
+        save_json(os.path.join(self.job_dir, "state.json"), state)
+
+
+class ResumableEarlyStopping(EarlyStopping):
+    """EarlyStopping that starts from a checkpointed patience counter and best val_loss instead of from scratch."""
+
+    def __init__(self, state=None, **kwargs):
+        super().__init__(**kwargs)
+        self.state = state or {}
+
+    def on_train_begin(self, logs=None):
+        super().on_train_begin(logs)
+        if "best_val_loss" in self.state:
+            self.best = self.state["best_val_loss"]
+            self.wait = self.state.get("wait", 0)
+
+
+def load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
 
-from cnn.DatasetLoader import DatasetLoader
+def save_json(path, data):
+    # Write then rename, so an interrupted run never leaves a truncated file behind
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
+    os.replace(path + ".tmp", path)
 
 
 class CNNTrainer:
-    def __init__(self, dataset_path, model_path, img_size=(64, 64)):
+    def __init__(self, dataset_path, model_path, img_size=(64, 64), memmap_path=None, architecture="mobilenet"):
+        if architecture not in ARCHITECTURES:
+            raise ValueError(f"Unknown architecture '{architecture}', expected one of {ARCHITECTURES}")
         self.dataset_path = dataset_path
-        self.img_size = img_size
+        self.img_size = tuple(img_size)
         self.model_path = model_path
-        self.dataset_loader = DatasetLoader(dataset_path)
-        self.model = self.build_model()
+        self.memmap_path = memmap_path
+        self.architecture = architecture  # "mobilenet" (ImageNet backbone) or "compact" (small CNN for fast CPU inference)
+        self.dataset_loader = DatasetLoader(dataset_path, img_size, memmap_path=memmap_path)
+        self.model = None  # Final model, set by train(); every fold builds its own fresh model
 
     def build_model(self):
-        base_model = MobileNetV2(input_shape=(64, 64, 3), include_top=False, weights='imagenet')
+        if self.architecture == "compact":
+            return self.build_compact_model()
+        return self.build_mobilenet_model()
+
+    def build_mobilenet_model(self):
+        width, height = self.img_size
+        base_model = MobileNetV2(input_shape=(height, width, 3), include_top=False, weights='imagenet')
 
         # Fine-tune deeper layers instead of early ones
         for layer in base_model.layers[:80]:
@@ -40,38 +130,210 @@ class CNNTrainer:
         model.compile(optimizer=Adam(learning_rate=0.0001), loss='categorical_crossentropy', metrics=['accuracy'])
         return model
 
-    def train(self, epochs=20, batch_size=32):
-        global early_stopping
-        X_train, X_test, y_train, y_test = self.dataset_loader.load_data()
+    def build_compact_model(self):
+        """
+        Small CNN for the flat-rendered piece sprites, meant for 32x32 input: three conv blocks and a linear
+        classifier, about 37k parameters and ~3M multiply-adds per square, versus a full MobileNetV2 pass.
+        """
+        width, height = self.img_size
+
+        def conv_block(filters):
+            return [
+                layers.Conv2D(filters, (3, 3), padding="same", use_bias=False),
+                layers.BatchNormalization(),
+                layers.ReLU(),
+                layers.MaxPooling2D((2, 2)),
+            ]
+
+        model = models.Sequential([
+            layers.Input((height, width, 3)),
+            *conv_block(16),
+            *conv_block(32),
+            *conv_block(64),
+            layers.Flatten(),  # Keeps where in the square the features are, piece shapes differ mostly in outline
+            layers.Dropout(0.3),
+            layers.Dense(len(self.dataset_loader.class_labels), activation='softmax')
+        ])
+
+        # Trained from scratch, so a higher learning rate than the fine-tuned backbone
+        model.compile(optimizer=Adam(learning_rate=0.001), loss='categorical_crossentropy', metrics=['accuracy'])
+        return model
 
-        skf = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+    def train_job(self, name, train_keys, train_labels, val_keys, val_labels, job_dir, epochs, batch_size=32,
+                  seed=SEED, early_stopping=True):
+        """
+        Trains a fresh model on one split and returns its result dict. Resumes from `job_dir` if an earlier run
+        was interrupted, and returns the stored result right away if the job already finished.
+        """
+        os.makedirs(job_dir, exist_ok=True)
+        result = load_json(os.path.join(job_dir, "result.json"))
+        if result is not None:
+            print(f"[{name}] Already trained, reusing {job_dir}")
+            return result
 
-        for train_idx, val_idx in skf.split(X_train, np.argmax(y_train, axis=1)):
-            x_tr, x_val = X_train[train_idx], X_train[val_idx]
-            y_tr, y_val = y_train[train_idx], y_train[val_idx]
+        tf.keras.utils.set_random_seed(seed)  # Model init, augmentation and dropout are reproducible per job
+        loader = self.dataset_loader
+        train_ds = loader.make_dataset(train_keys, train_labels, batch_size, augment=True, shuffle=True)
+        val_ds = loader.make_dataset(val_keys, val_labels, batch_size)
 
-            early_stopping = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
+        state = load_json(os.path.join(job_dir, "state.json")) or {}
+        initial_epoch = state.get("epoch", 0)
+        if initial_epoch:
+            print(f"[{name}] Resuming after epoch {initial_epoch}")
+            model = tf.keras.models.load_model(os.path.join(job_dir, "last.h5"))
+        else:
+            model = self.build_model()
 
-            print(f"Training fold with {len(x_tr)} samples, validating on {len(x_val)} samples")
+        stopper = ResumableEarlyStopping(state, monitor='val_loss', patience=5) if early_stopping else None
+        # Checkpoint after the early stopping update, so the saved patience counter includes this epoch
+        callbacks = [callback for callback in (stopper, EpochCheckpoint(job_dir, stopper)) if callback is not None]
 
-            self.model.fit(
-                x_tr, y_tr,  # Train on split data
-                epochs=50,
-                batch_size=batch_size,
-                validation_data=(x_val, y_val),  # Validate on split data
-                callbacks=[early_stopping]
+        start_time = time.perf_counter()
+        stopped_early = state.get("wait", 0) >= 5 if early_stopping else False
+        if initial_epoch < epochs and not stopped_early:
+            print(f"[{name}] Training on {len(train_keys)} images, validating on {len(val_keys)} images")
+            model.fit(
+                train_ds,  # Train on split data, augmented on the fly
+                epochs=epochs,
+                initial_epoch=initial_epoch,
+                validation_data=val_ds,  # Validate on split data
+                callbacks=callbacks,
+                verbose=2,  # One line per epoch, progress bars from parallel workers interleave
             )
 
-        # Final training on full dataset after KFold validation
-        self.model.fit(
-            X_train, y_train,
-            epochs=10,  # Fewer epochs to finalize training
-            batch_size=batch_size,
-            validation_data=(X_test, y_test),
-            callbacks=[early_stopping]
-        )
+        # Report the best epoch, like restore_best_weights would
+        best_path = os.path.join(job_dir, "best.h5")
+        if early_stopping and os.path.exists(best_path):
+            model = tf.keras.models.load_model(best_path)
+        val_loss, val_accuracy = model.evaluate(val_ds, verbose=0)
+
+        state = load_json(os.path.join(job_dir, "state.json")) or {}
+        result = {
+            "name": name,
+            "model": best_path if early_stopping else os.path.join(job_dir, "last.h5"),
+            "epochs": state.get("epoch", 0),
+            "best_epoch": state.get("best_epoch"),
+            "val_loss": float(val_loss),
+            "val_accuracy": float(val_accuracy),
+            "train_images": int(len(train_keys)),
+            "val_images": int(len(val_keys)),
+            "train_seconds": round(time.perf_counter() - start_time, 1),
+            "history": state.get("history", {}),
+        }
+        save_json(os.path.join(job_dir, "result.json"), result)
+        print(f"[{name}] val_loss {val_loss:.4f}, val_accuracy {val_accuracy:.4f}")
+        return result
 
+    def run_jobs(self, jobs, workers, threads_per_worker):
+        """Runs training jobs in a process pool (in this process when workers is 1). Returns results in job order."""
+        config = {"dataset_path": self.dataset_path, "model_path": self.model_path, "img_size": self.img_size,
+                  "memmap_path": self.memmap_path, "architecture": self.architecture}
+        if workers <= 1:
+            return [self.train_job(**job) for job in jobs]
+
+        # Spawn, not fork: a forked TensorFlow runtime deadlocks
+        context = multiprocessing.get_context("spawn")
+        results = [None] * len(jobs)
+        # OpenMP reads its thread count once, when a worker imports numpy and TensorFlow to unpickle run_job,
+        # i.e. before the initializer runs. Spawned workers copy this process's environment when they start.
+        omp_threads = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=limit_threads,
+                                     initargs=(threads_per_worker,)) as pool:
+                futures = {pool.submit(run_job, config, job): i for i, job in enumerate(jobs)}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        finally:
+            if omp_threads is None:
+                os.environ.pop("OMP_NUM_THREADS", None)
+            else:
+                os.environ["OMP_NUM_THREADS"] = omp_threads
+        return results
+
+    def train(self, epochs=50, batch_size=32, n_splits=5, workers=None, threads_per_worker=None, checkpoint_dir=None,
+              final="retrain", final_epochs=None):
+        """
+        Stratified k-fold cross-validation followed by a final model.
+
+        Each fold trains a fresh model, up to `workers` folds at a time in separate processes with
+        `threads_per_worker` TensorFlow threads each (defaults split the CPU cores between the folds). Every epoch
+        is checkpointed under `checkpoint_dir`, so rerunning an interrupted training skips finished folds and
+        resumes the others. The fold results are written to cv_report.json there.
+
+        `final` picks the saved model: "retrain" trains a fresh model on the whole training split for the median
+        best epoch of the folds (or `final_epochs`), "best_fold" keeps the fold model with the lowest val_loss.
+        Returns the report, including the final model's test set loss and accuracy.
+        """
+        loader = self.dataset_loader
+        train_keys, test_keys, train_labels, test_labels = loader.split_files()
+        cpus = os.cpu_count() or 1
+        workers = workers or min(n_splits, cpus)
+        threads_per_worker = threads_per_worker or max(1, cpus // workers)
+        checkpoint_dir = checkpoint_dir or os.path.splitext(self.model_path)[0] + "_cv"
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+        # Checkpoints only resume a run with the same splits and training settings
+        run_config = {"dataset_path": self.dataset_path, "memmap_path": self.memmap_path, "img_size": list(self.img_size),
+                      "architecture": self.architecture, "images": int(len(train_keys)), "epochs": epochs,
+                      "batch_size": batch_size, "n_splits": n_splits, "seed": SEED}
+        previous = load_json(os.path.join(checkpoint_dir, "config.json"))
+        if previous is not None and previous != run_config:
+            raise ValueError(f"{checkpoint_dir} holds checkpoints of a different training run, "
+                             f"remove it or pass another checkpoint_dir")
+        save_json(os.path.join(checkpoint_dir, "config.json"), run_config)
+
+        jobs = [
+            {"name": f"fold_{k}", "train_keys": train_keys[train_idx], "train_labels": train_labels[train_idx],
+             "val_keys": train_keys[val_idx], "val_labels": train_labels[val_idx],
+             "job_dir": os.path.join(checkpoint_dir, f"fold_{k}"), "epochs": epochs, "batch_size": batch_size,
+             "seed": SEED + k}
+            for k, (train_idx, val_idx) in enumerate(loader.stratified_folds(train_labels, n_splits))
+        ]
+        print(f"Cross-validating {n_splits} folds with {workers} workers x {threads_per_worker} threads")
+        start_time = time.perf_counter()
+        folds = self.run_jobs(jobs, min(workers, len(jobs)), threads_per_worker)
+
+        val_accuracy = np.array([fold["val_accuracy"] for fold in folds])
+        val_loss = np.array([fold["val_loss"] for fold in folds])
+        best_fold = folds[int(np.argmin(val_loss))]
+        report = {
+            "folds": [{key: value for key, value in fold.items() if key != "history"} for fold in folds],
+            "val_accuracy_mean": float(val_accuracy.mean()),
+            "val_accuracy_std": float(val_accuracy.std()),
+            "val_loss_mean": float(val_loss.mean()),
+            "val_loss_std": float(val_loss.std()),
+            "best_fold": best_fold["name"],
+            "cv_seconds": round(time.perf_counter() - start_time, 1),
+            "architecture": self.architecture,
+            "img_size": list(self.img_size),
+            "workers": workers,
+            "threads_per_worker": threads_per_worker,
+        }
+        print(f"CV accuracy {report['val_accuracy_mean']:.4f} +- {report['val_accuracy_std']:.4f}, "
+              f"loss {report['val_loss_mean']:.4f} +- {report['val_loss_std']:.4f}")
+
+        if final == "best_fold":
+            self.model = tf.keras.models.load_model(best_fold["model"])
+        elif final == "retrain":
+            # No validation split left for early stopping, train for as long as the folds needed
+            final_epochs = final_epochs or int(np.median([fold["best_epoch"] or fold["epochs"] for fold in folds]))
+            result = self.run_jobs([{
+                "name": "final", "train_keys": train_keys, "train_labels": train_labels, "val_keys": test_keys,
+                "val_labels": test_labels, "job_dir": os.path.join(checkpoint_dir, "final"), "epochs": final_epochs,
+                "batch_size": batch_size, "early_stopping": False,
+            }], 1, threads_per_worker)[0]
+            self.model = tf.keras.models.load_model(result["model"])
+            report["final_epochs"] = final_epochs
+        else:
+            raise ValueError(f"Unknown final model selection '{final}', expected 'retrain' or 'best_fold'")
+
+        test_loss, test_accuracy = self.model.evaluate(loader.make_dataset(test_keys, test_labels, batch_size), verbose=0)
+        report.update({"final": final, "test_loss": float(test_loss), "test_accuracy": float(test_accuracy)})
         self.model.save(self.model_path)
+        save_json(os.path.join(checkpoint_dir, "cv_report.json"), report)
+        print(f"Final model ({final}): test accuracy {test_accuracy:.4f}, saved to {self.model_path}")
+        return report
 
 
 # Run training
@@ -79,5 +341,25 @@ if __name__ == "__main__":
     dataset_path = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\resources\dataset\chesspieces"
     model_path = r"C:\Users\christian\Desktop\Thefolder\Projects\RookceptionCNN\models\CNNModel.h5"
 
-    trainer = CNNTrainer(dataset_path=dataset_path, model_path=model_path)
-    trainer.train()
+    parser = argparse.ArgumentParser(description="Cross-validated training of the square classifier")
+    parser.add_argument("--dataset", default=dataset_path, help="Directory with one folder of square images per class")
+    parser.add_argument("--memmap", default=None, help="Preprocessed memmap dataset, used instead of the image folders")
+    parser.add_argument("--model", default=model_path, help="Where to save the final model")
+    parser.add_argument("--architecture", choices=ARCHITECTURES, default="mobilenet",
+                        help="'compact' trains a small CNN for fast CPU inference, best with --img-size 32")
+    parser.add_argument("--img-size", type=int, default=64, help="Square input size in pixels")
+    parser.add_argument("--epochs", type=int, default=50, help="Maximum epochs per fold, early stopping ends most sooner")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None, help="Folds trained in parallel (default: one per core, up to --folds)")
+    parser.add_argument("--threads", type=int, default=None, help="TensorFlow threads per worker (default: cores / workers)")
+    parser.add_argument("--checkpoint-dir", default=None, help="Checkpoints and report (default: <model>_cv next to the model)")
+    parser.add_argument("--final", choices=("retrain", "best_fold"), default="retrain", help="How to pick the saved model")
+    parser.add_argument("--final-epochs", type=int, default=None, help="Epochs of the retrained model (default: median best epoch)")
+    args = parser.parse_args()
+
+    trainer = CNNTrainer(dataset_path=args.dataset, model_path=args.model, img_size=(args.img_size, args.img_size),
+                         memmap_path=args.memmap, architecture=args.architecture)
+    trainer.train(epochs=args.epochs, batch_size=args.batch_size, n_splits=args.folds, workers=args.workers,
+                  threads_per_worker=args.threads, checkpoint_dir=args.checkpoint_dir, final=args.final,
+                  final_epochs=args.final_epochs)
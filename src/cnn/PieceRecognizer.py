@@ -1,23 +1,24 @@
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
+from PIL import Image
 import os
 
+from src.cnn.InferenceBackend import load_backend
+
 class PieceRecognizer:
     def __init__(self, model_path, class_labels, img_size=(64, 64)):
-        self.model = load_model(model_path)  # Load trained model
+        self.model = load_backend(model_path)  # Load trained model (.h5, .tflite or .onnx)
         self.class_labels = class_labels  # Label names (e.g., ['bB', 'bK', ...])
         self.img_size = img_size  # Model image size
 
     def predict(self, img_path):
         # Load image
-        img = image.load_img(img_path, target_size=self.img_size)
-        img_array = image.img_to_array(img)  # Convert to array
+        img = Image.open(img_path).convert("RGB").resize(self.img_size)
+        img_array = np.asarray(img, dtype=np.float32)  # Convert to array
         img_array = np.expand_dims(img_array, axis=0)  # Add batch dimension
         img_array /= 255.0  # Normalize pixels
 
         # Predict
-        predictions = self.model.predict(img_array)
+        predictions = self.model.predict_on_batch(img_array)
 
         # Print all probabilities
         for i, label in enumerate(self.class_labels):
@@ -0,0 +1,99 @@
+import heapq
+
+import numpy as np
+
+from src.misc import metrics, utils
+
+LABEL_TO_FEN = {label: symbol for symbol, label in utils.FEN_TO_LABEL.items()}
+
+
+class PositionValidator:
+    """
+    Turns per-square softmax outputs into the most probable legal board.
+
+    The argmax board is used when it is legal. Otherwise every square's next most likely classes are
+    ranked by how much probability they give up (log ratio to the argmax), and sets of replacements are
+    tried cheapest first until the board passes utils.position_violations. Boards that need more than
+    `max_changes` replacements, more than `max_cost` probability given up (log ratio, 100x by default) or
+    aren't fixed within `max_candidates` tries are rejected with IllegalPositionError, rather than
+    inventing pieces the model is sure aren't there.
+    """
+
+    def __init__(self, class_labels, alternatives=2, max_changes=3, max_candidates=5000, min_probability=1e-4,
+                 max_cost=np.log(100)):
+        self.class_labels = list(class_labels)
+        self.symbols = [LABEL_TO_FEN[label] for label in self.class_labels]
+        self.alternatives = alternatives  # Classes per square considered besides the argmax
+        self.max_changes = max_changes
+        self.max_candidates = max_candidates
+        self.min_probability = min_probability  # Alternatives less likely than this are never considered
+        self.max_cost = max_cost
+
+    def resolve(self, probabilities, turn=None):
+        """
+        probabilities: (64, n_classes) softmax outputs in square order (row 0 = rank 8).
+        Returns (class_indices, corrected_squares): the (64,) classes of the most probable legal board and the
+        names of the squares that differ from the argmax. Raises IllegalPositionError if none is found.
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        best = probabilities.argmax(axis=1)
+        grid = [[self.symbols[best[row * 8 + col]] for col in range(8)] for row in range(8)]
+
+        violations = utils.position_violations(grid, turn)
+        if not violations:
+            metrics.POSITION_VALIDATION.inc(result="legal")
+            return best, []
+
+        options = self.ranked_options(probabilities, best)
+        for changes in self.cheapest_change_sets(options):
+            candidate = [row[:] for row in grid]
+            for square, class_index in changes:
+                candidate[square // 8][square % 8] = self.symbols[class_index]
+            if not utils.position_violations(candidate, turn):
+                fixed = best.copy()
+                for square, class_index in changes:
+                    fixed[square] = class_index
+                metrics.POSITION_VALIDATION.inc(result="corrected")
+                return fixed, [utils.square_name(square // 8, square % 8) for square, _ in changes]
+
+        metrics.POSITION_VALIDATION.inc(result="rejected")
+        raise utils.IllegalPositionError(violations)
+
+    def ranked_options(self, probabilities, best):
+        """[(cost, square, class_index)] replacements sorted by the log probability they give up."""
+        options = []
+        log_probs = np.log(np.maximum(probabilities, 1e-12))
+        for square in range(len(probabilities)):
+            ranked = np.argsort(probabilities[square])[::-1][1:self.alternatives + 1]
+            for class_index in ranked:
+                cost = log_probs[square, best[square]] - log_probs[square, class_index]
+                if probabilities[square, class_index] >= self.min_probability and cost <= self.max_cost:
+                    options.append((float(cost), square, int(class_index)))
+        options.sort()
+        return options
+
+    def cheapest_change_sets(self, options):
+        """
+        Yields sets of (square, class_index) replacements in increasing total cost, at most one per square.
+        Subsets of the sorted options are enumerated with a heap: each set either appends the next option
+        or swaps its last option for the next one, which visits every subset exactly once in cost order.
+        """
+        if not options:
+            return
+        heap = [(options[0][0], (0,))]
+        tried = 0
+        while heap and tried < self.max_candidates:
+            cost, indices = heapq.heappop(heap)
+            if cost > self.max_cost:
+                return  # Every remaining set costs at least as much
+            last = indices[-1]
+            if last + 1 < len(options):
+                next_cost = options[last + 1][0]
+                if len(indices) < self.max_changes:
+                    heapq.heappush(heap, (cost + next_cost, indices + (last + 1,)))
+                heapq.heappush(heap, (cost - options[last][0] + next_cost, indices[:-1] + (last + 1,)))
+
+            squares = [options[i][1] for i in indices]
+            if len(set(squares)) == len(squares):
+                tried += 1
+                yield [(options[i][1], options[i][2]) for i in indices]
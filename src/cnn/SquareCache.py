@@ -0,0 +1,91 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SquareCache:
+    """
+    Content-addressed cache of square predictions.
+
+    Squares are keyed by a hash of their uint8 pixels, so a square that looks exactly like one seen before
+    reuses its label without a model call. With `perceptual=True`, squares missing the exact hash are also
+    matched by an 8x8 average hash plus their quantized mean brightness, which tolerates small compression or
+    scaling noise between screenshots. The cache holds at most `max_entries` keys per hash kind (LRU).
+    """
+
+    def __init__(self, max_entries=4096, perceptual=False):
+        self.max_entries = max_entries
+        self.perceptual = perceptual
+        self.exact = OrderedDict()
+        self.similar = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def exact_keys(squares):
+        """blake2b digests of each square's raw pixels. squares: uint8 (n, h, w, 3)."""
+        return [hashlib.blake2b(square.tobytes(), digest_size=16).digest() for square in squares]
+
+    @staticmethod
+    def perceptual_keys(squares):
+        """Average hash of each square on an 8x8 grayscale grid, combined with its mean brightness."""
+        n, height, width, _ = squares.shape
+        gray = squares.reshape(n, 8, height // 8, 8, width // 8, 3).mean(axis=(2, 4, 5))
+        means = gray.reshape(n, -1).mean(axis=1)
+        bits = np.packbits(gray.reshape(n, -1) > means[:, None], axis=1)
+        # Brightness bucket keeps e.g. light and dark pieces with the same outline apart
+        return [row.tobytes() + bytes([int(mean) // 16]) for row, mean in zip(bits, means)]
+
+    def lookup(self, squares):
+        """
+        Returns (keys, results, missing): the cache keys for each square, the cached prediction (the square's
+        class probabilities) or None per square, and the indices of squares that still need the model.
+        """
+        exact_keys = self.exact_keys(squares)
+        similar_keys = self.perceptual_keys(squares) if self.perceptual else [None] * len(exact_keys)
+        results, missing = [], []
+
+        with self.lock:
+            for i, (exact_key, similar_key) in enumerate(zip(exact_keys, similar_keys)):
+                result = self.exact.get(exact_key)
+                if result is not None:
+                    self.exact.move_to_end(exact_key)
+                elif similar_key is not None and similar_key in self.similar:
+                    result = self.similar[similar_key]
+                    self.similar.move_to_end(similar_key)
+
+                if result is None:
+                    missing.append(i)
+                results.append(result)
+
+            self.hits += len(exact_keys) - len(missing)
+            self.misses += len(missing)
+
+        return list(zip(exact_keys, similar_keys)), results, missing
+
+    def store(self, keys, results):
+        """Stores predictions under the keys returned by lookup."""
+        with self.lock:
+            for (exact_key, similar_key), result in zip(keys, results):
+                self._put(self.exact, exact_key, result)
+                if similar_key is not None:
+                    self._put(self.similar, similar_key, result)
+
+    def _put(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached squares."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.exact)}
+
+    def clear(self):
+        with self.lock:
+            self.exact.clear()
+            self.similar.clear()
@@ -0,0 +1,123 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from src.misc import metrics
+
+
+class SquareExtractor:
+    """Slices a chessboard image into the 64 square tensors fed to the CNN."""
+
+    def __init__(self, img_size=(64, 64), board_size=720, locator=None):
+        self.img_size = img_size
+        self.board_size = board_size  # Width/height of the source board in pixels when no locator is set
+        self.locator = locator  # Optional BoardLocator, crops the board out of arbitrary screenshots
+
+    def crop_board(self, board, source=None):
+        """Crops a decoded PIL board to the rectangle found by the locator, if one is configured."""
+        if self.locator is None:
+            return board
+        rect = self.locator.locate(board, source)
+        return board if rect == (0, 0, *board.size) else board.crop(rect)
+
+    @staticmethod
+    def load_board(image):
+        """
+        Opens a board and returns it as an RGB PIL image. Accepts a path, a file object, encoded PNG/JPEG
+        bytes, a (h, w, 3) uint8 array or an already decoded PIL image.
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = Image.open(io.BytesIO(image))
+        elif isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        elif not isinstance(image, Image.Image):
+            image = Image.open(image)
+        return image.convert("RGB") if image.mode != "RGB" else image
+
+    @staticmethod
+    def from_raw_rgb(buffer, shape):
+        """Wraps a raw RGB byte buffer of the declared (height, width, 3) shape as a uint8 array, without copying."""
+        height, width, channels = shape
+        if channels != 3 or len(buffer) != height * width * 3:
+            raise ValueError(f"Raw RGB buffer of {len(buffer)} bytes does not match shape {tuple(shape)}")
+        return np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+
+    def extract_squares_loop(self, image_path, output_dir=None, source=None):
+        """Per-square crop/resize loop. Kept for saving squares to disk and as the benchmark reference."""
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)  # Ensure output directory exists
+        image = self.load_board(image_path)
+        if self.locator is not None:
+            image = self.crop_board(image, source)
+            square_size = image.width // 8
+        else:
+            square_size = self.board_size // 8  # 90 pixels per square
+        squares = []
+        image_mapping = []  # Store image file paths and their positions
+
+        for row in range(8):
+            row_squares = []
+            for col in range(8):
+                left = col * square_size
+                top = row * square_size
+                right = (col + 1) * square_size
+                bottom = (row + 1) * square_size
+
+                square_img = image.crop((left, top, right, bottom)).convert("RGB")
+                square_img = square_img.resize(self.img_size)  # Resize for CNN
+                square_array = np.array(square_img) / 255.0  # Normalize
+
+                # Save square as an image file
+                square_filename = f"{row}{col}.png"
+                if output_dir:
+                    square_img.save(os.path.join(output_dir, square_filename))
+
+                # Store mapping
+                image_mapping.append((square_filename, (row, col)))
+                row_squares.append(square_array)
+
+            squares.append(row_squares)
+
+        return np.array(squares), image_mapping  # Shape (8, 8, 64, 64, 3)
+
+    def extract_squares(self, image, dtype=np.float32, source=None):
+        """
+        Decodes the board once, resizes it to 8 * img_size in a single call and returns the squares
+        as a strided (8, 8, h, w, 3) view over that one buffer, without any per-square copies.
+        float dtypes are normalized to [0, 1], uint8 returns raw pixels. With a locator, the board is
+        cropped out of the image first; `source` keys its geometry cache.
+        """
+        width, height = self.img_size
+        if isinstance(image, np.ndarray) and image.dtype == np.uint8 and image.shape == (height * 8, width * 8, 3):
+            board = None  # Raw RGB buffer already at model resolution, no decode or resize needed
+        else:
+            with metrics.timed("decode"):
+                board = self.load_board(image)
+                board.load()  # PIL decodes lazily, force it so the time is counted here
+
+        if board is not None:
+            board = self.crop_board(board, source)
+
+        with metrics.timed("extract"):
+            if board is None:
+                pixels = image
+            else:
+                if board.size != (width * 8, height * 8):
+                    board = board.resize((width * 8, height * 8))
+                pixels = np.asarray(board)
+
+            if np.issubdtype(dtype, np.floating):
+                pixels = pixels.astype(dtype)
+                pixels *= 1.0 / 255.0  # Normalize in place, same scale as the loop
+            elif pixels.dtype != dtype:
+                pixels = pixels.astype(dtype)
+
+            # (8h, 8w, 3) -> (8, h, 8, w, 3) -> (8, 8, h, w, 3), a view on the same memory
+            return pixels.reshape(8, height, 8, width, 3).swapaxes(1, 2)
+
+    @staticmethod
+    def square_mapping():
+        """Returns the (filename, (row, col)) mapping matching the order of the flattened squares."""
+        return [(f"{row}{col}.png", (row, col)) for row in range(8) for col in range(8)]
@@ -0,0 +1,121 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from src.misc import utils
+
+# Piece codes are the model's class indices, so argmax output converts without any lookup
+CODE_TO_LABEL = list(utils.CLASS_LABELS)
+LABEL_TO_CODE = {label: code for code, label in enumerate(CODE_TO_LABEL)}
+EMPTY = LABEL_TO_CODE["empty"]
+CODE_TO_SYMBOL = [symbol for label in CODE_TO_LABEL for symbol, fen_label in utils.FEN_TO_LABEL.items() if fen_label == label]
+SYMBOL_TO_CODE = {symbol: code for code, symbol in enumerate(CODE_TO_SYMBOL) if symbol}
+
+# Empty squares become '1' so runs of them can be counted with one regex
+_ENCODE_TABLE = bytes.maketrans(bytes(range(len(CODE_TO_SYMBOL))), "".join(s or "1" for s in CODE_TO_SYMBOL).encode())
+_EMPTY_RUNS = re.compile("1{2,8}")
+
+
+@lru_cache(maxsize=65536)
+def encode_placement(codes):
+    """64 piece-code bytes -> FEN piece placement."""
+    squares = codes.translate(_ENCODE_TABLE).decode()
+    rows = (squares[i:i + 8] for i in range(0, 64, 8))
+    return "/".join(_EMPTY_RUNS.sub(lambda run: str(len(run.group())), row) for row in rows)
+
+
+@lru_cache(maxsize=65536)
+def decode_placement(placement):
+    """FEN piece placement -> 64 piece-code bytes. Raises ValueError for malformed placements."""
+    codes = bytearray()
+    rows = placement.split("/")
+    if len(rows) != 8:
+        raise ValueError(f"FEN placement needs 8 ranks: '{placement}'")
+    for row in rows:
+        start = len(codes)
+        for char in row:
+            if char.isdigit():
+                codes.extend([EMPTY] * int(char))
+            elif char in SYMBOL_TO_CODE:
+                codes.append(SYMBOL_TO_CODE[char])
+            else:
+                raise ValueError(f"Unknown piece '{char}' in FEN placement '{placement}'")
+        if len(codes) - start != 8:
+            raise ValueError(f"Rank '{row}' of FEN placement '{placement}' doesn't have 8 squares")
+    return bytes(codes)
+
+
+class Board:
+    """
+    Immutable board position: 64 uint8 piece codes (the model's class indices), row 0 = rank 8.
+
+    This is the board state handed from the recognizer to the engine and the API. It is built straight from
+    argmax output, hashes and compares by its 64 bytes (usable as a dict/cache key), and encodes to and
+    decodes from FEN through module-level LRU caches. Indexing and iteration yield class labels ('wP',
+    'empty', ...), so code written for the 8x8 label arrays keeps working.
+    """
+
+    __slots__ = ("codes", "_key", "_placement")
+
+    def __init__(self, codes):
+        # Own copy: a read-only view would still change with the caller's array (e.g. LiveCapture's classes)
+        codes = np.array(codes, dtype=np.uint8).reshape(64)
+        codes.flags.writeable = False
+        self.codes = codes
+        self._key = codes.tobytes()
+        self._placement = None
+
+    @classmethod
+    def from_classes(cls, class_indices):
+        """From the model's argmax class indices, shape (64,) or (8, 8)."""
+        return cls(class_indices)
+
+    @classmethod
+    def from_labels(cls, board_state):
+        """From an 8x8 array or nested list of class labels."""
+        return cls([LABEL_TO_CODE[label] for row in board_state for label in row])
+
+    @classmethod
+    def from_fen(cls, fen):
+        """From a full FEN or just its piece placement."""
+        return cls(np.frombuffer(decode_placement(fen.split(" ")[0]), dtype=np.uint8))
+
+    @property
+    def placement(self):
+        """FEN piece placement, encoded once per board."""
+        if self._placement is None:
+            self._placement = encode_placement(self._key)
+        return self._placement
+
+    def fen(self, turn="w", castling_rights="KQkq", en_passant="-", halfmove="0", fullmove="1"):
+        return f"{self.placement} {turn} {castling_rights} {en_passant} {halfmove} {fullmove}"
+
+    def labels(self):
+        """8x8 object array of class labels."""
+        return np.array(CODE_TO_LABEL, dtype=object)[self.codes.reshape(8, 8)]
+
+    def grid(self):
+        """Expanded FEN grid (8 lists of 8 piece symbols, '' for empty) as used by the utils move/position helpers."""
+        return [[CODE_TO_SYMBOL[code] for code in self.codes[row * 8:(row + 1) * 8]] for row in range(8)]
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            row, col = index
+            return CODE_TO_LABEL[self.codes[row * 8 + col]]
+        return [CODE_TO_LABEL[code] for code in self.codes[index * 8:(index + 1) * 8]]
+
+    def __iter__(self):
+        return (self[row] for row in range(8))
+
+    def __len__(self):
+        return 8
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return f"Board('{self.placement}')"
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Scripted stand-in for Stockfish that speaks enough UCI for Engine, EnginePool and AsyncUCIEngine, so the API can
+be exercised without the real binary. It "searches" one depth every --depth-ms milliseconds and prints multi-PV
+`info` lines from a fixed candidate move list (or per-position lists from --script), honouring go depth /
+movetime / nodes / infinite, `stop` and `isready` while searching.
+
+    python src/misc/fake_uci.py --depth-ms 20 --script positions.json
+
+The script maps FEN placements to candidate moves, best first, e.g. {"rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR": ["c7c5", "e7e5"]}.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from src.misc import utils
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+DEFAULT_MOVES = {"w": ["e2e4", "d2d4", "g1f3", "c2c4", "b1c3"], "b": ["e7e5", "d7d5", "g8f6", "c7c5", "b8c6"]}
+
+
+class FakeUCI:
+    def __init__(self, depth_ms=10, max_depth=30, script=None):
+        self.depth_ms = depth_ms
+        self.max_depth = max_depth
+        self.script = script or {}
+        self.fen = START_FEN
+        self.multipv = 1
+        self.commands = queue.Queue()
+
+    @staticmethod
+    def send(line):
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def read_stdin(self):
+        for line in sys.stdin:
+            self.commands.put(line.strip())
+        self.commands.put("quit")
+
+    def candidates(self):
+        placement, side = self.fen.split(" ")[:2]
+        return self.script.get(placement) or DEFAULT_MOVES[side]
+
+    def search(self, limits, infinite=False):
+        """Emits one depth per depth_ms until a limit is reached or `stop` arrives. Returns False on quit."""
+        start = time.perf_counter()
+        moves = self.candidates()
+        best = moves[0]
+        for depth in range(1, self.max_depth + 1):
+            deadline = start + depth * self.depth_ms / 1000
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    command = self.commands.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if command == "isready":
+                    self.send("readyok")
+                elif command in ("stop", "quit"):
+                    self.send(f"bestmove {best}")
+                    return command != "quit"
+
+            elapsed_ms = int((time.perf_counter() - start) * 1000)
+            for k, move in enumerate(moves[:self.multipv], start=1):
+                nodes = depth * 1000 * k
+                score = 25 - 15 * (k - 1) + depth % 3
+                self.send(f"info depth {depth} seldepth {depth + 2} multipv {k} score cp {score} nodes {nodes} "
+                          f"nps {nodes * 1000 // max(elapsed_ms, 1)} time {elapsed_ms} pv {move}")
+
+            if ("depth" in limits and depth >= limits["depth"]) \
+                    or ("movetime" in limits and elapsed_ms + self.depth_ms >= limits["movetime"]) \
+                    or ("nodes" in limits and depth * 1000 >= limits["nodes"]):
+                break
+
+        # UCI: an infinite search only reports its best move once stopped
+        while infinite:
+            command = self.commands.get()
+            if command == "isready":
+                self.send("readyok")
+            elif command in ("stop", "quit"):
+                self.send(f"bestmove {best}")
+                return command != "quit"
+        self.send(f"bestmove {best}")
+        return True
+
+    def run(self):
+        threading.Thread(target=self.read_stdin, daemon=True).start()
+        self.send("Stockfish 16 by the Stockfish developers (fake)")
+        while True:
+            command = self.commands.get()
+            tokens = command.split(" ")
+            if command == "uci":
+                self.send("id name Stockfish 16 (fake)")
+                self.send("option name MultiPV type spin default 1 min 1 max 500")
+                self.send("uciok")
+            elif command == "isready":
+                self.send("readyok")
+            elif command.startswith("setoption name MultiPV value"):
+                self.multipv = int(tokens[-1])
+            elif command.startswith("position"):
+                base, _, moves = command.partition(" moves ")
+                fen = START_FEN if base.strip() == "position startpos" else base[len("position fen "):]
+                for move in moves.split():
+                    fen = utils.play_move(fen, move)  # Same FEN handling as the sessions the API keeps
+                self.fen = fen
+            elif command.startswith("go"):
+                limits = {name: int(value) for name, value in zip(tokens[1::2], tokens[2::2]) if value.isdigit()}
+                if not self.search(limits, infinite="infinite" in tokens):
+                    break
+            elif command == "d":
+                self.send(f"Fen: {self.fen}")
+                self.send("Key: 0000000000000000")
+                self.send("Checkers: ")
+            elif command == "quit":
+                break
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scripted fake UCI engine for tests")
+    parser.add_argument("--depth-ms", type=float, default=10, help="Simulated time per search depth")
+    parser.add_argument("--max-depth", type=int, default=30)
+    parser.add_argument("--script", default=None, help="JSON mapping FEN placements to candidate moves, best first")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as file:
+            script = json.load(file)
+    FakeUCI(args.depth_ms, args.max_depth, script).run()
@@ -0,0 +1,145 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from a cached square lookup up to a deep Stockfish search
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            if not self.values and not self.labels:
+                lines.append(f"{self.name} 0")
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format, optionally split by label values."""
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label values -> [bucket counts..., +Inf count], sum
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            counts, total = self.series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self.series[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the block in seconds. Also usable as a decorator."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {counts[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """Holds the process-wide metrics. Collectors add values that are read at scrape time, e.g. cache stats."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, *args, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help_text, labels=()):
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labels, buckets)
+
+    def add_collector(self, collector):
+        """`collector()` returns [(name, type, help, value)] gauges/counters, computed on every scrape."""
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, metric_type, help_text, value in collector():
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rookception_stage_seconds", "Time spent in each stage of the analyze pipeline", labels=("stage",)
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "rookception_request_seconds", "End-to-end request latency per endpoint", labels=("endpoint",)
+)
+BATCH_SIZE = REGISTRY.histogram(
+    "rookception_inference_batch_boards", "Boards per micro-batched CNN call", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+ENGINE_CRASHES = REGISTRY.counter("rookception_engine_crashes_total", "Stockfish processes found dead or failed mid-search")
+POSITION_VALIDATION = REGISTRY.counter(
+    "rookception_position_validation_total", "Recognized boards that were legal, corrected or rejected", labels=("result",)
+)
+TTA_SQUARES = REGISTRY.counter("rookception_tta_squares_total", "Low-confidence squares re-run with test-time augmentation")
+REQUEST_ERRORS = REGISTRY.counter("rookception_request_errors_total", "Requests answered with an error", labels=("endpoint",))
+BUDGETED_SEARCHES = REGISTRY.counter(
+    "rookception_budgeted_searches_total", "Searches run under a latency budget, by how they were limited", labels=("mode",)
+)
+LOOKUPS = REGISTRY.counter(
+    "rookception_lookups_total", "Opening book and tablebase probes before a search", labels=("source", "result")
+)
+BUDGET_OVERRUNS = REGISTRY.counter("rookception_budget_overruns_total", "Budgeted requests that took longer than their budget")
+
+
+def timed(stage):
+    """Times a pipeline stage into rookception_stage_seconds; works as a context manager and as a decorator."""
+    return STAGE_SECONDS.time(stage=stage)
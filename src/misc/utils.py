@@ -1,4 +1,15 @@
 import json
+import logging
+import os
+
+# Verbose output such as the recognized board dumps is only printed with ROOKCEPTION_LOG_LEVEL=DEBUG
+logger = logging.getLogger("rookception")
+logger.setLevel(os.environ.get("ROOKCEPTION_LOG_LEVEL", "INFO").upper())
+if not logger.handlers:
+    _handler = logging.StreamHandler()  # Plain messages on stderr, like the prints they replace
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False  # A configured root logger would print every message twice
 
 
 def get_all_fens(json_path: str) -> list:
@@ -18,7 +29,9 @@ def get_all_fens(json_path: str) -> list:
 
 
 def board_to_fen(board_state, turn="w", castling_rights="KQkq", en_passant="-", halfmove="0", fullmove="1"):
-    """Convert board state (8x8 numpy array) into FEN string including castling rights and en passant."""
+    """Convert board state (Board or 8x8 array of labels) into FEN string including castling rights and en passant."""
+    if hasattr(board_state, "fen"):  # Board, encodes through its cached placement
+        return board_state.fen(turn, castling_rights, en_passant, halfmove, fullmove)
 
     # Map CNN labels to chess symbols
     piece_map = {
@@ -56,19 +69,257 @@ def board_to_fen(board_state, turn="w", castling_rights="KQkq", en_passant="-",
     return fen
 
 
-def print_board(board, title=""):
+def format_board(board, title=""):
+    """Renders an 8x8 grid of labels as text, rank 8 first, for print_board and debug logging."""
     index_mapping = {i: 8 - i for i in range(8)}
 
     # Replace "empty" with " ."
     board = [[piece if piece != "empty" else " ." for piece in row] for row in board]
 
-    if title:
-        print(f"\n{title}:")
-
-    print("  ---------------------------------")
+    lines = [f"\n{title}:"] if title else []
+    lines.append("  ---------------------------------")
     for idx, row in enumerate(board):
         row_number = index_mapping[idx]  # Get the row number
         formatted_row = "  ".join(f"{piece:>2}" for piece in row)  # two-character spacing
-        print(f"{row_number} | {formatted_row} |")
-    print("  ---------------------------------")
-    print("    a   b   c   d   e   f   g   h ")
\ No newline at end of file
+        lines.append(f"{row_number} | {formatted_row} |")
+    lines.append("  ---------------------------------")
+    lines.append("    a   b   c   d   e   f   g   h ")
+    return "\n".join(lines)
+
+
+def print_board(board, title=""):
+    print(format_board(board, title))
+
+def expand_fen_placement(placement):
+    """Expands the piece placement part of a FEN into an 8x8 list of piece symbols ('' for empty)."""
+    grid = []
+    for fen_row in placement.split("/"):
+        row = []
+        for char in fen_row:
+            if char.isdigit():
+                row.extend([""] * int(char))
+            else:
+                row.append(char)
+        grid.append(row)
+    return grid
+
+
+def infer_castling_rights(placement):
+    """Guesses castling rights from a FEN placement: a right is kept only if king and rook are on their home squares."""
+    grid = expand_fen_placement(placement)
+    rights = ""
+    if grid[7][4] == "K":
+        rights += "K" if grid[7][7] == "R" else ""
+        rights += "Q" if grid[7][0] == "R" else ""
+    if grid[0][4] == "k":
+        rights += "k" if grid[0][7] == "r" else ""
+        rights += "q" if grid[0][0] == "r" else ""
+    return rights or "-"
+
+
+def square_name(row, col):
+    """Converts a (row, col) board index (row 0 = rank 8) to a square name like 'e4'."""
+    return f"{'abcdefgh'[col]}{8 - row}"
+
+
+def infer_move(prev_placement, new_placement, turn):
+    """
+    Infers the UCI move that turns prev_placement into new_placement for the side to move.
+    Handles normal moves, captures, castling, en passant and promotion. Returns None if the
+    difference does not look like a single move.
+    """
+    prev = expand_fen_placement(prev_placement)
+    new = expand_fen_placement(new_placement)
+    is_mover = str.isupper if turn == "w" else str.islower
+    king = "K" if turn == "w" else "k"
+
+    froms, tos = [], []
+    for row in range(8):
+        for col in range(8):
+            before, after = prev[row][col], new[row][col]
+            if before == after:
+                continue
+            if after and not is_mover(after):
+                return None  # The opponent's pieces can only disappear (captured), never appear
+            if before and is_mover(before):
+                froms.append((row, col))
+            if after and is_mover(after):
+                tos.append((row, col))
+
+    # Castling moves both king and rook, the king's two-file jump is the UCI move
+    king_from = [sq for sq in froms if prev[sq[0]][sq[1]] == king]
+    king_to = [sq for sq in tos if new[sq[0]][sq[1]] == king]
+    if king_from and king_to:
+        (from_row, from_col), (to_row, to_col) = king_from[0], king_to[0]
+        if len(froms) == 2 and len(tos) == 2 and abs(from_col - to_col) == 2:
+            return square_name(from_row, from_col) + square_name(to_row, to_col)
+
+    if len(froms) != 1 or len(tos) != 1:
+        return None
+
+    (from_row, from_col), (to_row, to_col) = froms[0], tos[0]
+    moved, landed = prev[from_row][from_col], new[to_row][to_col]
+    move = square_name(from_row, from_col) + square_name(to_row, to_col)
+
+    if moved != landed:
+        # Only a pawn reaching the last rank may change piece type
+        if moved.lower() != "p" or to_row not in (0, 7):
+            return None
+        move += landed.lower()
+
+    return move
+
+
+def pack_fen_placement(grid):
+    """Packs an 8x8 list of piece symbols ('' for empty) back into a FEN placement."""
+    rows = []
+    for row in grid:
+        packed, empty = "", 0
+        for piece in row:
+            if piece:
+                packed += (str(empty) if empty else "") + piece
+                empty = 0
+            else:
+                empty += 1
+        rows.append(packed + (str(empty) if empty else ""))
+    return "/".join(rows)
+
+
+# Castling rights lost when a piece leaves or arrives on these squares
+CASTLING_SQUARES = {"e1": "KQ", "h1": "K", "a1": "Q", "e8": "kq", "h8": "k", "a8": "q"}
+
+
+def play_move(fen, move):
+    """
+    Plays a UCI move on a full FEN and returns the FEN of the resulting position, with castling rights,
+    en passant square and move clocks updated, so sessions can follow a game without asking Stockfish.
+    The move is not checked for legality. The en passant square is only written when an enemy pawn stands
+    next to the double-pushed pawn, as Stockfish does.
+    """
+    fields = fen.split(" ")
+    fields += ["w", "-", "-", "0", "1"][len(fields) - 1:]
+    grid, turn, castling = expand_fen_placement(fields[0]), fields[1], fields[2]
+    halfmove, fullmove = int(fields[4]), int(fields[5])
+    (from_row, from_col), (to_row, to_col) = [(8 - int(move[i + 1]), "abcdefgh".index(move[i])) for i in (0, 2)]
+    piece, captured = grid[from_row][from_col], grid[to_row][to_col]
+
+    if piece in ("P", "p") and from_col != to_col and not captured:
+        grid[from_row][to_col] = ""  # En passant takes the pawn beside the moving one
+        captured = "p" if piece == "P" else "P"
+    if piece in ("K", "k") and abs(from_col - to_col) == 2:
+        rook_from, rook_to = (7, 5) if to_col > from_col else (0, 3)
+        grid[from_row][rook_to], grid[from_row][rook_from] = grid[from_row][rook_from], ""
+    grid[from_row][from_col] = ""
+    grid[to_row][to_col] = (move[4].upper() if turn == "w" else move[4]) if len(move) > 4 else piece
+
+    for square in (move[0:2], move[2:4]):
+        castling = "".join(right for right in castling if right not in CASTLING_SQUARES.get(square, ""))
+    en_passant = "-"
+    if piece in ("P", "p") and abs(from_row - to_row) == 2:
+        enemy_pawn = "p" if piece == "P" else "P"
+        if enemy_pawn in [grid[to_row][col] for col in (to_col - 1, to_col + 1) if 0 <= col < 8]:
+            en_passant = square_name((from_row + to_row) // 2, from_col)
+    halfmove = 0 if piece in ("P", "p") or captured else halfmove + 1
+    fullmove += turn == "b"
+    return f"{pack_fen_placement(grid)} {'b' if turn == 'w' else 'w'} {castling or '-'} {en_passant} {halfmove} {fullmove}"
+
+
+# FEN piece symbols to the CNN class labels
+FEN_TO_LABEL = {
+    "p": "bP", "n": "bN", "b": "bB", "r": "bR", "q": "bQ", "k": "bK",
+    "P": "wP", "N": "wN", "B": "wB", "R": "wR", "Q": "wQ", "K": "wK",
+    "": "empty"
+}
+
+# Class labels in the order the model outputs them (sorted dataset folder names)
+CLASS_LABELS = sorted(FEN_TO_LABEL.values())
+
+
+def fen_to_labels(fen):
+    """Converts a FEN string into an 8x8 list of CNN class labels ('wP', 'empty', ...), row 0 = rank 8."""
+    return [[FEN_TO_LABEL[piece] for piece in row] for row in expand_fen_placement(fen.split(" ")[0])]
+
+
+def is_square_attacked(grid, row, col, by_white):
+    """True if (row, col) of an expanded FEN grid is attacked by the white (or black) pieces."""
+    def piece_at(r, c):
+        return grid[r][c] if 0 <= r < 8 and 0 <= c < 8 else None
+
+    pawn, knight, bishop, rook, queen, king = "PNBRQK" if by_white else "pnbrqk"
+    pawn_row = row + 1 if by_white else row - 1  # White pawns attack upwards (towards row 0)
+    if pawn in (piece_at(pawn_row, col - 1), piece_at(pawn_row, col + 1)):
+        return True
+    for dr, dc in ((1, 2), (2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (-1, -2), (-2, -1)):
+        if piece_at(row + dr, col + dc) == knight:
+            return True
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            if (dr or dc) and piece_at(row + dr, col + dc) == king:
+                return True
+
+    for directions, sliders in ((((1, 0), (-1, 0), (0, 1), (0, -1)), (rook, queen)),
+                                (((1, 1), (1, -1), (-1, 1), (-1, -1)), (bishop, queen))):
+        for dr, dc in directions:
+            r, c = row + dr, col + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                if grid[r][c]:
+                    if grid[r][c] in sliders:
+                        return True
+                    break
+                r, c = r + dr, c + dc
+    return False
+
+
+def position_violations(grid, turn=None):
+    """
+    Lists the reasons an expanded FEN grid can't be a legal position: king counts, pawns on the back ranks,
+    more pieces than promotions allow, touching kings, or a king in check that isn't on the move.
+    Without `turn`, only both kings being in check is rejected. Returns an empty list for a legal position.
+    """
+    violations = []
+    pieces = [piece for row in grid for piece in row if piece]
+    for side, symbols in (("white", "PNBRQK"), ("black", "pnbrqk")):
+        pawn, knight, bishop, rook, queen, king = symbols
+        counts = {symbol: pieces.count(symbol) for symbol in symbols}
+        if counts[king] != 1:
+            violations.append(f"{side} has {counts[king]} kings")
+        if counts[pawn] > 8:
+            violations.append(f"{side} has {counts[pawn]} pawns")
+        # Every piece beyond the starting set must have been a pawn
+        promoted = max(0, counts[queen] - 1) + sum(max(0, counts[piece] - 2) for piece in (rook, bishop, knight))
+        if counts[pawn] + promoted > 8:
+            violations.append(f"{side} has more pieces than promotions allow")
+
+    if any(piece in ("P", "p") for piece in grid[0] + grid[7]):
+        violations.append("pawn on the first or last rank")
+
+    kings = {grid[row][col]: (row, col) for row in range(8) for col in range(8) if grid[row][col] in ("K", "k")}
+    if "K" in kings and "k" in kings and pieces.count("K") == 1 and pieces.count("k") == 1:
+        (white_row, white_col), (black_row, black_col) = kings["K"], kings["k"]
+        if max(abs(white_row - black_row), abs(white_col - black_col)) <= 1:
+            violations.append("kings are adjacent")
+        white_in_check = is_square_attacked(grid, white_row, white_col, by_white=False)
+        black_in_check = is_square_attacked(grid, black_row, black_col, by_white=True)
+        if white_in_check and black_in_check:
+            violations.append("both kings are in check")
+        elif turn == "w" and black_in_check:
+            violations.append("black is in check with white to move")
+        elif turn == "b" and white_in_check:
+            violations.append("white is in check with black to move")
+
+    return violations
+
+
+class IllegalPositionError(ValueError):
+    """A recognized board that can't be a legal chess position. Raised before the position reaches Stockfish."""
+
+    def __init__(self, violations):
+        super().__init__(f"Illegal position: {'; '.join(violations)}")
+        self.violations = violations
+
+
+def check_position(placement, turn=None):
+    """Raises IllegalPositionError if a FEN piece placement can't be a legal position with `turn` to move."""
+    violations = position_violations(expand_fen_placement(placement), turn)
+    if violations:
+        raise IllegalPositionError(violations)
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.misc.Board import EMPTY, LABEL_TO_CODE, Board
+
+
+def test_board_does_not_follow_later_writes_to_its_source_array():
+    classes = np.full((8, 8), EMPTY, dtype=np.uint8)
+    board = Board.from_classes(classes)
+    classes[0, 0] = LABEL_TO_CODE["bK"]
+
+    assert board[0, 0] == "empty"
+    assert board.placement == "8/8/8/8/8/8/8/8"
+    assert board == Board.from_fen("8/8/8/8/8/8/8/8")
+
+
+def test_fen_round_trip():
+    fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR"
+    board = Board.from_fen(fen)
+    assert board.placement == fen
+    assert Board.from_labels(board.labels()) == board
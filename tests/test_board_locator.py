@@ -0,0 +1,83 @@
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.cnn.BoardLocator import BoardLocator
+
+BOARDS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "../resources/images/chessboard/*.png")))
+
+
+def empty_board(side):
+    cells = np.where((np.add.outer(np.arange(8), np.arange(8)) % 2 == 0)[..., None], (235, 236, 208), (119, 149, 86))
+    return cv2.resize(cells.astype(np.uint8), (side, side), interpolation=cv2.INTER_NEAREST)
+
+
+def cluttered_screenshot(rng, background, board_path=None):
+    """A board pasted into a UI-like screenshot with boxes and move-list text. Returns (image, board rect)."""
+    width, height = int(rng.integers(1000, 1600)), int(rng.integers(800, 1000))
+    if background == "noise":
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    else:
+        image = np.full((height, width, 3), int(rng.integers(20, 50)), dtype=np.uint8)
+    for _ in range(int(rng.integers(5, 25))):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        color = tuple(int(value) for value in rng.integers(0, 256, 3))
+        if rng.random() < 0.5:
+            size = (int(rng.integers(20, 300)), int(rng.integers(10, 200)))
+            cv2.rectangle(image, (x, y), (x + size[0], y + size[1]), color, int(rng.choice([-1, 1, 2])))
+        else:
+            cv2.putText(image, "12. Nf3 e5 +0.34", (x, y), cv2.FONT_HERSHEY_SIMPLEX, float(rng.uniform(0.4, 1.5)),
+                        color, int(rng.integers(1, 3)))
+
+    side = int(rng.integers(int(0.4 * min(width, height)), int(0.9 * min(width, height))))
+    board = empty_board(side) if board_path is None else np.asarray(Image.open(board_path).convert("RGB").resize((side, side)))
+    x, y = int(rng.integers(0, width - side)), int(rng.integers(0, height - side))
+    image[y:y + side, x:x + side] = board
+    return image, (x, y, x + side, y + side)
+
+
+def locate_all(background, count, seed, boards):
+    """Counts boards found within 3 px, whole-image fallbacks and wrong rectangles."""
+    rng = np.random.default_rng(seed)
+    locator = BoardLocator()
+    found, fallback, wrong = 0, 0, []
+    for i in range(count):
+        image, truth = cluttered_screenshot(rng, background, boards[i % len(boards)])
+        rect = locator.detect(image)
+        if max(abs(a - b) for a, b in zip(rect, truth)) <= 3:
+            found += 1
+        elif rect == (0, 0, image.shape[1], image.shape[0]):
+            fallback += 1
+        else:
+            wrong.append((truth, rect))
+    return found, fallback, wrong
+
+
+def test_board_in_dark_ui_clutter_is_never_off_by_a_square():
+    found, _, wrong = locate_all("dark", 40, seed=0, boards=BOARDS)
+    assert wrong == []
+    assert found >= 36
+
+
+def test_board_on_noise_falls_back_instead_of_guessing():
+    found, _, wrong = locate_all("noise", 30, seed=1, boards=BOARDS)
+    assert wrong == []
+    assert found >= 20
+
+
+def test_empty_board_on_noise():
+    found, _, wrong = locate_all("noise", 20, seed=2, boards=[None])
+    assert wrong == []
+    assert found >= 14
+
+
+def test_tightly_cropped_boards_span_the_image():
+    locator = BoardLocator()
+    for board_path in BOARDS[:8]:
+        image = np.asarray(Image.open(board_path).convert("RGB"))
+        assert locator.detect(image) == (0, 0, image.shape[1], image.shape[0])
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import src.cnn.InferenceBackend as InferenceBackend
+from src.cnn.BoardRecognizer import BoardRecognizer
+from src.cnn.PositionValidator import PositionValidator
+from src.misc import utils
+from src.misc.Board import Board, LABEL_TO_CODE
+
+# Black king in check from the rook on e1. With white to move that position can't happen, and the model
+# isn't sure about the rook (70% rook, 30% empty square).
+FEN = "4k3/8/8/8/8/8/8/4R1K1"
+E1 = 7 * 8 + 4
+
+
+class FixedModel:
+    """Backend that returns the same softmax for every board, whatever the pixels."""
+
+    def __init__(self, model_path):
+        codes = Board.from_fen(FEN).codes
+        self.probabilities = np.full((64, len(utils.CLASS_LABELS)), 1e-3, dtype=np.float32)
+        self.probabilities[np.arange(64), codes] = 0.99
+        self.probabilities[E1, codes[E1]] = 0.7
+        self.probabilities[E1, LABEL_TO_CODE["empty"]] = 0.3
+
+    def predict_on_batch(self, inputs):
+        return np.tile(self.probabilities, (len(inputs) // 64, 1))
+
+
+def make_recognizer(monkeypatch):
+    monkeypatch.setitem(InferenceBackend.BACKENDS, "fixed", FixedModel)
+    return BoardRecognizer("model.fixed", backend="fixed", validator=PositionValidator(utils.CLASS_LABELS),
+                           min_confidence=0.0)
+
+
+def test_side_to_move_guides_the_validator(monkeypatch):
+    recognizer = make_recognizer(monkeypatch)
+    image = np.zeros((512, 512, 3), dtype=np.uint8)
+
+    # Without a side to move the check is possible (black to move), the argmax board stands
+    assert recognizer.predict_board(image).placement == FEN
+    # With white to move the rook can't be there, the next most probable board is picked
+    assert recognizer.predict_board(image, turn="w").placement == "4k3/8/8/8/8/8/8/6K1"
+
+    boards = recognizer.predict_boards([image, image], turns=["b", "w"])
+    assert [board.placement for board in boards] == [FEN, "4k3/8/8/8/8/8/8/6K1"]
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.API.GameSession import GameSession
+from src.misc import utils
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def test_play_move_updates_castling_en_passant_and_clocks():
+    fen = START_FEN
+    for move in ("e2e4", "g8f6", "e4e5", "d7d5"):
+        fen = utils.play_move(fen, move)
+    assert fen == "rnbqkb1r/ppp1pppp/5n2/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3"
+
+    fen = utils.play_move(fen, "e5d6")  # En passant removes the d5 pawn
+    assert fen == "rnbqkb1r/ppp1pppp/3P1n2/8/8/8/PPPP1PPP/RNBQKBNR b KQkq - 0 3"
+
+    fen = utils.play_move("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 4 20", "e1g1")
+    assert fen == "r3k2r/8/8/8/8/8/8/R4RK1 b kq - 5 20"
+
+
+def test_session_follows_the_opponent_move_without_an_engine():
+    session = GameSession("game")
+    session.sync(START_FEN.split(" ")[0], "w")
+    session.play("e2e4")
+
+    # The opponent answered e5, the board shows white to move again
+    session.sync("rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR", "w")
+    assert session.moves == ["e2e4", "e7e5"]
+    assert session.current_fen == "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"
+
+    # A board that isn't one move away restarts the session
+    session.sync("4k3/8/8/8/8/8/8/4K3", "w")
+    assert session.moves == []
+    assert session.start_fen == "4k3/8/8/8/8/8/8/4K3 w - - 0 1"
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.cnn.LiveCapture import DirectorySource, LivePipeline, LiveRecognizer
+from src.cnn.SquareExtractor import SquareExtractor
+from src.misc.Board import Board
+
+SHADE = 18  # Pixel value per class code, keeps every class a flat, distinct grey
+
+
+class ShadeRecognizer:
+    """Stands in for BoardRecognizer: squares are flat greys and the class is read back from the shade."""
+
+    def __init__(self):
+        self.extractor = SquareExtractor((8, 8))
+
+    def predict_squares(self, squares):
+        classes = np.rint(squares[:, 0, 0, 0] / SHADE).astype(np.uint8)
+        return classes, np.ones(len(classes), dtype=np.float32)
+
+
+def write_frame(path, fen):
+    codes = Board.from_fen(fen).codes.reshape(8, 8)
+    pixels = np.kron(codes * SHADE, np.ones((8, 8))).astype(np.uint8)
+    Image.fromarray(np.stack([pixels] * 3, axis=-1)).save(path)
+
+
+def test_directory_replay_reports_the_final_position(tmp_path):
+    fens = [
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR",
+        "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR",
+        "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR",
+    ]
+    for i, fen in enumerate(fens):
+        write_frame(tmp_path / f"{i:02d}.png", fen)
+
+    positions = []
+    pipeline = LivePipeline(DirectorySource(str(tmp_path)), LiveRecognizer(ShadeRecognizer()), positions.append)
+    pipeline.run()
+
+    assert [position["placement"] for position in positions] == fens
+    assert [position["move"] for position in positions] == [None, "e2e4", "e7e5"]